@@ -3,10 +3,10 @@
 ytify API 路由
 """
 
-from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, Depends
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from pathlib import Path
 import asyncio
 import urllib.parse
@@ -15,11 +15,24 @@ import sys
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-from services.downloader import downloader, is_valid_youtube_url, is_playlist_url
+from services.downloader import downloader, is_valid_youtube_url, is_playlist_url, extract_video_id
 from services.queue import download_queue
+from services.concurrency import concurrency_controller
+from services.watchdog import stall_watchdog
+from services.transfer import transfer_tuner
+from services.info_cache import info_cache, negative_cache
+from services.artifact_cache import artifact_cache
+from services.storage import storage_manager
+from services.derive import local_deriver
+from services.smart_cut import smart_cutter
+from services.circuit_breaker import rate_limit_breaker
+from services.error_handler import retry_manager
+from services.executors import get_executor_stats
 from services.ytdlp_updater import ytdlp_updater
 from services.websocket_manager import ws_manager, progress_notifier
 from services.session import get_client_ip, get_session_id
+from services.auth import User
+from services.auth_middleware import get_current_user
 
 router = APIRouter(prefix="/api", tags=["youtube"])
 
@@ -31,12 +44,33 @@ class InfoRequest(BaseModel):
     url: str
 
 
+class ClipRange(BaseModel):
+    start: float  # 片段起點（秒）
+    end: float    # 片段終點（秒）
+
+
 class DownloadRequest(BaseModel):
     url: str
     format: str = "best"  # best | 1080p | 720p | 480p
     audio_only: bool = False
     clip_start: Optional[float] = None  # 片段起點（秒），與 clip_end 成對
     clip_end: Optional[float] = None    # 片段終點（秒）
+    clips: Optional[List[ClipRange]] = None  # 多個片段（下載一次，每段各自一個任務）
+    duration: Optional[float] = None    # 影片長度（秒，取自 /api/info），供佇列估算成本
+
+
+class BatchDownloadRequest(BaseModel):
+    urls: List[str]
+    format: str = "best"
+    audio_only: bool = False
+
+
+# 單次批次下載最多幾個網址
+MAX_BATCH_URLS = 200
+
+# 單次多片段請求最多幾段；每段最長秒數
+MAX_CLIPS = 20
+MAX_CLIP_SECONDS = 1800
 
 
 class PlaylistDownloadRequest(BaseModel):
@@ -46,6 +80,55 @@ class PlaylistDownloadRequest(BaseModel):
     max_videos: int = 50  # 最多下載幾部
 
 
+def _check_admission(request: Request, user: Optional[User], count: int = 1):
+    """有界佇列模式：積壓過深時回 503 與 Retry-After，讓客戶端退讓"""
+    meta = {
+        "client_ip": get_client_ip(request),
+        "session_id": get_session_id(request),
+        "user_id": user.id if user else None,
+        "user_role": user.role.value if user else None,
+    }
+    rejection = download_queue.check_admission(meta, count)
+    if rejection:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": f"伺服器忙碌：{rejection['reason']}，請 {rejection['retry_after']} 秒後再試",
+                "retry_after": rejection["retry_after"],
+                "estimated_wait": rejection["estimated_wait"],
+            },
+            headers={"Retry-After": str(rejection["retry_after"])}
+        )
+
+
+def _check_clip(start: float, end: float):
+    """片段起訖驗證"""
+    if start < 0 or end <= start:
+        raise HTTPException(status_code=400, detail="片段終點必須大於起點")
+    if end - start > MAX_CLIP_SECONDS:
+        raise HTTPException(status_code=400, detail="片段最長 30 分鐘")
+
+
+def _info_error(info: dict):
+    """擷取失敗轉成 HTTP 錯誤；斷路器斷開時回 503 與 Retry-After"""
+    if info.get("retry_after"):
+        raise HTTPException(
+            status_code=503,
+            detail={"message": info["error"], "retry_after": info["retry_after"]},
+            headers={"Retry-After": str(info["retry_after"])}
+        )
+    # 錯誤分類（例如負快取命中的 private_video）放在標頭，detail 維持字串給前端顯示
+    headers = {"X-Error-Category": info["error_category"]} if info.get("error_category") else None
+    raise HTTPException(status_code=400, detail=info["error"], headers=headers)
+
+
+def _poll_after(estimated_wait: Optional[float]) -> int:
+    """建議的輪詢間隔：離開始越久，隔越久再問"""
+    if not estimated_wait:
+        return 2
+    return int(min(max(estimated_wait / 4, 2), 60))
+
+
 @router.post("/info")
 @limiter.limit("30/minute")
 async def get_video_info(request: Request, req: InfoRequest):
@@ -56,13 +139,17 @@ async def get_video_info(request: Request, req: InfoRequest):
 
     info = await downloader.get_video_info(req.url)
     if "error" in info:
-        raise HTTPException(status_code=400, detail=info["error"])
+        _info_error(info)
     return info
 
 
 @router.post("/download")
 @limiter.limit("10/minute")
-async def start_download(request: Request, req: DownloadRequest):
+async def start_download(
+    request: Request,
+    req: DownloadRequest,
+    user: Optional[User] = Depends(get_current_user)
+):
     """開始下載影片（加入佇列）"""
     # URL 驗證
     if not is_valid_youtube_url(req.url):
@@ -72,10 +159,22 @@ async def start_download(request: Request, req: DownloadRequest):
     if (req.clip_start is None) != (req.clip_end is None):
         raise HTTPException(status_code=400, detail="clip_start 與 clip_end 必須成對提供")
     if req.clip_start is not None:
-        if req.clip_start < 0 or req.clip_end <= req.clip_start:
-            raise HTTPException(status_code=400, detail="片段終點必須大於起點")
-        if req.clip_end - req.clip_start > 1800:
-            raise HTTPException(status_code=400, detail="片段最長 30 分鐘")
+        if req.clips:
+            raise HTTPException(status_code=400, detail="clips 不可與 clip_start/clip_end 同時使用")
+        _check_clip(req.clip_start, req.clip_end)
+    if req.clips:
+        if len(req.clips) > MAX_CLIPS:
+            raise HTTPException(status_code=400, detail=f"單次最多 {MAX_CLIPS} 個片段")
+        for clip in req.clips:
+            _check_clip(clip.start, clip.end)
+
+    # 已知無法下載（私人、已移除、版權封鎖）的直接回應，不建立任務
+    failure = negative_cache.get(extract_video_id(req.url))
+    if failure is not None:
+        _info_error({"error": failure["message"], "error_category": failure["category"]})
+
+    if req.clips:
+        return await _start_clip_download(request, req, user)
 
     # 相同任務進行中就直接回傳它（同影片同參數並發會互撞暫存檔）
     duplicate_id = downloader.find_active_duplicate(
@@ -89,6 +188,8 @@ async def start_download(request: Request, req: DownloadRequest):
             "message": "相同任務已在進行中"
         }
 
+    _check_admission(request, user)
+
     # 取得客戶端識別
     client_ip = get_client_ip(request)
     session_id = get_session_id(request)
@@ -100,25 +201,132 @@ async def start_download(request: Request, req: DownloadRequest):
         audio_only=req.audio_only,
         client_ip=client_ip,
         session_id=session_id,
+        user_id=user.id if user else None,
+        user_role=user.role.value if user else None,
         clip_start=req.clip_start,
-        clip_end=req.clip_end
+        clip_end=req.clip_end,
+        duration=req.duration
     )
 
-    # 取得當前佇列狀態
-    stats = download_queue.get_stats()
-    queue_position = stats["queued"] + 1 if stats["running"] >= stats["max_concurrent"] else 0
+    # 相同成品已下載過：不必排隊，直接完成
+    cached = downloader.complete_from_cache(task_id)
+    if cached is not None:
+        return {
+            "task_id": task_id,
+            "status": "cached",
+            "queue_position": 0,
+            "filename": cached["filename"],
+            "message": "已有相同檔案，立即完成"
+        }
 
-    # 提交到佇列執行
-    await download_queue.submit(task_id, downloader.execute_task, task_id)
+    # 提交到佇列執行（依租戶公平排程，有空位會立即開始）
+    await download_queue.submit(
+        task_id, downloader.execute_task, task_id,
+        meta=downloader.get_task_status(task_id)
+    )
+
+    queue_info = download_queue.get_queue_info(task_id) or {}
+    queue_position = queue_info.get("queue_position", 0)
 
     return {
         "task_id": task_id,
         "status": "queued" if queue_position > 0 else "started",
         "queue_position": queue_position,
+        "estimated_wait": queue_info.get("estimated_wait"),
+        "predicted_start_at": queue_info.get("predicted_start_at"),
         "message": f"排隊中（第 {queue_position} 位）" if queue_position > 0 else "開始下載"
     }
 
 
+async def _start_clip_download(request: Request, req: DownloadRequest, user: Optional[User]):
+    """
+    多片段請求：每段一個任務，同一支影片只下載一次各段的聯集，再一次剪出所有片段
+
+    相同片段進行中的沿用原任務；已有成品的立即完成
+    """
+    _check_admission(request, user, count=len(req.clips))
+
+    result = downloader.create_clip_tasks(
+        url=req.url,
+        clips=[(clip.start, clip.end) for clip in req.clips],
+        format_option=req.format,
+        audio_only=req.audio_only,
+        client_ip=get_client_ip(request),
+        session_id=get_session_id(request),
+        user_id=user.id if user else None,
+        user_role=user.role.value if user else None,
+        duration=req.duration
+    )
+
+    await download_queue.submit_many([
+        (task_id, downloader.execute_task, (task_id,), downloader.get_task_status(task_id))
+        for task_id in result["queued"]
+    ])
+
+    return {
+        "group_id": result["group_id"],
+        "task_ids": [clip["task_id"] for clip in result["clips"]],
+        "clips": result["clips"],
+        "status": "queued" if result["queued"] else "cached",
+        "queued_count": len(result["queued"]),
+        "message": f"已建立 {len(result['clips'])} 個片段任務"
+    }
+
+
+@router.post("/download/batch")
+@limiter.limit("5/minute")
+async def start_batch_download(
+    request: Request,
+    req: BatchDownloadRequest,
+    user: Optional[User] = Depends(get_current_user)
+):
+    """
+    批次下載多個網址
+
+    一次驗證所有網址，有任何無效就整批拒絕；通過後一次建立並入列
+    """
+    if not req.urls:
+        raise HTTPException(status_code=400, detail="網址列表不可為空")
+    if len(req.urls) > MAX_BATCH_URLS:
+        raise HTTPException(status_code=400, detail=f"單次最多 {MAX_BATCH_URLS} 個網址")
+
+    invalid = [
+        {"index": i, "url": url}
+        for i, url in enumerate(req.urls)
+        if not is_valid_youtube_url(url)
+    ]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"{len(invalid)} 個無效的 YouTube URL", "invalid": invalid}
+        )
+
+    _check_admission(request, user, count=len(req.urls))
+
+    result = downloader.create_batch_tasks(
+        urls=req.urls,
+        format_option=req.format,
+        audio_only=req.audio_only,
+        client_ip=get_client_ip(request),
+        session_id=get_session_id(request),
+        user_id=user.id if user else None,
+        user_role=user.role.value if user else None
+    )
+
+    await download_queue.submit_many([
+        (task_id, downloader.execute_task, (task_id,), downloader.get_task_status(task_id))
+        for task_id in result["task_ids"]
+    ])
+
+    return {
+        "batch_id": result["batch_id"],
+        "task_ids": result["task_ids"],
+        "duplicates": result["duplicates"],
+        "queued_count": len(result["task_ids"]),
+        "message": f"已加入 {len(result['task_ids'])} 個任務到下載佇列"
+    }
+
+
 @router.get("/status/{task_id}")
 async def get_task_status(task_id: str):
     """查詢下載狀態"""
@@ -128,6 +336,9 @@ async def get_task_status(task_id: str):
         return {
             "status": "queued",
             "queue_position": queue_info.get("queue_position", 0),
+            "estimated_wait": queue_info.get("estimated_wait"),
+            "predicted_start_at": queue_info.get("predicted_start_at"),
+            "poll_after": _poll_after(queue_info.get("estimated_wait")),
             "message": f"排隊中（第 {queue_info.get('queue_position', 0)} 位）"
         }
 
@@ -139,13 +350,37 @@ async def get_task_status(task_id: str):
 
 
 @router.get("/queue-stats")
-async def get_queue_stats():
-    """取得佇列狀態（含詳細診斷資訊）"""
-    stats = download_queue.get_stats()
+async def get_queue_stats(detail: bool = True):
+    """取得佇列狀態（含詳細診斷資訊，detail=false 只回傳計數）"""
+    stats = download_queue.get_stats(detail=detail)
     # 加入下載器的狀態以交叉比對
     downloader_status = downloader.get_status()
     stats["downloader_running_count"] = downloader_status.get("running_count", 0)
     stats["downloader_running_tasks"] = list(downloader.running_tasks)
+    # 自適應併發：目前上限與每次調整的原因
+    stats["concurrency"] = concurrency_controller.get_stats()
+    # 各出口的頻率限制斷路器狀態
+    stats["circuit_breaker"] = rate_limit_breaker.get_stats()
+    # 自適應重試：預算與依錯誤類別、出口學到的延遲
+    stats["retry_policy"] = retry_manager.policy.get_stats()
+    # 停滯監視：重啟次數與最近的紀錄
+    stats["watchdog"] = stall_watchdog.get_stats()
+    # 多連線下載：模式與各（格式, 出口）量到的最佳連線數
+    stats["transfer"] = transfer_tuner.get_stats()
+    # 影片資訊快取：下載沿用 /api/info 擷取結果的命中率
+    stats["info_cache"] = info_cache.get_stats()
+    stats["negative_cache"] = negative_cache.get_stats()
+    stats["artifact_cache"] = artifact_cache.get_stats()
+    stats["storage"] = storage_manager.get_stats()
+    stats["local_derive"] = local_deriver.get_stats()
+    stats["smart_cut"] = smart_cutter.get_stats()
+    # 各執行緒池飽和度（active / queued / max）
+    stats["executors"] = get_executor_stats()
+    # 下載執行模式（process 模式附帶子程序狀態）
+    stats["execution_mode"] = downloader.execution_mode
+    if downloader.execution_mode == "process":
+        from services.process_worker import process_pool
+        stats["process_workers"] = process_pool.get_stats()
     return stats
 
 
@@ -163,6 +398,43 @@ async def cancel_task(task_id: str):
     result = downloader.cancel_task(task_id)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
+    # 還在排隊的直接從佇列移除，不佔用執行名額
+    result["removed_from_queue"] = await download_queue.cancel(task_id)
+    # 合併下載中帶頭的片段被取消：其餘片段各自重新排隊
+    await downloader.release_clip_group(task_id)
+    return result
+
+
+@router.post("/task/{task_id}/pause")
+async def pause_task(task_id: str):
+    """
+    暫停下載任務
+
+    執行中的任務停止下載並保留 .part 檔，排隊中或等待重試的任務移出佇列
+    """
+    result = downloader.pause_task(task_id)
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["error"])
+    was_queued = result.pop("was_queued")
+    if await download_queue.remove(task_id) and not was_queued:
+        # 在延遲區等待重試：已移出佇列，不必等到重試時間才停下
+        downloader.finish_pause(task_id)
+    await downloader.release_clip_group(task_id)
+    return result
+
+
+@router.post("/task/{task_id}/resume")
+async def resume_task(task_id: str):
+    """恢復已暫停的任務（重新排隊，從 .part 檔續傳）"""
+    result = downloader.resume_task(task_id)
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["error"])
+
+    await download_queue.submit(
+        task_id, downloader.execute_task, task_id,
+        meta=downloader.get_task_status(task_id)
+    )
+    result["queue_position"] = download_queue.get_queue_position(task_id)
     return result
 
 
@@ -317,13 +589,17 @@ async def get_playlist_info(request: Request, req: InfoRequest):
 
     info = await downloader.get_playlist_info(req.url)
     if "error" in info:
-        raise HTTPException(status_code=400, detail=info["error"])
+        _info_error(info)
     return info
 
 
 @router.post("/playlist/download")
 @limiter.limit("5/minute")
-async def start_playlist_download(request: Request, req: PlaylistDownloadRequest):
+async def start_playlist_download(
+    request: Request,
+    req: PlaylistDownloadRequest,
+    user: Optional[User] = Depends(get_current_user)
+):
     """
     開始下載播放清單
 
@@ -332,6 +608,9 @@ async def start_playlist_download(request: Request, req: PlaylistDownloadRequest
     if not is_playlist_url(req.url):
         raise HTTPException(status_code=400, detail="無效的播放清單 URL")
 
+    # 連一部都排不進去時不必先擷取播放清單
+    _check_admission(request, user)
+
     # 取得客戶端識別
     client_ip = get_client_ip(request)
     session_id = get_session_id(request)
@@ -339,11 +618,13 @@ async def start_playlist_download(request: Request, req: PlaylistDownloadRequest
     # 取得播放清單資訊
     info = await downloader.get_playlist_info(req.url)
     if "error" in info:
-        raise HTTPException(status_code=400, detail=info["error"])
+        _info_error(info)
 
     videos = info.get("videos", [])
     if not videos:
         raise HTTPException(status_code=400, detail="播放清單沒有可下載的影片")
+    # 依實際要排入的影片數計入積壓（清單可能比 max_videos 短）
+    _check_admission(request, user, count=min(req.max_videos, len(videos)))
 
     # 建立批次任務
     result = downloader.create_playlist_tasks(
@@ -353,12 +634,16 @@ async def start_playlist_download(request: Request, req: PlaylistDownloadRequest
         max_videos=req.max_videos,
         playlist_id=info.get("playlist_id"),
         client_ip=client_ip,
-        session_id=session_id
+        session_id=session_id,
+        user_id=user.id if user else None,
+        user_role=user.role.value if user else None
     )
 
-    # 提交所有任務到佇列
-    for task_id in result["task_ids"]:
-        await download_queue.submit(task_id, downloader.execute_task, task_id)
+    # 整批提交到佇列（同一租戶的任務共用公平排程額度）
+    await download_queue.submit_many([
+        (task_id, downloader.execute_task, (task_id,), downloader.get_task_status(task_id))
+        for task_id in result["task_ids"]
+    ])
 
     return {
         "playlist_id": result["playlist_id"],
@@ -420,6 +705,29 @@ async def get_playlist_status(playlist_id: str):
     }
 
 
+@router.delete("/playlist/{playlist_id}")
+async def cancel_playlist(playlist_id: str):
+    """
+    取消整個播放清單
+
+    排隊中的任務直接從佇列移除，執行中的任務一併中斷
+    """
+    task_ids = downloader.get_playlist_tasks(playlist_id)
+    if not task_ids:
+        raise HTTPException(status_code=404, detail="找不到該播放清單的下載任務")
+
+    removed = await download_queue.cancel_group(playlist_id)
+    cancelled = [tid for tid in task_ids if downloader.cancel_task(tid)["success"]]
+
+    return {
+        "success": True,
+        "playlist_id": playlist_id,
+        "cancelled_count": len(cancelled),
+        "removed_from_queue": len(removed),
+        "message": f"已取消 {len(cancelled)} 個任務"
+    }
+
+
 # ===== WebSocket 進度推送 =====
 
 @router.websocket("/ws/progress/{task_id}")
@@ -559,31 +867,23 @@ async def download_file(filename: str, auto_delete: bool = True):
         filename: 檔案名稱
         auto_delete: 下載後自動刪除 Server 上的檔案（預設 True）
     """
-    file_path = downloader.download_path / filename
+    # 安全檢查：只提供 downloads 資料夾頂層的待取檔案（.artifacts/ 等內部資料不對外）
+    file_path = storage_manager.resolve(filename)
+    if file_path is None:
+        raise HTTPException(status_code=403, detail="禁止存取")
 
     if not file_path.exists() or not file_path.is_file():
         raise HTTPException(status_code=404, detail="檔案不存在")
 
-    # 安全檢查：確保路徑在 downloads 資料夾內
-    try:
-        file_path.resolve().relative_to(downloader.download_path.resolve())
-    except ValueError:
-        raise HTTPException(status_code=403, detail="禁止存取")
-
     # 設定檔名（支援中文）
     encoded_filename = urllib.parse.quote(filename)
 
-    # 使用 background task 在回應完成後刪除檔案
-    from fastapi import BackgroundTasks
+    # 使用 background task 在回應完成後釋放待取檔案（快取成品另有連結，熱門影片不必重抓）
     from starlette.background import BackgroundTask
 
     def delete_file_after_download():
-        if auto_delete and file_path.exists():
-            try:
-                file_path.unlink()
-                print(f"[清理] 已刪除: {filename}")
-            except Exception as e:
-                print(f"[清理] 刪除失敗: {filename} - {e}")
+        if auto_delete and storage_manager.release(filename):
+            print(f"[清理] 已刪除: {filename}")
 
     return FileResponse(
         path=file_path,
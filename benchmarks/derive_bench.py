@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+本地衍生基準測試
+以 ffmpeg 產生一支測試影片當作已下載的完整成品，比較：
+- 線上：從限速的本機 HTTP 伺服器重新下載（模擬回 YouTube 抓取）再抽音訊 / 剪片段
+- 本地：LocalDeriver 直接從成品抽音訊（stream copy）/ 剪片段
+加上 --url 時另外實測一次真正的 YouTube 音訊下載
+
+用法: python benchmarks/derive_bench.py [--duration 300] [--rate-kb 2048] [--clip 60] [--url URL]
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+
+from services.derive import LocalDeriver
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """每條連線限速的單檔伺服器（支援 Range，ffmpeg 剪片段時會 seek）"""
+
+    source: Path = None
+    rate = 2 * 1024 * 1024  # bytes/s per connection
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/video.mp4":
+            self.send_error(404)
+            return
+        total = self.source.stat().st_size
+        start, end = 0, total - 1
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first or 0)
+            end = min(int(last), total - 1) if last else total - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        started = time.monotonic()
+        sent = 0
+        with open(self.source, "rb") as f:
+            f.seek(start)
+            while sent < end - start + 1:
+                chunk = f.read(min(64 * 1024, end - start + 1 - sent))
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                sent += len(chunk)
+                ahead = sent / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+def make_source(path: Path, duration: int):
+    """產生 720p30 的 H.264 + AAC 測試影片（2 秒一個 keyframe，與 YouTube 相近）"""
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(duration), "-c:v", "libx264", "-preset", "ultrafast", "-g", "60",
+        "-c:a", "aac", "-b:a", "192k", "-shortest", str(path),
+    ], check=True)
+
+
+def remote_fetch(url: str, out_dir: Path, audio_only: bool, clip=None) -> float:
+    """以與 Downloader 相同的 yt-dlp 選項重新抓取，回傳耗時"""
+    ydl_opts = {
+        'outtmpl': str(out_dir / 'remote.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'overwrites': True,
+    }
+    if audio_only:
+        ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'aac',
+            'preferredquality': '192',
+        }]
+    if clip:
+        ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(None, [clip])
+        ydl_opts['force_keyframes_at_cuts'] = True
+    started = time.monotonic()
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    return time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地衍生基準測試")
+    parser.add_argument("--duration", type=int, default=300, help="測試影片長度（秒）")
+    parser.add_argument("--rate-kb", type=int, default=2048, help="模擬線上下載的每連線速度（KB/s）")
+    parser.add_argument("--clip", type=int, default=60, help="片段長度（秒）")
+    parser.add_argument("--url", help="另外實測的 YouTube 網址（純音訊）")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        print("需要 ffmpeg")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "source.mp4"
+        make_source(source, args.duration)
+        size_mb = source.stat().st_size / 1024 / 1024
+        print(f"成品 {args.duration} 秒 / {size_mb:.1f} MB，線上模擬每連線 {args.rate_kb} KB/s")
+
+        FileHandler.source = source
+        FileHandler.rate = args.rate_kb * 1024
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+        deriver = LocalDeriver()
+        clip_start = max(0, args.duration / 2 - args.clip / 2)
+        clip = (clip_start, clip_start + args.clip)
+        cases = [
+            ("純音訊", True, None),
+            (f"片段 {args.clip} 秒", False, clip),
+        ]
+        print(f"\n{'請求':<14} {'線上(秒)':>10} {'本地(秒)':>10} {'加速':>8}")
+        for label, audio_only, case_clip in cases:
+            remote = remote_fetch(url, tmp, audio_only, case_clip)
+            output = tmp / ("local.m4a" if audio_only else "local.mp4")
+            start, end = case_clip if case_clip else (None, None)
+            local = deriver.derive(source, output, audio_only, start, end)
+            print(f"{label:<14} {remote:>10.2f} {local:>10.2f} {remote / local:>7.1f}x")
+
+        if args.url:
+            remote = remote_fetch(args.url, tmp, True)
+            print(f"\nYouTube 實測純音訊下載: {remote:.2f} 秒")
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
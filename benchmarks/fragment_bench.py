@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+多連線下載基準測試
+在本機起一個每條連線限速的 fragment 伺服器（模擬 YouTube 對單一連線的節流），
+比較單一連線與多個 fragment 並行下載的吞吐量；有安裝 aria2c 時另外比較單檔分段下載
+
+用法: python benchmarks/fragment_bench.py [--fragments 40] [--size-kb 256] [--rate-kb 512]
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+
+from services.transfer import TransferTuner
+
+
+class ThrottledHandler(BaseHTTPRequestHandler):
+    """每條連線限速的 HLS fragment 與單檔（支援 Range）"""
+
+    fragment_count = 40
+    fragment_size = 256 * 1024
+    rate = 512 * 1024  # bytes/s per connection
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_throttled(self, length: int):
+        chunk = 16 * 1024
+        sent = 0
+        started = time.monotonic()
+        while sent < length:
+            size = min(chunk, length - sent)
+            try:
+                self.wfile.write(b"\0" * size)
+            except (BrokenPipeError, ConnectionResetError):
+                return  # 客戶端提前關閉（例如只探測檔案大小）
+            sent += size
+            # 以連線為單位限速
+            ahead = sent / self.rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def do_GET(self):
+        if self.path == "/video.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+            for i in range(self.fragment_count):
+                lines += ["#EXTINF:2.0,", f"/frag/{i}.ts"]
+            lines.append("#EXT-X-ENDLIST")
+            body = "\n".join(lines).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith("/frag/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp2t")
+            self.send_header("Content-Length", str(self.fragment_size))
+            self.end_headers()
+            self._send_throttled(self.fragment_size)
+        elif self.path == "/video.mp4":
+            total = self.fragment_size * self.fragment_count
+            start, end = 0, total - 1
+            range_header = self.headers.get("Range")
+            if range_header and range_header.startswith("bytes="):
+                first, _, last = range_header[6:].partition("-")
+                start = int(first or 0)
+                end = min(int(last), total - 1) if last else total - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            self._send_throttled(end - start + 1)
+        else:
+            self.send_error(404)
+
+
+def run_download(url: str, tuner: TransferTuner, fragments: int, external: bool) -> float:
+    """下載一次並回傳吞吐量（bytes/s）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ydl_opts = {
+            'outtmpl': str(Path(tmp) / 'out.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'fixup': 'never',
+        }
+        tuner.apply(ydl_opts, fragments, external=external)
+        started = time.monotonic()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([url])
+        elapsed = time.monotonic() - started
+        size = sum(f.stat().st_size for f in Path(tmp).iterdir() if f.is_file())
+    return size / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多連線下載基準測試")
+    parser.add_argument("--fragments", type=int, default=40, help="fragment 數量")
+    parser.add_argument("--size-kb", type=int, default=256, help="每個 fragment 大小（KB）")
+    parser.add_argument("--rate-kb", type=int, default=512, help="每條連線限速（KB/s）")
+    args = parser.parse_args()
+
+    ThrottledHandler.fragment_count = args.fragments
+    ThrottledHandler.fragment_size = args.size_kb * 1024
+    ThrottledHandler.rate = args.rate_kb * 1024
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottledHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    total_mb = args.fragments * args.size_kb / 1024
+    print(f"資料量 {total_mb:.1f} MB，每條連線限速 {args.rate_kb} KB/s")
+
+    native = TransferTuner(backend="native", http_chunk_size=0)
+    print(f"\n{'模式':<24} {'連線數':>6} {'吞吐量(KB/s)':>14} {'倍數':>6}")
+    baseline = None
+    for fragments in (1, 2, 4, 8, 16):
+        speed = run_download(f"{base}/video.m3u8", native, fragments, external=False)
+        baseline = baseline or speed
+        print(f"{'HLS fragments':<24} {fragments:>6} {speed / 1024:>14.0f} {speed / baseline:>6.1f}")
+
+    speed = run_download(f"{base}/video.mp4", native, 1, external=False)
+    single = speed
+    print(f"{'單檔 單一連線':<22} {1:>6} {speed / 1024:>14.0f} {1.0:>6.1f}")
+    if shutil.which("aria2c"):
+        aria2c = TransferTuner(backend="aria2c")
+        for fragments in (4, 8, 16):
+            speed = run_download(f"{base}/video.mp4", aria2c, fragments, external=True)
+            print(f"{'單檔 aria2c 分段':<22} {fragments:>6} {speed / 1024:>14.0f} {speed / single:>6.1f}")
+    else:
+        print("（未安裝 aria2c，略過單檔分段下載）")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
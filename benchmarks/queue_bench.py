@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+佇列效能基準測試
+量測不同佇列深度下，取出任務、查詢排隊位置與取得統計的單次成本，
+確認成本不隨排隊數量成長
+
+用法: python benchmarks/queue_bench.py
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.queue import TaskQueue
+
+
+async def _noop():
+    await asyncio.sleep(0)
+
+
+async def bench_depth(depth: int, rounds: int = 200) -> dict:
+    """在指定深度下量測各操作的平均耗時（微秒）"""
+    queue = TaskQueue(max_concurrent=1, max_per_tenant=1)
+    queue.running_count = 1  # 佔住名額，讓提交的任務全部留在佇列
+
+    for i in range(depth):
+        await queue.submit(f"t{i}", _noop, meta={"session_id": "bulk"})
+    last_id = f"t{depth - 1}"
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        queue.get_queue_info(last_id)
+    info_us = (time.perf_counter() - start) / rounds * 1e6
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        queue.get_stats()
+    stats_us = (time.perf_counter() - start) / rounds * 1e6
+
+    # 取出：放開一個名額讓佇列派發一筆，再佔回
+    start = time.perf_counter()
+    for _ in range(rounds):
+        queue.running_count = 0
+        await queue._try_process()
+    dispatch_us = (time.perf_counter() - start) / rounds * 1e6
+    await asyncio.sleep(0.01)
+
+    return {"depth": depth, "get_queue_info": info_us, "get_stats": stats_us, "dispatch": dispatch_us}
+
+
+async def main():
+    print(f"{'深度':>8} {'get_queue_info(us)':>20} {'get_stats(us)':>16} {'dispatch(us)':>14}")
+    for depth in (500, 5000, 50000):
+        r = await bench_depth(depth)
+        print(f"{r['depth']:>8} {r['get_queue_info']:>20.2f} {r['get_stats']:>16.2f} {r['dispatch']:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+智慧剪輯基準測試
+以 ffmpeg 產生一支帶 B 幀、固定 GOP 的 H.264 測試影片（與 YouTube 的 avc1 格式相近），
+對不同長度的片段比較 ffmpeg 子程序耗用的 CPU 時間：
+- 整段重新編碼：原本片段模式的做法（LocalDeriver 的完整重新編碼指令）
+- 智慧剪輯：只重新編碼兩端不完整的 GOP，中間 stream copy
+並檢查智慧剪輯的幀數、第一幀與最後一幀與來源同一範圍一致（切點精準到幀）
+
+用法: python benchmarks/smartcut_bench.py [--duration 200] [--clips 30,90,180] [--gop 2]
+"""
+
+import sys
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.derive import LocalDeriver
+from services.smart_cut import SmartCutter
+
+
+def make_source(path: Path, duration: int, gop: float):
+    """產生 720p30 的 H.264（含 B 幀）+ AAC 測試影片"""
+    keyint = int(gop * 30)
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(duration), "-c:v", "libx264", "-preset", "veryfast",
+        "-g", str(keyint), "-keyint_min", str(keyint), "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k", "-shortest", str(path),
+    ], check=True)
+
+
+def child_cpu() -> float:
+    """已結束的子程序累計 CPU 秒數（user + sys）"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(func) -> tuple:
+    """回傳 (牆鐘秒數, 子程序 CPU 秒數)"""
+    cpu = child_cpu()
+    started = time.monotonic()
+    func()
+    return time.monotonic() - started, child_cpu() - cpu
+
+
+def decode_gray(path: Path, extra=()) -> bytes:
+    """解碼成 160x90 灰階畫面（比對用；passthrough 不補幀，起點不對齊幀時才不會多出重複的第一幀）"""
+    return subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", *extra, "-i", str(path),
+        "-map", "0:v:0", "-fps_mode", "passthrough",
+        "-s", "160x90", "-pix_fmt", "gray", "-f", "rawvideo", "-",
+    ], capture_output=True, check=True).stdout
+
+
+def frame_accurate(source: Path, output: Path, start: float, end: float) -> str:
+    """幀數與頭尾畫面都與來源同一範圍一致才算精準"""
+    size = 160 * 90
+    expected = decode_gray(source, ["-ss", f"{start}", "-t", f"{end - start}"])
+    actual = decode_gray(output)
+    if len(expected) != len(actual):
+        return f"幀數不符 {len(expected) // size}/{len(actual) // size}"
+    for index in (0, len(actual) // size - 1):
+        a = expected[index * size:(index + 1) * size]
+        b = actual[index * size:(index + 1) * size]
+        # 兩端是重新編碼的，允許壓縮誤差；錯一幀的差異遠大於此
+        if sum(abs(x - y) for x, y in zip(a, b)) / size > 1.0:
+            return f"第 {index} 幀不符"
+    return f"OK（{len(actual) // size} 幀）"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智慧剪輯基準測試")
+    parser.add_argument("--duration", type=int, default=200, help="測試影片長度（秒）")
+    parser.add_argument("--clips", default="30,90,180", help="片段長度（秒，逗號分隔，最長 1800）")
+    parser.add_argument("--gop", type=float, default=2, help="keyframe 間隔（秒）")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        print("需要 ffmpeg")
+        return
+    lengths = [int(x) for x in args.clips.split(",")]
+    if max(lengths) + 10 > args.duration:
+        print("測試影片需比最長的片段長 10 秒以上")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "source.mp4"
+        print(f"產生 {args.duration} 秒測試影片（GOP {args.gop} 秒）...")
+        make_source(source, args.duration, args.gop)
+
+        deriver = LocalDeriver()
+        cutter = SmartCutter(ffprobe=shutil.which("ffprobe"))
+        print(f"\n{'片段(秒)':>8} {'重新編碼 CPU':>12} {'智慧剪輯 CPU':>12} {'CPU 比':>8} "
+              f"{'重新編碼牆鐘':>12} {'智慧剪輯牆鐘':>12}  切點")
+        for length in lengths:
+            # 起點刻意不對齊 keyframe（也不對齊整秒），兩端都要重新編碼
+            start = 5.37
+            end = start + length
+            full = tmp / f"full_{length}.mp4"
+            smart = tmp / f"smart_{length}.mp4"
+            full_wall, full_cpu = measure(lambda: subprocess.run(
+                deriver.build_command(source, full, False, start, end), check=True
+            ))
+            smart_wall, smart_cpu = measure(lambda: cutter.cut(source, start, end, smart))
+            accuracy = frame_accurate(source, smart, start, end)
+            print(f"{length:>8} {full_cpu:>12.2f} {smart_cpu:>12.2f} {full_cpu / smart_cpu:>7.1f}x "
+                  f"{full_wall:>12.2f} {smart_wall:>12.2f}  {accuracy}")
+
+        stats = cutter.get_stats()
+        print(f"\n智慧剪輯重新編碼的比例: {stats['encoded_ratio']:.1%}（其餘 stream copy）")
+
+
+if __name__ == "__main__":
+    main()
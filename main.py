@@ -15,7 +15,6 @@ import uvicorn
 import asyncio
 from contextlib import asynccontextmanager
 from pathlib import Path
-from datetime import datetime, timedelta
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -29,6 +28,10 @@ from api.auth_routes import router as auth_router
 from api.monitor_routes import router as monitor_router
 from services.downloader import downloader
 from services.queue import download_queue
+from services.concurrency import concurrency_controller
+from services.watchdog import stall_watchdog
+from services.storage import storage_manager
+from services.executors import shutdown_executors
 from services.ytdlp_updater import ytdlp_updater
 from services.websocket_manager import progress_notifier
 from services.monitor import monitor
@@ -38,31 +41,6 @@ from services.session import SessionMiddleware
 limiter = Limiter(key_func=get_remote_address)
 
 
-# 自動清理設定
-AUTO_CLEANUP_INTERVAL = 3600  # 每小時檢查一次
-FILE_MAX_AGE_HOURS = 24       # 檔案保留 24 小時
-
-
-async def cleanup_old_files():
-    """定時清理超過 24 小時的舊檔案"""
-    while True:
-        await asyncio.sleep(AUTO_CLEANUP_INTERVAL)
-        try:
-            now = datetime.now()
-            count = 0
-            for file in downloader.download_path.iterdir():
-                if file.is_file() and file.suffix != '.gitkeep':
-                    file_age = now - datetime.fromtimestamp(file.stat().st_mtime)
-                    if file_age > timedelta(hours=FILE_MAX_AGE_HOURS):
-                        file.unlink()
-                        count += 1
-                        print(f"[自動清理] 刪除過期檔案: {file.name}")
-            if count > 0:
-                print(f"[自動清理] 共清理 {count} 個過期檔案")
-        except Exception as e:
-            print(f"[自動清理] 錯誤: {e}")
-
-
 async def check_ytdlp_update_on_startup():
     """啟動時檢查 yt-dlp 更新"""
     try:
@@ -79,12 +57,28 @@ async def check_ytdlp_update_on_startup():
         print(f"[yt-dlp] 檢查更新失敗: {e}")
 
 
+async def restore_pending_downloads():
+    """啟動時恢復上次未完成的下載任務（依原提交順序重新派發）"""
+    try:
+        task_ids = downloader.restore_pending_tasks()
+        await download_queue.submit_many([
+            (task_id, downloader.execute_task, (task_id,), downloader.get_task_status(task_id))
+            for task_id in task_ids
+        ])
+        if task_ids:
+            print(f"[啟動] 已恢復 {len(task_ids)} 個未完成的下載任務")
+    except Exception as e:
+        print(f"[啟動] 恢復下載任務失敗: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """應用程式生命週期管理"""
     # 啟動時
-    cleanup_task = asyncio.create_task(cleanup_old_files())
-    print("[啟動] 自動清理任務已啟動（24小時過期檔案）")
+    # 空間管理：逾期未取的檔案刪除，空間不足時依 LRU/LFU 淘汰快取成品
+    cleanup_task = asyncio.create_task(storage_manager.run())
+    budget = f"{storage_manager.budget_bytes // 1024 // 1024} MB" if storage_manager.budget_bytes else "不限"
+    print(f"[啟動] 空間管理已啟動（預算 {budget}，{storage_manager.policy.upper()}，未取檔案保留 {storage_manager.pending_ttl / 3600:g} 小時）")
 
     # 啟動 WebSocket 進度通知器
     await progress_notifier.start()
@@ -97,13 +91,32 @@ async def lifespan(app: FastAPI):
     monitor_task = asyncio.create_task(monitor.start_monitoring())
     print("[啟動] 監控告警系統已啟用")
 
+    # 啟動自適應併發控制
+    concurrency_task = asyncio.create_task(concurrency_controller.run(download_queue))
+    print(f"[啟動] 自適應併發控制已啟用（{concurrency_controller.floor}-{concurrency_controller.ceiling}）")
+
+    # 啟動停滯監視：長時間沒進度或過慢的下載換出口續傳
+    watchdog_task = asyncio.create_task(stall_watchdog.run(downloader))
+    print(f"[啟動] 下載停滯監視已啟用（{int(stall_watchdog.window)} 秒 / {int(stall_watchdog.speed_floor / 1024)} KB/s）")
+
+    # 名額被 bulk 佔滿時，由下載器暫停被搶占的任務
+    download_queue.preempt_handler = downloader.preempt_task
+    # 出口被頻率限制斷路器斷開時暫停派發，冷卻後只放探測任務
+    download_queue.dispatch_gate = downloader.dispatch_wait
+
+    # 恢復持久化佇列中的任務
+    await restore_pending_downloads()
+
     yield
+    concurrency_task.cancel()
+    watchdog_task.cancel()
     # 停止監控
     monitor.stop_monitoring()
     monitor_task.cancel()
     # 關閉時
     cleanup_task.cancel()
     await progress_notifier.stop()
+    shutdown_executors()
     print("[關閉] 清理任務已停止")
 
 app = FastAPI(
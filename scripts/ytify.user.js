@@ -63,6 +63,7 @@
         YTIFY_API: YTIFY_API_URL,
         POLL_INTERVAL: 1500,
         POLL_TIMEOUT: 600000,
+        ADMISSION_MAX_RETRIES: 5,   // 伺服器忙碌（503）時依 Retry-After 重新提交的次數上限
     };
 
     const YTIFY_FORMATS = [
@@ -716,7 +717,14 @@
                     try {
                         const result = JSON.parse(res.responseText);
                         if (res.status >= 400) {
-                            reject(new Error(result.detail || result.error || '請求失敗'));
+                            const detail = result.detail?.message || result.detail;
+                            const err = new Error(detail || result.error || '請求失敗');
+                            if (res.status === 503) {
+                                // 佇列積壓或斷路器斷開：帶上伺服器建議的等待秒數
+                                const header = /^retry-after:\s*(\d+)/im.exec(res.responseHeaders || '');
+                                err.retryAfter = header ? parseInt(header[1], 10) : result.detail?.retry_after;
+                            }
+                            reject(err);
                         } else {
                             resolve(result);
                         }
@@ -1012,7 +1020,7 @@
     }
 
     function pollTaskStatus(taskId) {
-        const startTime = Date.now();
+        let startTime = Date.now();
         let fakeProgress = 0;
 
         const poll = async () => {
@@ -1062,8 +1070,15 @@
 
                 updatePanel();
 
+                // 排隊時間不計入下載超時
+                if (status.status === 'queued') startTime = Date.now();
+
                 if (!['completed', 'failed'].includes(status.status)) {
-                    setTimeout(poll, CONFIG.POLL_INTERVAL);
+                    // 排隊中依伺服器建議的間隔輪詢，排很久時不必一直問
+                    const delay = status.status === 'queued' && status.poll_after
+                        ? Math.max(CONFIG.POLL_INTERVAL, status.poll_after * 1000)
+                        : CONFIG.POLL_INTERVAL;
+                    setTimeout(poll, delay);
                 }
             } catch {
                 setTimeout(poll, CONFIG.POLL_INTERVAL * 2);
@@ -1109,7 +1124,25 @@
                 body.clip_start = clip.start;
                 body.clip_end = clip.end;
             }
-            const result = await ytifyRequest('POST', '/api/download', body, 60000);
+            let result;
+            for (let attempt = 0; ; attempt++) {
+                try {
+                    result = await ytifyRequest('POST', '/api/download', body, 60000);
+                    break;
+                } catch (e) {
+                    const task = tasks.get(tempId);
+                    if (!e.retryAfter || attempt >= CONFIG.ADMISSION_MAX_RETRIES || !task) throw e;
+                    // 伺服器忙碌：照 Retry-After 退讓後重新提交
+                    task.status = 'retrying';
+                    task.speed = `伺服器忙碌，${e.retryAfter} 秒後重新提交`;
+                    updatePanel();
+                    await new Promise(r => setTimeout(r, e.retryAfter * 1000));
+                    if (!tasks.has(tempId)) return;
+                    task.status = 'queued';
+                    task.speed = '';
+                    updatePanel();
+                }
+            }
 
             if (!result.task_id) throw new Error('無法建立下載任務');
 
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+下載成品快取
+以（影片 ID, 解析後的格式, 是否純音訊, 片段起訖）為鍵，每個成品只存一份在
+downloads/.artifacts/；之後相同的請求不再下載，直接在 downloads/ 建立一個
+該請求專用的硬連結（各自被 auto_delete 刪除也不影響快取本體）
+索引存在 SQLite，重啟後沿用
+"""
+
+import os
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, Optional
+from contextlib import contextmanager
+
+
+class ArtifactStore:
+    """成品索引（與下載歷史共用資料庫檔案）"""
+
+    def __init__(self, db_path: str = "./data/history.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        """初始化資料表"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    key TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    audio_only INTEGER NOT NULL DEFAULT 0,
+                    clip_start REAL,
+                    clip_end REAL,
+                    path TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    title TEXT,
+                    format_id TEXT,
+                    duration REAL,
+                    thumbnail TEXT,
+                    channel TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    last_access TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_video ON artifacts(video_id)")
+            conn.commit()
+
+    @contextmanager
+    def _get_conn(self):
+        """取得資料庫連線"""
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self) -> list:
+        """讀取全部成品"""
+        with self._get_conn() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM artifacts").fetchall()]
+
+    def upsert(self, entry: Dict[str, Any]):
+        """新增或取代成品"""
+        columns = list(entry)
+        with self._get_conn() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO artifacts ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [entry[column] for column in columns]
+            )
+            conn.commit()
+
+    def touch(self, key: str, last_access: str):
+        """記錄一次命中"""
+        with self._get_conn() as conn:
+            conn.execute(
+                "UPDATE artifacts SET hits = hits + 1, last_access = ? WHERE key = ?",
+                (last_access, key)
+            )
+            conn.commit()
+
+    def delete(self, key: str):
+        """移除成品"""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            conn.commit()
+
+
+class ArtifactCache:
+    """下載成品快取（下載執行緒與 API 都會呼叫，需執行緒安全）"""
+
+    def __init__(self, download_path: Path, store: Optional[ArtifactStore] = None):
+        """
+        Args:
+            download_path: 下載資料夾（成品放在其下的 .artifacts/）
+            store: 索引持久化（None 表示只存在記憶體）
+        """
+        self.download_path = Path(download_path)
+        self.root = self.download_path / ".artifacts"
+        self.store = store
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self._window = {"hits": 0, "misses": 0, "bytes": 0}  # 上次回報監控後的累計
+        if store is not None:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "ArtifactCache":
+        """從環境變數建立（YTIFY_ARTIFACT_CACHE）"""
+        cache = cls(Path("./downloads"), store=ArtifactStore())
+        cache.enabled = os.environ.get("YTIFY_ARTIFACT_CACHE", "true").lower() == "true"
+        return cache
+
+    def _load(self):
+        try:
+            rows = self.store.load()
+        except sqlite3.Error as e:
+            print(f"[成品快取] 讀取索引失敗: {e}")
+            return
+        for row in rows:
+            self._entries[row["key"]] = row
+
+    @staticmethod
+    def make_key(video_id: str, format_selector: str, audio_only: bool,
+                 clip_start: Optional[float] = None, clip_end: Optional[float] = None) -> str:
+        """
+        成品鍵
+
+        Args:
+            video_id: 影片 ID
+            format_selector: 解析後的 yt-dlp 格式字串（畫質選項不同但解析結果相同的請求共用）
+            audio_only: 是否純音訊
+            clip_start: 片段起點（秒）
+            clip_end: 片段終點（秒）
+        """
+        clip = "" if clip_start is None else f"{float(clip_start)}-{float(clip_end)}"
+        raw = "|".join((video_id, format_selector, "audio" if audio_only else "video", clip))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+    def _path(self, entry: Dict[str, Any]) -> Path:
+        return self.root / entry["path"]
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查詢成品並計入命中率
+
+        Returns:
+            成品項目；沒有或檔案已不在時回傳 None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._path(entry).is_file():
+                # 檔案被手動刪除：索引跟著移除
+                del self._entries[key]
+                self._delete_row(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self._window["misses"] += 1
+                return None
+            self.hits += 1
+            self.bytes_served += entry["size"]
+            self._window["hits"] += 1
+            self._window["bytes"] += entry["size"]
+            entry["hits"] += 1
+            entry["last_access"] = datetime.now().isoformat()
+        if self.store is not None:
+            try:
+                self.store.touch(key, entry["last_access"])
+            except sqlite3.Error as e:
+                print(f"[成品快取] 更新索引失敗: {e}")
+        return dict(entry)
+
+    def _delete_row(self, key: str):
+        if self.store is not None:
+            try:
+                self.store.delete(key)
+            except sqlite3.Error as e:
+                print(f"[成品快取] 更新索引失敗: {e}")
+
+    def add(self, key: str, file_path: Path, video_id: str, format_selector: str, audio_only: bool,
+            clip_start: Optional[float] = None, clip_end: Optional[float] = None,
+            **meta) -> Optional[Dict[str, Any]]:
+        """
+        收錄剛下載完成的檔案（以硬連結保存，不多佔空間）
+
+        Args:
+            key: make_key 算出的成品鍵
+            file_path: downloads/ 中的檔案
+            meta: title / format_id / duration / thumbnail / channel
+
+        Returns:
+            成品項目；停用或無法收錄時回傳 None
+        """
+        file_path = Path(file_path)
+        if not self.enabled or not file_path.is_file():
+            return None
+        self.root.mkdir(parents=True, exist_ok=True)
+        stored = self.root / f"{key}{file_path.suffix}"
+        try:
+            if stored.exists():
+                stored.unlink()
+            os.link(file_path, stored)
+        except OSError as e:
+            # 檔案系統不支援硬連結就不收錄，避免多存一份
+            print(f"[成品快取] 無法建立硬連結，略過收錄: {e}")
+            return None
+
+        now = datetime.now().isoformat()
+        entry = {
+            "key": key,
+            "video_id": video_id,
+            "format": format_selector,
+            "audio_only": int(audio_only),
+            "clip_start": clip_start,
+            "clip_end": clip_end,
+            "path": stored.name,
+            "filename": file_path.name,
+            "title": meta.get("title"),
+            "format_id": meta.get("format_id"),
+            "duration": meta.get("duration"),
+            "thumbnail": meta.get("thumbnail"),
+            "channel": meta.get("channel"),
+            "size": stored.stat().st_size,
+            "hits": 0,
+            "created_at": now,
+            "last_access": now,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        if self.store is not None:
+            try:
+                self.store.upsert(entry)
+            except sqlite3.Error as e:
+                print(f"[成品快取] 儲存索引失敗: {e}")
+        print(f"[成品快取] 已收錄: {file_path.name}")
+        return dict(entry)
+
+    def materialize(self, entry: Dict[str, Any], tag: str) -> Optional[str]:
+        """
+        在 downloads/ 建立請求專用的檔案（硬連結，失敗時複製）
+
+        Args:
+            entry: lookup 取得的成品
+            tag: 檔名已被占用時附加的識別（通常是 task_id）
+
+        Returns:
+            downloads/ 中的檔名；成品已不在時回傳 None
+        """
+        source = self._path(entry)
+        name = Path(entry["filename"])
+        target = self.download_path / name
+        if target.exists():
+            # 原檔名還被其他請求占用：另開一個，各自的 auto_delete 互不影響
+            target = self.download_path / f"{name.stem} ({tag}){name.suffix}"
+        try:
+            if target.exists():
+                target.unlink()
+            os.link(source, target)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            shutil.copy2(source, target)
+        return target.name
+
+    def find_full(self, video_id: Optional[str]) -> list:
+        """同一支影片未剪輯的成品（供本地衍生音訊、片段；不計入命中率）"""
+        if not self.enabled or not video_id:
+            return []
+        with self._lock:
+            return [
+                dict(entry) for entry in self._entries.values()
+                if entry["video_id"] == video_id and entry["clip_start"] is None
+                and self._path(entry).is_file()
+            ]
+
+    def path_of(self, entry: Dict[str, Any]) -> Path:
+        """成品檔案路徑"""
+        return self._path(entry)
+
+    def entries(self) -> list:
+        """全部成品的快照（供空間管理挑選淘汰對象）"""
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def evict(self, key: str) -> bool:
+        """
+        移除成品與其檔案
+
+        Returns:
+            是否刪除了檔案
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._delete_row(key)
+        try:
+            self._path(entry).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"[成品快取] 刪除失敗: {entry['path']} - {e}")
+            return False
+
+    def take_window(self) -> Dict[str, int]:
+        """取出上次呼叫以來的命中統計並歸零（供監控定期記錄）"""
+        with self._lock:
+            window = self._window
+            self._window = {"hits": 0, "misses": 0, "bytes": 0}
+            return window
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取命中統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_mb": round(sum(e["size"] for e in self._entries.values()) / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 2) if lookups else None,
+                "served_mb": round(self.bytes_served / 1024 / 1024, 1),
+            }
+
+
+# 全域實例
+artifact_cache = ArtifactCache.from_env()
@@ -48,6 +48,14 @@ ROLE_QUOTAS = {
     UserRole.GUEST: {"daily": 5, "monthly": 50},
 }
 
+# 角色排程權重（佇列公平排程時，權重越高分到的執行機會越多）
+ROLE_WEIGHTS = {
+    UserRole.ADMIN: 8,
+    UserRole.VIP: 4,
+    UserRole.USER: 2,
+    UserRole.GUEST: 1,
+}
+
 
 class AuthDB:
     """用戶認證資料庫"""
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+YouTube 頻率限制斷路器
+以出口（代理 URL 或 direct）為單位統計 RATE_LIMITED，短時間內累積 K 次就斷開：
+停止派發新的擷取與下載，冷卻後只放一個探測請求（half-open），成功才恢復
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """單一出口的斷路器狀態"""
+
+    def __init__(self, scope: str, cooldown: float):
+        self.scope = scope
+        self.state = CLOSED
+        self.failures: deque = deque()   # 視窗內 RATE_LIMITED 的時間
+        self.cooldown = cooldown         # 目前的冷卻秒數（探測失敗會加倍）
+        self.opened_at: Optional[float] = None
+        self.probe_inflight = False
+        self.probe_owner: Optional[str] = None  # 持有探測名額的任務（派發閘門取得時尚未指定）
+        self.trips = 0
+        self.reason = ""
+        self.changed_at = datetime.now().isoformat()
+
+    def remaining(self) -> float:
+        """距離可以探測還有幾秒"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+
+class RateLimitBreaker:
+    """依出口分開的斷路器集合（progress hook、下載執行緒都會呼叫，需執行緒安全）"""
+
+    def __init__(
+        self,
+        threshold: int = 3,
+        window: float = 60.0,
+        cooldown: float = 120.0,
+        max_cooldown: float = 1800.0,
+        probe_timeout: float = 600.0,
+    ):
+        """
+        Args:
+            threshold: 視窗內累積幾次 RATE_LIMITED 就斷開
+            window: 統計視窗（秒）
+            cooldown: 斷開後多久放出探測請求（秒）
+            max_cooldown: 探測連續失敗時冷卻時間的上限（秒）
+            probe_timeout: 探測請求多久沒有結果就視為遺失，再放一個
+        """
+        self.threshold = max(1, threshold)
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._probe_started: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimitBreaker":
+        """從環境變數建立（YTIFY_BREAKER_THRESHOLD / _WINDOW / _COOLDOWN / YTIFY_CIRCUIT_BREAKER）"""
+        breaker = cls(
+            threshold=int(os.environ.get("YTIFY_BREAKER_THRESHOLD", "3")),
+            window=float(os.environ.get("YTIFY_BREAKER_WINDOW", "60")),
+            cooldown=float(os.environ.get("YTIFY_BREAKER_COOLDOWN", "120")),
+        )
+        breaker.enabled = os.environ.get("YTIFY_CIRCUIT_BREAKER", "true").lower() == "true"
+        return breaker
+
+    def _get(self, scope: str) -> CircuitBreaker:
+        breaker = self._breakers.get(scope)
+        if breaker is None:
+            breaker = CircuitBreaker(scope, self.base_cooldown)
+            self._breakers[scope] = breaker
+        return breaker
+
+    def acquire(self, scope: str, owner: Optional[str] = None) -> float:
+        """
+        要求對此出口送出請求
+
+        Args:
+            scope: 出口
+            owner: 探測名額的持有者（佇列派發閘門取得時不知道是哪個任務，之後由任務 claim_probe 認領）
+
+        Returns:
+            0 表示可以送出（半開狀態下代表取得唯一的探測名額）；否則為建議等待秒數
+        """
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            breaker = self._breakers.get(scope)
+            if breaker is None or breaker.state == CLOSED:
+                return 0.0
+
+            remaining = breaker.remaining()
+            if remaining > 0:
+                return remaining
+
+            if breaker.probe_inflight:
+                started = self._probe_started.get(scope, 0)
+                if time.monotonic() - started < self.probe_timeout:
+                    return min(self.probe_timeout, 30.0)
+
+            self._set_state(breaker, HALF_OPEN)
+            breaker.probe_inflight = True
+            breaker.probe_owner = owner
+            self._probe_started[scope] = time.monotonic()
+            print(f"[斷路器] {scope} 半開，送出探測請求")
+            return 0.0
+
+    def claim_probe(self, scope: str, owner: str) -> bool:
+        """
+        認領尚未指定持有者的探測名額（派發閘門取得後，由被派發的任務認領）
+
+        Returns:
+            是否認領到（任務結束時要以同一個 owner 呼叫 release）
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            breaker = self._breakers.get(scope)
+            if (breaker is None or breaker.state != HALF_OPEN
+                    or not breaker.probe_inflight or breaker.probe_owner is not None):
+                return False
+            breaker.probe_owner = owner
+            return True
+
+    def is_available(self, scope: str) -> bool:
+        """出口目前是否可用（不佔用探測名額，供挑選代理時略過斷開的出口）"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            breaker = self._breakers.get(scope)
+            return breaker is None or breaker.state == CLOSED or breaker.remaining() <= 0
+
+    def record_failure(self, scope: str):
+        """記錄一次 RATE_LIMITED"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        opened = False
+        with self._lock:
+            breaker = self._get(scope)
+            breaker.failures.append(now)
+            while breaker.failures and now - breaker.failures[0] > self.window:
+                breaker.failures.popleft()
+
+            if breaker.state == HALF_OPEN:
+                # 探測失敗：重新斷開並加倍冷卻
+                breaker.cooldown = min(breaker.cooldown * 2, self.max_cooldown)
+                opened = self._open(breaker, now, "探測請求仍遭頻率限制")
+            elif breaker.state == CLOSED and len(breaker.failures) >= self.threshold:
+                breaker.cooldown = self.base_cooldown
+                opened = self._open(breaker, now, f"{int(self.window)} 秒內 {len(breaker.failures)} 次頻率限制")
+        if opened:
+            self._alert(breaker)
+
+    def record_success(self, scope: str):
+        """請求有正常到達 YouTube（成功或非頻率限制的錯誤）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            breaker = self._breakers.get(scope)
+            if breaker is None or breaker.state != HALF_OPEN:
+                return
+            breaker.failures.clear()
+            breaker.cooldown = self.base_cooldown
+            breaker.opened_at = None
+            breaker.probe_inflight = False
+            breaker.probe_owner = None
+            self._set_state(breaker, CLOSED)
+            print(f"[斷路器] {scope} 探測成功，恢復派發")
+        self._alert(breaker, recovered=True)
+
+    def release(self, scope: str, owner: Optional[str] = None):
+        """
+        探測請求沒有結果（網路錯誤、取消、沒有連 YouTube 就結束），放出下一個探測名額
+
+        Args:
+            owner: 指定時只在名額仍由它持有時才釋放（任務結束時的收尾，不會放掉別人的探測）
+        """
+        with self._lock:
+            breaker = self._breakers.get(scope)
+            if breaker is None or breaker.state != HALF_OPEN:
+                return
+            if owner is not None and (not breaker.probe_inflight or breaker.probe_owner != owner):
+                return
+            breaker.probe_inflight = False
+            breaker.probe_owner = None
+
+    def _open(self, breaker: CircuitBreaker, now: float, reason: str) -> bool:
+        """斷開（呼叫端需持有 lock；告警在釋放 lock 後送出）"""
+        breaker.opened_at = now
+        breaker.probe_inflight = False
+        breaker.probe_owner = None
+        breaker.trips += 1
+        breaker.reason = reason
+        self._set_state(breaker, OPEN)
+        print(f"[斷路器] {breaker.scope} 斷開 {int(breaker.cooldown)} 秒：{reason}")
+        return True
+
+    @staticmethod
+    def _set_state(breaker: CircuitBreaker, state: str):
+        breaker.state = state
+        breaker.changed_at = datetime.now().isoformat()
+
+    @staticmethod
+    def _alert(breaker: CircuitBreaker, recovered: bool = False):
+        """送出監控告警（延遲導入避免循環依賴）"""
+        try:
+            from services.monitor import monitor, AlertType
+        except ImportError:
+            return
+        data = {"scope": breaker.scope, "trips": breaker.trips, "cooldown": int(breaker.cooldown)}
+        if recovered:
+            monitor.info("頻率限制解除", f"出口 {breaker.scope} 探測成功，恢復下載", AlertType.DOWNLOAD, data)
+        else:
+            monitor.warning(
+                "頻率限制斷路器斷開",
+                f"出口 {breaker.scope} {breaker.reason}，暫停派發 {int(breaker.cooldown)} 秒",
+                AlertType.DOWNLOAD,
+                data
+            )
+
+    def open_scopes(self) -> list:
+        """目前斷開（冷卻中）的出口"""
+        with self._lock:
+            return [
+                scope for scope, breaker in self._breakers.items()
+                if breaker.state != CLOSED and breaker.remaining() > 0
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得各出口斷路器狀態"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "window": self.window,
+                "scopes": {
+                    scope: {
+                        "state": breaker.state,
+                        "recent_rate_limits": len(breaker.failures),
+                        "retry_in": round(breaker.remaining()),
+                        "cooldown": int(breaker.cooldown),
+                        "trips": breaker.trips,
+                        "reason": breaker.reason,
+                        "changed_at": breaker.changed_at,
+                    }
+                    for scope, breaker in self._breakers.items()
+                },
+            }
+
+
+# 全域實例
+rate_limit_breaker = RateLimitBreaker.from_env()
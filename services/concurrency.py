@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+自適應併發控制（AIMD）
+依實測總下載速度與 YouTube 頻率限制次數，動態調整佇列的同時下載數
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+
+class AdaptiveConcurrency:
+    """
+    加法增、乘法減的併發控制器
+
+    - 區間內出現 RATE_LIMITED：併發數乘上 decrease_factor（快速退讓）
+    - 佇列滿載且有排隊：併發數 +1 探測頻寬
+    - 加開後總速度沒有明顯提升：退回 1，代表頻寬已飽和
+    """
+
+    def __init__(
+        self,
+        initial: int = 3,
+        floor: int = 1,
+        ceiling: int = 8,
+        interval: float = 15.0,
+        decrease_factor: float = 0.5,
+        min_gain: float = 0.05,
+        cooldown: int = 4,
+    ):
+        """
+        Args:
+            initial: 初始併發數
+            floor: 併發數下限
+            ceiling: 併發數上限
+            interval: 評估間隔（秒）
+            decrease_factor: 遇到頻率限制時的縮減倍率
+            min_gain: 加開一個名額後，總速度至少要提升的比例
+            cooldown: 減少併發後，暫停幾個評估區間不再加開
+        """
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = min(max(initial, self.floor), self.ceiling)
+        self.interval = interval
+        self.decrease_factor = decrease_factor
+        self.min_gain = min_gain
+        self.cooldown = cooldown
+        self.enabled = True
+
+        self._lock = threading.Lock()  # progress hook 在 worker thread 呼叫
+        self._task_bytes: Dict[str, int] = {}
+        self._window_bytes = 0
+        self._window_started = time.monotonic()
+        self._rate_limit_count = 0
+
+        self.throughput_bps: float = 0.0
+        self._last_throughput: Optional[float] = None
+        self._last_action: Optional[str] = None
+        self._cooldown_left = 0
+        self.last_reason: str = "initial"
+        self.history: deque = deque(maxlen=20)
+
+    @classmethod
+    def from_env(cls, initial: int = 3) -> "AdaptiveConcurrency":
+        """從環境變數建立（YTIFY_MIN_CONCURRENT / YTIFY_MAX_CONCURRENT / YTIFY_ADAPTIVE_CONCURRENCY）"""
+        controller = cls(
+            initial=initial,
+            floor=int(os.environ.get("YTIFY_MIN_CONCURRENT", "1")),
+            ceiling=int(os.environ.get("YTIFY_MAX_CONCURRENT", "8")),
+        )
+        controller.enabled = os.environ.get("YTIFY_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+        return controller
+
+    def record_progress(self, task_id: str, downloaded_bytes: Optional[int]):
+        """記錄任務已下載位元組（由 progress hook 呼叫）"""
+        if downloaded_bytes is None:
+            return
+        with self._lock:
+            last = self._task_bytes.get(task_id)
+            self._task_bytes[task_id] = downloaded_bytes
+            if last is None:
+                # 每次執行的第一筆只當基準：暫停、搶占後續傳時 downloaded_bytes 含之前已下載的部分
+                return
+            # 數值變小代表換到下一個檔案（例如視訊下完換音訊）
+            delta = downloaded_bytes - last if downloaded_bytes >= last else downloaded_bytes
+            self._window_bytes += delta
+
+    def record_rate_limit(self):
+        """記錄一次 RATE_LIMITED 錯誤分類"""
+        with self._lock:
+            self._rate_limit_count += 1
+
+    def forget_task(self, task_id: str):
+        """任務結束（含暫停、搶占）後清除位元組追蹤，下次執行重新建立基準"""
+        with self._lock:
+            self._task_bytes.pop(task_id, None)
+
+    def evaluate(self, running: int, queued: int) -> Optional[int]:
+        """
+        結算一個評估區間並決定新的併發數
+
+        Args:
+            running: 目前執行中的任務數
+            queued: 目前排隊中的任務數
+
+        Returns:
+            新的併發數；不需調整時回傳 None
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._window_started, 1e-6)
+            self.throughput_bps = self._window_bytes / elapsed
+            rate_limits = self._rate_limit_count
+            self._window_bytes = 0
+            self._rate_limit_count = 0
+            self._window_started = now
+
+        new_limit = self.limit
+        reason = None
+
+        if rate_limits > 0:
+            new_limit = max(self.floor, int(self.limit * self.decrease_factor))
+            reason = f"區間內 {rate_limits} 次頻率限制，併發減半"
+            self._last_action = "decrease"
+            self._cooldown_left = self.cooldown
+        elif self._cooldown_left > 0:
+            self._cooldown_left -= 1
+            self._last_action = None
+        elif running >= self.limit and queued > 0:
+            if (self._last_action == "increase" and self._last_throughput
+                    and self.throughput_bps < self._last_throughput * (1 + self.min_gain)):
+                new_limit = max(self.floor, self.limit - 1)
+                reason = "加開名額後總速度未提升，退回"
+                self._last_action = "hold"
+                self._cooldown_left = self.cooldown
+            else:
+                new_limit = min(self.ceiling, self.limit + 1)
+                reason = "佇列滿載且速度持續提升，加開名額"
+                self._last_action = "increase"
+        else:
+            self._last_action = None
+
+        self._last_throughput = self.throughput_bps
+
+        if new_limit == self.limit or reason is None:
+            return None
+
+        self.history.append({
+            "time": datetime.now().isoformat(),
+            "from": self.limit,
+            "to": new_limit,
+            "reason": reason,
+            "throughput_bps": round(self.throughput_bps),
+            "rate_limits": rate_limits,
+        })
+        print(f"[併發控制] {self.limit} -> {new_limit}: {reason}")
+        self.limit = new_limit
+        self.last_reason = reason
+        return new_limit
+
+    async def run(self, queue):
+        """背景迴圈：定期評估並套用到佇列"""
+        await queue.set_max_concurrent(self.limit)
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.enabled:
+                continue
+            try:
+                new_limit = self.evaluate(queue.slots_in_use, queue.queue_length)
+                if new_limit is not None:
+                    await queue.set_max_concurrent(new_limit)
+            except Exception as e:
+                print(f"[併發控制] 評估錯誤: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得控制器狀態"""
+        return {
+            "enabled": self.enabled,
+            "limit": self.limit,
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "throughput_bps": round(self.throughput_bps),
+            "last_reason": self.last_reason,
+            "history": list(self.history)[-10:],
+        }
+
+
+# 全域實例（初始值沿用原本固定的 3）
+concurrency_controller = AdaptiveConcurrency.from_env(initial=3)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+本地衍生
+磁碟上已有同一支影片的完整成品時，純音訊與片段請求不必再連 YouTube：
+音訊直接從影片抽出（stream copy），片段用本地 ffmpeg 從成品剪出。
+多個片段合併下載後，也在這裡用一次 ffmpeg 剪出每一段。
+視訊片段優先用智慧剪輯（只重新編碼兩端不完整的 GOP），不適用時才整段重新編碼
+"""
+
+import os
+import time
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+from services.smart_cut import smart_cutter
+
+
+# 可以直接 stream copy 成 m4a 的容器（下載時音訊已轉成 AAC）
+AAC_CONTAINERS = {'.mp4', '.m4a'}
+
+
+class LocalDeriver:
+    """用本地成品衍生音訊、片段（後製執行緒會呼叫，需執行緒安全）"""
+
+    def __init__(self, ffmpeg: Optional[str] = "ffmpeg", timeout: float = 1800):
+        """
+        Args:
+            ffmpeg: ffmpeg 執行檔（None 表示不可用）
+            timeout: 單次 ffmpeg 最長執行秒數
+        """
+        self.ffmpeg = ffmpeg
+        self.timeout = timeout
+        self.enabled = True
+        self._lock = threading.Lock()
+        # 種類 -> [次數, 累計秒數]
+        self._counts = {"audio": [0, 0.0], "clip": [0, 0.0], "multi_clip": [0, 0.0]}
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls) -> "LocalDeriver":
+        """從環境變數建立（YTIFY_LOCAL_DERIVE）"""
+        deriver = cls(ffmpeg=shutil.which("ffmpeg"))
+        deriver.enabled = os.environ.get("YTIFY_LOCAL_DERIVE", "true").lower() == "true"
+        return deriver
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and bool(self.ffmpeg)
+
+    @staticmethod
+    def pick_source(entries: List[Dict[str, Any]], audio_only: bool, format_selector: str) -> Optional[Dict[str, Any]]:
+        """
+        從同一支影片的完整成品中挑選來源
+
+        Args:
+            entries: 成品快取中同一支影片、未剪輯的成品
+            audio_only: 請求是否為純音訊（任何完整成品都有音軌，優先用純音訊成品）
+            format_selector: 影片請求解析後的格式字串（畫質必須相同）
+        """
+        if audio_only:
+            entries = sorted(entries, key=lambda e: (not e["audio_only"], e["size"]))
+            return entries[0] if entries else None
+        for entry in entries:
+            if not entry["audio_only"] and entry["format"] == format_selector:
+                return entry
+        return None
+
+    @staticmethod
+    def _codec_args(source: Path, audio_only: bool) -> List[str]:
+        """輸出編碼參數"""
+        if audio_only:
+            if source.suffix.lower() in AAC_CONTAINERS:
+                return ['-c:a', 'copy']
+            return ['-c:a', 'aac', '-b:a', '192k']
+        # 與線上剪輯相同：切點重新編碼（force_keyframes_at_cuts 的效果）
+        return [
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+            '-c:a', 'aac', '-b:a', '192k',
+        ]
+
+    def build_command(self, source: Path, output: Path, audio_only: bool,
+                      clip_start: Optional[float] = None, clip_end: Optional[float] = None) -> List[str]:
+        """組出 ffmpeg 指令"""
+        cmd = [self.ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+        if clip_start is not None:
+            # 輸入端 seek：重新編碼時從前一個 keyframe 解碼後丟棄，切點精準到幀
+            cmd += ['-ss', f'{clip_start:.3f}']
+        cmd += ['-i', str(source)]
+        if clip_start is not None:
+            cmd += ['-t', f'{clip_end - clip_start:.3f}']
+        if audio_only:
+            cmd += ['-vn']
+        cmd += self._codec_args(source, audio_only)
+        cmd += ['-movflags', '+faststart', str(output)]
+        return cmd
+
+    def build_multi_command(self, jobs: List[Tuple[Path, float, float, Path]], audio_only: bool) -> List[str]:
+        """
+        組出一次剪出多段的 ffmpeg 指令
+
+        每段各自作為一個輸入做輸入端 seek（只解碼該段與前一個 keyframe 起的少量畫面），
+        再對應到各自的輸出
+
+        Args:
+            jobs: (來源, 起點秒數, 長度秒數, 輸出) 列表
+        """
+        cmd = [self.ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+        for source, offset, duration, _ in jobs:
+            cmd += ['-ss', f'{offset:.3f}', '-t', f'{duration:.3f}', '-i', str(source)]
+        for index, (source, _, _, output) in enumerate(jobs):
+            if audio_only:
+                cmd += ['-map', f'{index}:a:0']
+            else:
+                cmd += ['-map', f'{index}:v:0', '-map', f'{index}:a:0?']
+            cmd += self._codec_args(source, audio_only)
+            cmd += ['-movflags', '+faststart', str(output)]
+        return cmd
+
+    def derive(self, source: Path, output: Path, audio_only: bool,
+               clip_start: Optional[float] = None, clip_end: Optional[float] = None) -> float:
+        """
+        執行衍生
+
+        Returns:
+            花費秒數
+
+        Raises:
+            RuntimeError: ffmpeg 失敗（輸出檔會被刪除）
+        """
+        if clip_start is not None and not audio_only:
+            elapsed = self._smart_cut(source, clip_start, clip_end, output)
+            if elapsed is not None:
+                return elapsed
+        cmd = self.build_command(source, output, audio_only, clip_start, clip_end)
+        return self._run(cmd, [output], "clip" if clip_start is not None else "audio")
+
+    def derive_many(self, jobs: List[Tuple[Path, float, float, Path]], audio_only: bool) -> float:
+        """
+        一次剪出多段（視訊片段先逐段智慧剪輯，不適用的再一次 ffmpeg 整段重新編碼）
+
+        Args:
+            jobs: (來源, 起點秒數, 長度秒數, 輸出) 列表；起點以來源的容器起始時間為 0
+                （與輸入端 -ss 相同，保留來源時間戳的段落檔要先扣掉它的起始時間）
+
+        Returns:
+            花費秒數
+
+        Raises:
+            RuntimeError: ffmpeg 失敗（所有輸出檔會被刪除）
+        """
+        elapsed = 0.0
+        kind = "multi_clip" if len(jobs) > 1 else "clip"
+        remaining = jobs
+        if not audio_only:
+            remaining = []
+            for source, offset, duration, output in jobs:
+                cut = self._smart_cut(source, offset, offset + duration, output, kind)
+                if cut is None:
+                    remaining.append((source, offset, duration, output))
+                else:
+                    elapsed += cut
+        if remaining:
+            cmd = self.build_multi_command(remaining, audio_only)
+            try:
+                elapsed += self._run(cmd, [output for _, _, _, output in remaining], kind)
+            except RuntimeError:
+                for _, _, _, output in jobs:
+                    output.unlink(missing_ok=True)
+                raise
+        return elapsed
+
+    def _smart_cut(self, source: Path, start: float, end: float, output: Path,
+                   kind: str = "clip") -> Optional[float]:
+        """
+        智慧剪輯視訊片段
+
+        Returns:
+            花費秒數；不適用或失敗時回傳 None（呼叫端改為整段重新編碼）
+        """
+        try:
+            elapsed = smart_cutter.cut(
+                source, start, end, output, copy_audio=source.suffix.lower() in AAC_CONTAINERS
+            )
+        except RuntimeError as e:
+            print(f"[智慧剪輯] {e}，改為整段重新編碼")
+            return None
+        if elapsed is not None:
+            with self._lock:
+                stats = self._counts[kind]
+                stats[0] += 1
+                stats[1] += elapsed
+        return elapsed
+
+    def _run(self, cmd: List[str], outputs: List[Path], kind: str) -> float:
+        """執行 ffmpeg 並記錄統計；失敗時刪除輸出"""
+        started = time.monotonic()
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            proc = None
+            error = str(e)
+        else:
+            error = proc.stderr.strip()[-500:]
+        if proc is None or proc.returncode != 0 or not all(output.is_file() for output in outputs):
+            for output in outputs:
+                output.unlink(missing_ok=True)
+            with self._lock:
+                self.failures += 1
+            raise RuntimeError(f"ffmpeg 衍生失敗: {error}")
+        elapsed = time.monotonic() - started
+        with self._lock:
+            stats = self._counts[kind]
+            stats[0] += len(outputs)
+            stats[1] += elapsed
+        return elapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得衍生次數與平均耗時"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "ffmpeg": bool(self.ffmpeg),
+                "failures": self.failures,
+                **{
+                    kind: {
+                        "count": count,
+                        "avg_seconds": round(total / count, 2) if count else None,
+                    }
+                    for kind, (count, total) in self._counts.items()
+                },
+            }
+
+
+# 全域實例
+local_deriver = LocalDeriver.from_env()
@@ -4,21 +4,64 @@ ytify 下載服務 - 使用 yt-dlp
 """
 
 import os
+import math
 import re
 import uuid
 import time
+import shutil
 import asyncio
 from pathlib import Path
-from typing import Optional, Dict, Any, Set
-from datetime import datetime
+from typing import Optional, Dict, Any, Set, List, Tuple
+from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs
 import yt_dlp
 
+from services.concurrency import concurrency_controller
+from services.circuit_breaker import rate_limit_breaker
+from services.transfer import transfer_tuner
+from services.info_cache import info_cache, negative_cache, is_stale_url_error
+from services.artifact_cache import artifact_cache
+from services.storage import storage_manager
+from services.derive import local_deriver
+from services.smart_cut import smart_cutter
+from services.executors import extract_executor, download_executor, postprocess_executor
+
 
 class TaskCancelledError(Exception):
     """任務被取消時由 progress hook 拋出，用來中斷正在執行的 yt-dlp"""
 
 
+class TaskPausedError(Exception):
+    """任務被暫停（或被搶占）時由 progress hook 拋出，保留 .part 檔供續傳"""
+
+
+class TaskStalledError(Exception):
+    """停滯監視要求重啟時由 progress hook 拋出，保留 .part 檔換出口續傳"""
+
+
+class PooledYoutubeDL(yt_dlp.YoutubeDL):
+    """合併與 FFmpeg 後製交給後製執行緒池（下載執行緒在這段期間等待），ffmpeg 併發數不隨下載數成長"""
+
+    def post_process(self, filename, info, files_to_move=None):
+        return postprocess_executor.call(super().post_process, filename, info, files_to_move)
+
+
+# 進行中的狀態（相同參數的新請求沿用這些任務，不重複下載）
+ACTIVE_STATUSES = {"queued", "downloading", "retrying", "merging", "pausing", "paused"}
+
+# 可以暫停的狀態（merging 交給 ffmpeg 處理中，等它做完）
+PAUSABLE_STATUSES = {"queued", "downloading", "retrying"}
+
+# 重試等待超過這個秒數就讓出名額，交給佇列的延遲區到時再派發；更短的直接在執行緒內等
+RETRY_INLINE_MAX_DELAY = 3
+
+# 同一支影片的片段合併下載：一組最多幾段；兩段間隔不超過這個秒數就併成一次下載（少一次請求勝過多抓幾秒）
+CLIP_GROUP_MAX = 20
+CLIP_MERGE_GAP = 15
+# 每段下載範圍前後多留的秒數（切點落在範圍邊緣時，音訊結尾不會被截掉）
+CLIP_SECTION_PAD = 1
+
+
 # WebSocket 通知器（延遲導入避免循環依賴）
 _ws_notifier = None
 _monitor_service = None
@@ -101,9 +144,8 @@ def extract_playlist_id(url: str) -> Optional[str]:
     return params.get('list', [None])[0]
 
 
-def clean_youtube_url(url: str) -> str:
-    """清理 YouTube URL，只保留影片 ID，移除多餘參數"""
-    # 提取影片 ID
+def extract_video_id(url: str) -> Optional[str]:
+    """從 YouTube URL 取出 11 碼影片 ID，無法解析時回傳 None"""
     video_id = None
 
     # 標準格式: youtube.com/watch?v=xxx
@@ -127,6 +169,14 @@ def clean_youtube_url(url: str) -> str:
         video_id = parsed.path.strip('/')
 
     if video_id and len(video_id) == 11:
+        return video_id
+    return None
+
+
+def clean_youtube_url(url: str) -> str:
+    """清理 YouTube URL，只保留影片 ID，移除多餘參數"""
+    video_id = extract_video_id(url)
+    if video_id:
         # 返回乾淨的 URL
         clean_url = f"https://www.youtube.com/watch?v={video_id}"
         if clean_url != url:
@@ -137,6 +187,14 @@ def clean_youtube_url(url: str) -> str:
     return url
 
 
+# 持久化佇列需保存的任務欄位（重啟後用來重建任務，不需再呼叫 /api/info）
+PERSISTED_TASK_FIELDS = (
+    "task_id", "url", "format", "audio_only", "clip_start", "clip_end",
+    "client_ip", "session_id", "user_id", "user_role",
+    "playlist_video", "playlist_id", "video_title", "batch_id", "duration", "created_at",
+)
+
+
 class Downloader:
     """YouTube 下載服務"""
 
@@ -150,10 +208,27 @@ class Downloader:
 
         # 任務取消標記
         self._cancelled_tasks: Set[str] = set()
+        # 任務暫停標記（手動暫停或被佇列搶占）
+        self._paused_tasks: Set[str] = set()
+        # 停滯監視要求重啟的任務：task_id -> 原因
+        self._stalled: Dict[str, str] = {}
+        # 進行中的 /api/info 擷取：video_id -> [future, 共用的請求數]，併發的未命中共用同一次擷取
+        self._info_inflight: Dict[str, list] = {}
+        # 本次嘗試已完成檔案的傳輸量：task_id -> [bytes, 秒]，供連線數自動調校
+        self._transfer_samples: Dict[str, list] = {}
+        # 延後重試中的任務重試狀態（子程序模式下由主程序保存，交給下一個子程序）
+        self._retry_states: Dict[str, Dict[str, Any]] = {}
 
         # 持久化歷史記錄
         self._history_db = None
 
+        # 持久化佇列（重啟後自動恢復排隊與執行中的任務）
+        self.persistent_queue = os.environ.get("YTIFY_PERSISTENT_QUEUE", "true").lower() == "true"
+        self._queue_store = None
+
+        # 執行模式：thread（執行緒池）或 process（每個下載一個子程序，可強制終止）
+        self.execution_mode = os.environ.get("YTIFY_EXECUTION_MODE", "thread").lower()
+
         # 代理設定
         self.proxy = None
         self.proxy_pool_api = None  # 如: "http://localhost:5010/get"
@@ -175,6 +250,95 @@ class Downloader:
             self._history_db = history_db
         return self._history_db
 
+    @property
+    def queue_store(self):
+        """延遲載入持久化佇列"""
+        if self._queue_store is None:
+            from services.queue_store import queue_store
+            self._queue_store = queue_store
+        return self._queue_store
+
+    def _persist_task(self, task_id: str):
+        """將任務寫入持久化佇列"""
+        task = self.tasks.get(task_id)
+        if not self.persistent_queue or not task:
+            return
+        try:
+            self.queue_store.save(task_id, self._persist_payload(task))
+        except Exception as e:
+            print(f"[佇列持久化] 儲存失敗: {task_id} - {e}")
+
+    def _persist_tasks(self, task_ids: list):
+        """批次寫入持久化佇列（單一交易）"""
+        if not self.persistent_queue or not task_ids:
+            return
+        items = [
+            (task_id, self._persist_payload(self.tasks[task_id]))
+            for task_id in task_ids if task_id in self.tasks
+        ]
+        try:
+            self.queue_store.save_many(items)
+        except Exception as e:
+            print(f"[佇列持久化] 批次儲存失敗: {len(items)} 個任務 - {e}")
+
+    @staticmethod
+    def _persist_payload(task: dict) -> dict:
+        """取出重新派發所需的欄位"""
+        return {k: task.get(k) for k in PERSISTED_TASK_FIELDS if task.get(k) is not None}
+
+    def _unpersist_task(self, task_id: str):
+        """任務結束後從持久化佇列移除"""
+        if not self.persistent_queue:
+            return
+        try:
+            self.queue_store.remove(task_id)
+        except Exception as e:
+            print(f"[佇列持久化] 移除失敗: {task_id} - {e}")
+
+    def restore_pending_tasks(self) -> list:
+        """
+        從持久化佇列重建上次未完成的任務
+
+        Returns:
+            依原提交順序排列、需要重新派發的任務 ID 列表（不含暫停中的任務）
+        """
+        if not self.persistent_queue:
+            return []
+
+        try:
+            pending = self.queue_store.list_pending()
+        except Exception as e:
+            print(f"[佇列持久化] 讀取失敗: {e}")
+            return []
+
+        task_ids = []
+        for row in pending:
+            payload = row["payload"]
+            task_id = row["task_id"]
+            if task_id in self.tasks:
+                continue
+
+            paused = row["status"] == "paused"
+            self.tasks[task_id] = {
+                **payload,
+                "task_id": task_id,
+                "status": "paused" if paused else "queued",
+                "progress": 0,
+                "speed": None,
+                "eta": None,
+                "filename": None,
+                "title": payload.get("video_title"),
+                "error": None,
+                "restored": True,
+                # 重啟前已在執行的任務，yt-dlp 會從 .part 檔續傳
+                "interrupted": row["status"] == "running",
+            }
+            # 暫停中的任務維持暫停，等使用者恢復
+            if not paused:
+                task_ids.append(task_id)
+
+        return task_ids
+
     def _get_cookie_opts(self) -> dict:
         """取得 cookies 相關的 yt-dlp 選項"""
         opts = {}
@@ -211,6 +375,11 @@ class Downloader:
                                 time.sleep(0.3)
                                 continue
 
+                            # 跳過頻率限制斷路器冷卻中的代理
+                            if not rate_limit_breaker.is_available(proxy_url):
+                                print(f"[Proxy] Skip rate-limited proxy: {proxy}")
+                                continue
+
                             # 驗證代理是否可連線
                             if self._test_proxy(proxy_url):
                                 print(f"[Proxy] Using: {proxy}")
@@ -231,6 +400,45 @@ class Downloader:
         self.current_proxy = None
         return self.proxy
 
+    @staticmethod
+    def _record_egress_outcome(egress: str, error: Optional[str] = None):
+        """
+        把請求結果回報給頻率限制斷路器
+
+        成功或其他 YouTube 端錯誤代表出口沒被限制；網路、代理錯誤無法判斷，只釋放探測名額
+        """
+        if error is None:
+            rate_limit_breaker.record_success(egress)
+            return
+        from services.error_handler import classify_error, ErrorCategory
+        category, _ = classify_error(error)
+        if category == ErrorCategory.RATE_LIMITED:
+            rate_limit_breaker.record_failure(egress)
+        elif category in (ErrorCategory.NETWORK_ERROR, ErrorCategory.PROXY_ERROR, ErrorCategory.UNKNOWN):
+            rate_limit_breaker.release(egress)
+        else:
+            rate_limit_breaker.record_success(egress)
+
+    @staticmethod
+    def _breaker_error(wait: float) -> Dict[str, Any]:
+        """斷路器斷開時回給呼叫端的錯誤"""
+        retry_after = max(1, math.ceil(wait))
+        return {
+            "error": f"YouTube 頻率限制中，請 {retry_after} 秒後再試",
+            "error_category": "rate_limited",
+            "retry_after": retry_after,
+        }
+
+    def dispatch_wait(self) -> float:
+        """
+        佇列派發前的檢查：目前出口被斷開時回傳建議等待秒數（0 = 可以派發）
+
+        有代理池時會自動略過斷開的代理，不擋派發
+        """
+        if self.proxy_pool_api:
+            return 0.0
+        return rate_limit_breaker.acquire(self.proxy or "direct")
+
     def _test_proxy(self, proxy_url: str, timeout: int = 8) -> bool:
         """測試代理是否可用（直接測 YouTube）"""
         import requests
@@ -297,13 +505,16 @@ class Downloader:
 
     def get_status(self) -> Dict[str, Any]:
         """取得當前狀態"""
+        from services.queue import download_queue
+
         running_tasks_info = [self.tasks.get(tid) for tid in self.running_tasks if tid in self.tasks]
 
         return {
             "is_running": len(self.running_tasks) > 0,
             "running_count": len(self.running_tasks),
             "running_tasks": running_tasks_info,
-            "pending_count": sum(1 for t in self.tasks.values() if t["status"] == "queued"),
+            # 直接用佇列計數，不必每次輪詢都掃過所有歷史任務
+            "pending_count": download_queue.queue_length,
         }
 
     def find_active_duplicate(
@@ -316,18 +527,26 @@ class Downloader:
     ) -> Optional[str]:
         """找進行中的相同任務。同影片同參數並發會寫同一個輸出/暫存檔互撞，
         必須去重（含使用者連點、失敗重試撞上進行中任務的情況）"""
-        active_statuses = {"queued", "downloading", "retrying", "merging"}
-        url = clean_youtube_url(url)
+        key = (clean_youtube_url(url), format_option, audio_only, clip_start, clip_end)
         for task in self.tasks.values():
-            if (task.get("status") in active_statuses
-                    and task.get("url") == url
-                    and task.get("format") == format_option
-                    and task.get("audio_only") == audio_only
-                    and task.get("clip_start") == clip_start
-                    and task.get("clip_end") == clip_end):
+            if task.get("status") in ACTIVE_STATUSES and self._dedupe_key(task) == key:
                 return task["task_id"]
         return None
 
+    @staticmethod
+    def _dedupe_key(task: Dict[str, Any]) -> tuple:
+        """去重用的任務鍵（URL 已清理）"""
+        return (task.get("url"), task.get("format"), task.get("audio_only"),
+                task.get("clip_start"), task.get("clip_end"))
+
+    def _active_task_index(self) -> Dict[tuple, str]:
+        """進行中任務的去重索引（批次建立時只掃一次任務表，之後每個網址 O(1) 查詢）"""
+        return {
+            self._dedupe_key(task): task["task_id"]
+            for task in self.tasks.values()
+            if task.get("status") in ACTIVE_STATUSES
+        }
+
     @staticmethod
     def _fmt_clip_time(sec: float) -> str:
         """秒數轉檔名用時間標記，如 83.5 -> 1m23s"""
@@ -343,9 +562,12 @@ class Downloader:
         session_id: str = None,
         user_id: int = None,
         clip_start: float = None,
-        clip_end: float = None
+        clip_end: float = None,
+        user_role: str = None,
+        persist: bool = True,
+        duration: float = None
     ) -> str:
-        """建立下載任務"""
+        """建立下載任務（批次建立時 persist=False，最後再一次寫入；duration 供佇列估算成本）"""
         # 清理 URL
         url = clean_youtube_url(url)
 
@@ -358,6 +580,7 @@ class Downloader:
             "audio_only": audio_only,
             "clip_start": clip_start,
             "clip_end": clip_end,
+            "duration": duration,
             "status": "queued",
             "progress": 0,
             "speed": None,
@@ -370,10 +593,129 @@ class Downloader:
             "client_ip": client_ip,
             "session_id": session_id,
             "user_id": user_id,
+            "user_role": user_role,
         }
+        if persist:
+            self._persist_task(task_id)
 
         return task_id
 
+    def create_batch_tasks(
+        self,
+        urls: list,
+        format_option: str = "best",
+        audio_only: bool = False,
+        client_ip: str = None,
+        session_id: str = None,
+        user_id: int = None,
+        user_role: str = None
+    ) -> Dict[str, Any]:
+        """
+        批次建立下載任務（URL 需事先驗證）
+
+        同一批內重複的網址只建立一次；已有相同任務進行中則沿用原任務
+
+        Returns:
+            {"task_ids": 新建任務, "duplicates": {url: 既有任務 ID}, "batch_id": 批次 ID}
+        """
+        batch_id = str(uuid.uuid4())[:8]
+        task_ids = []
+        duplicates = {}
+        seen = set()
+        active = self._active_task_index()
+
+        for url in urls:
+            url = clean_youtube_url(url)
+            if url in seen:
+                continue
+            seen.add(url)
+
+            duplicate_id = active.get((url, format_option, audio_only, None, None))
+            if duplicate_id:
+                duplicates[url] = duplicate_id
+                continue
+
+            task_id = self.create_task(
+                url=url,
+                format_option=format_option,
+                audio_only=audio_only,
+                client_ip=client_ip,
+                session_id=session_id,
+                user_id=user_id,
+                user_role=user_role,
+                persist=False
+            )
+            self.tasks[task_id]["batch_id"] = batch_id
+            task_ids.append(task_id)
+
+        self._persist_tasks(task_ids)
+
+        return {"batch_id": batch_id, "task_ids": task_ids, "duplicates": duplicates}
+
+    def create_clip_tasks(
+        self,
+        url: str,
+        clips: List[Tuple[float, float]],
+        format_option: str = "best",
+        audio_only: bool = False,
+        client_ip: str = None,
+        session_id: str = None,
+        user_id: int = None,
+        user_role: str = None,
+        duration: float = None
+    ) -> Dict[str, Any]:
+        """
+        多片段請求：每段一個任務（各自的 task_id 與進度），派發時合併成一次下載
+
+        同一請求內重複的片段只建立一次；已有相同片段進行中則沿用；已有成品的直接完成
+
+        Returns:
+            {"group_id": 片段組 ID, "clips": [{task_id, start, end, status}],
+             "queued": 需要提交到佇列的任務}
+        """
+        group_id = str(uuid.uuid4())[:8]
+        url = clean_youtube_url(url)
+        clip_results = []
+        queued = []
+        seen = {}
+        active = self._active_task_index()
+
+        for start, end in clips:
+            if (start, end) in seen:
+                clip_results.append(dict(seen[(start, end)]))
+                continue
+
+            duplicate_id = active.get((url, format_option, audio_only, start, end))
+            if duplicate_id:
+                item = {"task_id": duplicate_id, "start": start, "end": end, "status": "duplicate"}
+            else:
+                task_id = self.create_task(
+                    url=url,
+                    format_option=format_option,
+                    audio_only=audio_only,
+                    client_ip=client_ip,
+                    session_id=session_id,
+                    user_id=user_id,
+                    clip_start=start,
+                    clip_end=end,
+                    user_role=user_role,
+                    persist=False,
+                    duration=duration,
+                )
+                self.tasks[task_id]["clip_group"] = group_id
+                if self.complete_from_cache(task_id) is not None:
+                    status = "cached"
+                else:
+                    status = "queued"
+                    queued.append(task_id)
+                item = {"task_id": task_id, "start": start, "end": end, "status": status}
+            seen[(start, end)] = item
+            clip_results.append(item)
+
+        self._persist_tasks(queued)
+
+        return {"group_id": group_id, "clips": clip_results, "queued": queued}
+
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """取得任務狀態"""
         return self.tasks.get(task_id)
@@ -384,6 +726,10 @@ class Downloader:
             # 取消旗標只能從這裡中斷正在跑的 yt-dlp（拋例外終止下載迴圈）
             if self.is_cancelled(task_id):
                 raise TaskCancelledError(f"任務已取消: {task_id}")
+            if self.is_paused(task_id):
+                raise TaskPausedError(f"任務已暫停: {task_id}")
+            if task_id in self._stalled:
+                raise TaskStalledError(f"下載停滯: {self._stalled[task_id]}")
 
             task = self.tasks.get(task_id)
             if not task:
@@ -405,6 +751,9 @@ class Downloader:
             speed = strip_ansi(d.get('_speed_str', 'N/A'))
             eta = strip_ansi(d.get('_eta_str', 'N/A'))
 
+            # 提供併發控制器計算總下載速度
+            concurrency_controller.record_progress(task_id, d.get('downloaded_bytes'))
+
             task.update({
                 "status": "downloading",
                 "progress": percent,
@@ -423,8 +772,17 @@ class Downloader:
                     eta=eta,
                     title=task.get("title")
                 )
+                self._mirror_clip_group(task_id, "downloading", progress=percent, speed=speed, eta=eta)
+            else:
+                self._mirror_clip_group(task_id)
 
         elif d['status'] == 'finished':
+            # 視訊、音訊各自完成時累計實測傳輸量
+            sample = self._transfer_samples.get(task_id)
+            if sample is not None and d.get('elapsed'):
+                sample[0] += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                sample[1] += d['elapsed']
+
             task.update({
                 "status": "merging",
                 "progress": 100,
@@ -438,6 +796,7 @@ class Downloader:
                     progress=100,
                     message="合併音視訊中..."
                 )
+            self._mirror_clip_group(task_id, "merging", progress=100, message="合併音視訊中...")
 
     def _sync_get_video_info(self, url: str) -> Dict[str, Any]:
         """同步取得影片資訊（在線程池中執行）"""
@@ -459,41 +818,97 @@ class Downloader:
         if proxy:
             ydl_opts['proxy'] = proxy
 
+        # 出口被頻率限制斷開時不再打 YouTube，直接請客戶端稍後再試
+        egress = proxy or "direct"
+        wait = rate_limit_breaker.acquire(egress)
+        if wait:
+            return self._breaker_error(wait)
+
         try:
+            started = time.monotonic()
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
+            self._record_egress_outcome(egress)
+            # 保存給之後的 /api/info 與下載沿用，不必再擷取一次
+            info_cache.put(info.get('id'), info, egress, time.monotonic() - started)
+            return self._summarize_info(info)
+        except Exception as e:
+            from services.error_handler import classify_error
+            self._record_egress_outcome(egress, str(e))
+            # 私人、已移除、版權封鎖：一段時間內不再擷取
+            category, strategy = classify_error(str(e))
+            negative_cache.put(extract_video_id(url), category.value, strategy.message_zh, str(e))
+            return {"error": str(e), "error_category": category.value}
 
-                # 整理格式資訊
-                formats = []
-                for f in info.get('formats', []):
-                    if f.get('vcodec') != 'none' or f.get('acodec') != 'none':
-                        formats.append({
-                            "format_id": f.get('format_id'),
-                            "ext": f.get('ext'),
-                            "resolution": f.get('resolution') or f"{f.get('width', '?')}x{f.get('height', '?')}",
-                            "filesize": f.get('filesize') or f.get('filesize_approx'),
-                            "vcodec": f.get('vcodec'),
-                            "acodec": f.get('acodec'),
-                            "fps": f.get('fps'),
-                        })
+    @staticmethod
+    def _summarize_info(info: Dict[str, Any]) -> Dict[str, Any]:
+        """整理 /api/info 回傳的影片資訊"""
+        formats = []
+        for f in info.get('formats', []):
+            if f.get('vcodec') != 'none' or f.get('acodec') != 'none':
+                formats.append({
+                    "format_id": f.get('format_id'),
+                    "ext": f.get('ext'),
+                    "resolution": f.get('resolution') or f"{f.get('width', '?')}x{f.get('height', '?')}",
+                    "filesize": f.get('filesize') or f.get('filesize_approx'),
+                    "vcodec": f.get('vcodec'),
+                    "acodec": f.get('acodec'),
+                    "fps": f.get('fps'),
+                })
 
-                return {
-                    "id": info.get('id'),
-                    "title": info.get('title'),
-                    "duration": info.get('duration'),
-                    "thumbnail": info.get('thumbnail'),
-                    "channel": info.get('channel') or info.get('uploader'),
-                    "view_count": info.get('view_count'),
-                    "upload_date": info.get('upload_date'),
-                    "description": info.get('description', '')[:500],  # 截斷描述
-                    "formats": formats[-15:],  # 只返回最後 15 個格式
-                }
-        except Exception as e:
-            return {"error": str(e)}
+        return {
+            "id": info.get('id'),
+            "title": info.get('title'),
+            "duration": info.get('duration'),
+            "thumbnail": info.get('thumbnail'),
+            "channel": info.get('channel') or info.get('uploader'),
+            "view_count": info.get('view_count'),
+            "upload_date": info.get('upload_date'),
+            "description": (info.get('description') or '')[:500],  # 截斷描述
+            "formats": formats[-15:],  # 只返回最後 15 個格式
+        }
 
     async def get_video_info(self, url: str) -> Dict[str, Any]:
-        """取得影片資訊（非阻塞）"""
-        return await asyncio.to_thread(self._sync_get_video_info, url)
+        """
+        取得影片資訊（非阻塞，使用擷取專用執行緒池）
+
+        同一支影片：快取 TTL 內直接回應；併發的未命中共用同一次擷取；
+        已知無法下載的直接回應失敗分類
+        """
+        key = extract_video_id(url)
+        failure = negative_cache.get(key)
+        if failure is not None:
+            return {"error": failure["message"], "error_category": failure["category"]}
+        cached = info_cache.get_info(key)
+        if cached is not None:
+            return self._summarize_info(cached)
+        if key is None:
+            return await extract_executor.run(self._sync_get_video_info, url)
+
+        inflight = self._info_inflight.get(key)
+        if inflight is not None:
+            inflight[1] += 1
+            return await asyncio.shield(inflight[0])
+
+        future = asyncio.get_running_loop().create_future()
+        inflight = self._info_inflight[key] = [future, 0]
+        started = time.monotonic()
+        try:
+            result = await extract_executor.run(self._sync_get_video_info, url)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有人等待時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._info_inflight[key]
+            if inflight[1]:
+                info_cache.record_coalesced(inflight[1], time.monotonic() - started)
 
     def _get_format_string(self, format_option: str, audio_only: bool) -> str:
         """取得 yt-dlp 格式字串"""
@@ -511,7 +926,7 @@ class Downloader:
 
     def _sync_execute_download(self, task_id: str) -> Dict[str, Any]:
         """同步執行下載（在線程池中執行，支援智能錯誤分類與重試）"""
-        from services.error_handler import retry_manager, classify_error, format_error_response
+        from services.error_handler import retry_manager, classify_error, format_error_response, ErrorCategory
 
         task = self.tasks.get(task_id)
         if not task:
@@ -522,12 +937,17 @@ class Downloader:
         audio_only = task["audio_only"]
         clip_start = task.get("clip_start")
         clip_end = task.get("clip_end")
+        # 合併下載的片段組：下載各段聯集，剪輯交給主程序
+        clip_sections = task.get("clip_sections")
 
-        # 初始化重試管理器
-        retry_manager.start_task(task_id, format_option)
+        # 初始化重試管理器（延後重試回來的任務沿用原本的重試次數與降級格式）
+        if not retry_manager.is_tracking(task_id):
+            retry_manager.start_task(task_id, format_option)
         current_format = format_option
         last_error = None
         last_error_info = None
+        egress = "direct"
+        video_id = extract_video_id(url)
 
         while True:
             # 檢查是否已取消
@@ -535,7 +955,11 @@ class Downloader:
                 print(f"[下載] 任務已取消，停止下載: {task_id}")
                 retry_manager.cleanup_task(task_id)
                 return {"success": False, "error": "任務已取消", "cancelled": True}
+            if self.is_paused(task_id):
+                retry_manager.cleanup_task(task_id)
+                return {"success": False, "error": "任務已暫停", "paused": True}
 
+            cached_info = None
             try:
                 # 使用當前格式（可能已被降級）
                 current_format = retry_manager.get_current_format(task_id)
@@ -545,9 +969,14 @@ class Downloader:
                 if clip_start is not None and clip_end is not None:
                     # 片段模式：檔名帶起訖，同一支影片剪多段不互撞
                     outtmpl = f'%(title)s_[{self._fmt_clip_time(clip_start)}-{self._fmt_clip_time(clip_end)}].%(ext)s'
+                if clip_sections:
+                    outtmpl = f'.clips/{task_id}/%(section_start)s.%(ext)s'
 
                 ydl_opts = {
-                    'outtmpl': str(self.download_path / outtmpl),
+                    'outtmpl': outtmpl,
+                    # 暫存檔（.part、.ytdl、合併前的各格式檔）放在任務專用目錄：
+                    # 暫停、搶占後從這裡續傳，取消時只清掉自己的
+                    'paths': {'home': str(self.download_path), 'temp': str(self._temp_dir(task_id))},
                     'progress_hooks': [self._create_progress_hook(task_id)],
                     'quiet': True,
                     'no_warnings': True,
@@ -556,8 +985,14 @@ class Downloader:
                     'remote_components': ['ejs:github'],
                 }
 
-                if clip_start is not None and clip_end is not None:
-                    # 只下載 [start, end] 秒的片段，切點對齊 keyframe（re-cut，短段也切得準）
+                if clip_sections:
+                    # 只下載各段範圍、不重新編碼：精準切點由剪輯時處理。
+                    # stream copy 的段落從起點前一個 keyframe 開始，實際起點剪輯時再從檔案讀取
+                    ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
+                        None, [tuple(section) for section in clip_sections]
+                    )
+                elif clip_start is not None and clip_end is not None:
+                    # 純音訊或智慧剪輯停用時：只下載 [start, end] 秒的片段，整段重新編碼讓切點對齊 keyframe
                     ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
                         None, [(clip_start, clip_end)]
                     )
@@ -565,14 +1000,24 @@ class Downloader:
 
                 # 加入代理（如果有設定）
                 proxy = self._get_proxy()
+                egress = proxy or "direct"
                 if proxy:
                     ydl_opts['proxy'] = proxy
                     task["current_proxy"] = self.current_proxy
                     retry_manager.record_proxy_used(task_id, self.current_proxy)
 
+                # 多連線下載：連線數依格式與出口的實測速度挑選（片段模式走 ffmpeg，不用 aria2c）
+                fragments = transfer_tuner.choose(current_format, audio_only, egress)
+                transfer_tuner.apply(ydl_opts, fragments, external=clip_start is None)
+                if clip_sections:
+                    # 段落保留來源時間戳：容器的 start_time 就是段落第一幀（前一個 keyframe）的來源時間
+                    ydl_opts['external_downloader_args'] = {'ffmpeg_i': ['-copyts']}
+                self._transfer_samples[task_id] = [0, 0.0]
+                task["fragments"] = fragments
+
                 if not audio_only:
                     ydl_opts['merge_output_format'] = 'mp4'
-                    if clip_start is None:
+                    if clip_start is None or clip_sections:
                         # 片段模式不帶 -c:v copy：force_keyframes_at_cuts 要在切點重新編碼
                         ydl_opts['postprocessor_args'] = [
                             '-c:v', 'copy',           # 視訊直接複製，不重新編碼
@@ -597,82 +1042,60 @@ class Downloader:
                 if self.current_proxy:
                     print(f"[下載] 代理: {self.current_proxy}")
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
+                # 同一出口擷取過且格式 URL 未過期：直接處理快取的 info，不再打 YouTube
+                cached_info = info_cache.get(video_id, egress)
+
+                with PooledYoutubeDL(ydl_opts) as ydl:
+                    if cached_info is not None:
+                        print(f"[下載] 沿用已擷取的影片資訊: {video_id}")
+                        info = ydl.process_ie_result(cached_info, download=True)
+                    else:
+                        info = ydl.extract_info(url, download=True)
                     if info is None:
                         raise Exception("無法取得影片資訊")
+                    if cached_info is None:
+                        info_cache.put(video_id, info, egress)
 
-                    filename = ydl.prepare_filename(info)
-                    title = info.get('title', 'Unknown')
+                    # 後處理（轉音訊、合併）後的實際路徑；舊版 yt-dlp 沒有時退回模板檔名
+                    downloads = info.get('requested_downloads') or [{}]
+                    filename = downloads[-1].get('filepath') or ydl.prepare_filename(info)
                     video_id = info.get('id', '')
-                    base_filename = os.path.basename(filename)
                     print(f"[下載] 完成: {filename}")
 
-                    # 更新任務狀態
-                    task.update({
-                        "status": "completed",
-                        "progress": 100,
-                        "title": title,
-                        "filename": base_filename,
-                        "completed_at": datetime.now().isoformat(),
-                    })
-
-                    # WebSocket 通知完成
-                    notifier = get_ws_notifier()
-                    if notifier:
-                        notifier.notify(task_id, "completed",
-                            progress=100,
-                            title=title,
-                            filename=base_filename
-                        )
-
-                    # 保存到 SQLite 歷史資料庫
-                    file_size = os.path.getsize(filename) if os.path.exists(filename) else None
-                    try:
-                        self.history_db.add(
-                            task_id=task_id,
-                            url=url,
-                            video_id=video_id,
-                            title=title,
-                            filename=base_filename,
-                            format=current_format,
-                            audio_only=audio_only,
-                            status="completed",
-                            duration=info.get('duration'),
-                            thumbnail=info.get('thumbnail'),
-                            channel=info.get('channel') or info.get('uploader'),
-                            file_size=file_size,
-                            completed_at=datetime.now().isoformat(),
-                            # 多租戶識別
-                            client_ip=task.get('client_ip'),
-                            session_id=task.get('session_id'),
-                            user_id=task.get('user_id')
-                        )
-                    except Exception as db_err:
-                        print(f"[歷史] 儲存失敗: {db_err}")
-
-                    # 記錄監控指標
-                    mon = get_monitor()
-                    if mon:
-                        monitor_svc, AlertType = mon
-                        monitor_svc.record_metric("download_count", 1, "次")
-                        if file_size:
-                            monitor_svc.record_metric("download_size", file_size, "bytes")
-                        monitor_svc.log_event("download_completed", f"下載完成: {title}", {
-                            "task_id": task_id,
-                            "title": title,
+                    meta = {
+                        "title": info.get('title', 'Unknown'),
+                        "format_id": info.get('format_id'),
+                        "duration": info.get('duration'),
+                        "thumbnail": info.get('thumbnail'),
+                        "channel": info.get('channel') or info.get('uploader'),
+                    }
+                    if clip_sections:
+                        # 各段檔案交給主程序剪出每個片段後才算完成
+                        result = {
+                            "success": True,
+                            "clip_spans": [
+                                {"path": d["filepath"], "start": d.get("section_start") or 0,
+                                 "end": d.get("section_end")}
+                                for d in downloads if d.get("filepath")
+                            ],
+                            "video_id": video_id,
                             "format": current_format,
-                            "file_size": file_size
-                        })
+                            "meta": meta,
+                        }
+                    else:
+                        result = self._complete_task(task_id, filename, video_id, current_format, **meta)
+
+                    sample = self._transfer_samples.pop(task_id, None)
+                    if sample:
+                        transfer_tuner.record(current_format, audio_only, egress, fragments, *sample)
 
-                    # 清理重試管理器
+                    # 清理重試管理器（先回報重試結果供學習延遲）
+                    retry_manager.record_outcome(task_id)
                     retry_manager.cleanup_task(task_id)
+                    shutil.rmtree(self._temp_dir(task_id), ignore_errors=True)
+                    self._record_egress_outcome(egress)
 
-                    return {
-                        "success": True,
-                        "title": title,
-                        "filename": base_filename,
-                    }
+                    return result
 
             except Exception as e:
                 # 取消觸發的中斷（可能被 yt-dlp 包裝過）不走錯誤重試
@@ -680,17 +1103,44 @@ class Downloader:
                     print(f"[下載] 任務已取消，中斷下載: {task_id}")
                     retry_manager.cleanup_task(task_id)
                     self._cleanup_temp_files(task_id)
+                    rate_limit_breaker.release(egress)
+                    self._stalled.pop(task_id, None)
                     return {"success": False, "error": "任務已取消", "cancelled": True}
+                # 暫停：保留 .part 檔，之後 yt-dlp 會從中斷處續傳
+                if self.is_paused(task_id):
+                    print(f"[下載] 任務已暫停，保留暫存檔: {task_id}")
+                    retry_manager.cleanup_task(task_id)
+                    rate_limit_breaker.release(egress)
+                    self._stalled.pop(task_id, None)
+                    return {"success": False, "error": "任務已暫停", "paused": True}
+                # 停滯：不算一次失敗，保留 .part 檔換出口續傳（停滯監視已記入 error_history）
+                if self._stalled.pop(task_id, None) is not None:
+                    print(f"[下載] 下載停滯，換出口續傳: {task_id}")
+                    rate_limit_breaker.release(egress)
+                    continue
 
                 last_error = str(e)
-                print(f"[下載] 失敗: {last_error}")
-
                 # 使用智能錯誤分類
                 category, strategy = classify_error(last_error)
+
+                # 快取的格式 URL 失效（媒體 URL 回 403/410，未被歸入其他類別）：丟掉快取重新擷取，
+                # 不算一次失敗；其他錯誤（429、機器人驗證、磁碟、ffmpeg 等）照常走重試與斷路器
+                if (cached_info is not None and category == ErrorCategory.UNKNOWN
+                        and is_stale_url_error(last_error)):
+                    print(f"[下載] 快取的格式 URL 已失效，重新擷取: {last_error}")
+                    info_cache.invalidate(video_id)
+                    rate_limit_breaker.release(egress)
+                    continue
+
+                print(f"[下載] 失敗: {last_error}")
                 print(f"[錯誤分類] {category.value}: {strategy.message_zh}")
+                if category == ErrorCategory.RATE_LIMITED:
+                    concurrency_controller.record_rate_limit()
+                self._record_egress_outcome(egress, last_error)
+                retry_manager.record_outcome(task_id, category)
 
-                # 判斷是否應該重試
-                should_retry, retry_info = retry_manager.should_retry(task_id, last_error)
+                # 判斷是否應該重試（延遲依錯誤類別與出口學習）
+                should_retry, retry_info = retry_manager.should_retry(task_id, last_error, scope=egress)
 
                 if should_retry:
                     # 如果需要換代理
@@ -717,9 +1167,20 @@ class Downloader:
                             message=retry_info.get("message", ""),
                             error_category=category.value
                         )
+                    self._mirror_clip_group(task_id, "retrying", message=retry_info.get("message", ""))
 
-                    # 等待後重試
+                    # 等待後重試：等待較久時讓出執行名額，由佇列到時再派發
                     delay = retry_info.get("delay", 2)
+                    if delay > RETRY_INLINE_MAX_DELAY:
+                        retry_at = datetime.now() + timedelta(seconds=delay)
+                        task["retry_at"] = retry_at.isoformat()
+                        print(f"[下載] {delay} 秒後重試（先釋放名額）...")
+                        return {
+                            "success": False,
+                            "error": last_error,
+                            "retry_after": delay,
+                            "retry_state": retry_manager.export_task(task_id),
+                        }
                     print(f"[下載] {delay} 秒後重試...")
                     time.sleep(delay)
                     continue
@@ -732,11 +1193,108 @@ class Downloader:
         error_category = last_error_info.get("category", "unknown") if last_error_info else "unknown"
         error_message = last_error_info.get("message", last_error) if last_error_info else last_error
 
+        # 停滯重啟的紀錄在前，接著是各次失敗
+        error_history = task.get("error_history", []) + retry_manager.get_task_errors(task_id)
+        # 清理重試管理器與暫存檔
+        retry_manager.cleanup_task(task_id)
+        shutil.rmtree(self._temp_dir(task_id), ignore_errors=True)
+        return self._fail_task(task_id, error_message, error_category, error_history, last_error)
+
+    def _complete_task(self, task_id: str, filename: str, video_id: str, format_option: str,
+                       cached: bool = False, **meta) -> Dict[str, Any]:
+        """
+        標記任務完成：通知、寫入歷史並記錄監控指標
+
+        Args:
+            filename: 成品路徑
+            video_id: 影片 ID
+            format_option: 實際使用的格式選項（可能已降級）
+            cached: 是否由成品快取直接完成
+            meta: title / format_id / duration / thumbnail / channel
+        """
+        task = self.tasks[task_id]
+        title = meta.get("title") or "Unknown"
+        base_filename = os.path.basename(filename)
+
+        # 更新任務狀態
+        task.update({
+            "status": "completed",
+            "progress": 100,
+            "title": title,
+            "filename": base_filename,
+            "completed_at": datetime.now().isoformat(),
+            "cached": cached,
+        })
+
+        # WebSocket 通知完成
+        notifier = get_ws_notifier()
+        if notifier:
+            notifier.notify(task_id, "completed",
+                progress=100,
+                title=title,
+                filename=base_filename
+            )
+
+        # 保存到 SQLite 歷史資料庫
+        file_size = os.path.getsize(filename) if os.path.exists(filename) else None
+        try:
+            self.history_db.add(
+                task_id=task_id,
+                url=task["url"],
+                video_id=video_id,
+                title=title,
+                filename=base_filename,
+                format=format_option,
+                audio_only=task.get("audio_only", False),
+                status="completed",
+                duration=meta.get("duration"),
+                thumbnail=meta.get("thumbnail"),
+                channel=meta.get("channel"),
+                file_size=file_size,
+                completed_at=datetime.now().isoformat(),
+                # 多租戶識別
+                client_ip=task.get('client_ip'),
+                session_id=task.get('session_id'),
+                user_id=task.get('user_id')
+            )
+        except Exception as db_err:
+            print(f"[歷史] 儲存失敗: {db_err}")
+
+        # 記錄監控指標
+        mon = get_monitor()
+        if mon:
+            monitor_svc, AlertType = mon
+            monitor_svc.record_metric("download_count", 1, "次")
+            if file_size and not cached:
+                monitor_svc.record_metric("download_size", file_size, "bytes")
+            monitor_svc.log_event("download_completed", f"下載完成: {title}", {
+                "task_id": task_id,
+                "title": title,
+                "format": format_option,
+                "file_size": file_size,
+                "cached": cached,
+            })
+
+        return {
+            "success": True,
+            "title": title,
+            "filename": base_filename,
+            "cached": cached,
+            # 供主程序收錄成品快取
+            "video_id": video_id,
+            "format": format_option,
+            "meta": meta,
+        }
+
+    def _fail_task(self, task_id: str, error_message: str, error_category: str,
+                   error_history: Optional[list] = None, last_error: Optional[str] = None) -> Dict[str, Any]:
+        """標記任務失敗：通知、寫入歷史並記錄監控指標（last_error 為最後一次的原始錯誤）"""
+        task = self.tasks[task_id]
         task.update({
             "status": "failed",
             "error": error_message,
             "error_category": error_category,
-            "error_history": retry_manager.get_task_errors(task_id),
+            "error_history": error_history or [],
         })
 
         # WebSocket 通知失敗
@@ -783,10 +1341,10 @@ class Downloader:
                     {"task_id": task_id, "category": error_category}
                 )
 
-        # 清理重試管理器
-        retry_manager.cleanup_task(task_id)
-
-        return {"success": False, "error": error_message, "error_category": error_category}
+        result = {"success": False, "error": error_message, "error_category": error_category}
+        if last_error:
+            result["last_error"] = last_error
+        return result
 
     def _finally_cleanup(self):
         """清理下載狀態"""
@@ -822,6 +1380,11 @@ class Downloader:
         # 標記為取消
         self._cancelled_tasks.add(task_id)
 
+        # 子程序模式：直接終止下載程序（含 ffmpeg），不必等 progress hook
+        if self.execution_mode == "process":
+            from services.process_worker import process_pool
+            process_pool.kill(task_id)
+
         # 更新任務狀態
         task.update({
             "status": "cancelled",
@@ -836,9 +1399,12 @@ class Downloader:
             )
 
         print(f"[下載] 任務已取消: {task_id}")
+        self._discard_retry_state(task_id)
 
-        # 清理暫存檔案（如果有）
-        self._cleanup_temp_files(task_id)
+        # 清理暫存檔案（還在排隊的任務沒有暫存檔，不必掃描下載目錄）
+        if current_status != "queued":
+            self._cleanup_temp_files(task_id)
+        self._unpersist_task(task_id)
 
         return {
             "success": True,
@@ -846,44 +1412,706 @@ class Downloader:
             "message": "任務已取消"
         }
 
+    def _temp_dir(self, task_id: str) -> Path:
+        """任務專用的 yt-dlp 暫存目錄（同一任務暫停、重試、換出口續傳時沿用）"""
+        return self.download_path / ".tmp" / task_id
+
     def _cleanup_temp_files(self, task_id: str):
-        """清理任務相關的暫存檔案"""
-        try:
-            # yt-dlp 暫存檔案通常有 .part 或 .ytdl 後綴
-            for file in self.download_path.iterdir():
-                if file.is_file() and (file.suffix in ['.part', '.ytdl'] or '.part' in file.name):
-                    # 檢查檔案是否最近建立（避免誤刪其他任務的檔案）
-                    import time as time_module
-                    file_age = time_module.time() - file.stat().st_mtime
-                    if file_age < 300:  # 5 分鐘內的暫存檔案
-                        try:
-                            file.unlink()
-                            print(f"[清理] 刪除暫存檔案: {file.name}")
-                        except Exception as e:
-                            print(f"[清理] 無法刪除 {file.name}: {e}")
-        except Exception as e:
-            print(f"[清理] 清理暫存檔案失敗: {e}")
+        """清理任務的暫存檔案（只動這個任務的目錄，其他暫停中任務的 .part 檔要留著續傳）"""
+        shutil.rmtree(self._temp_dir(task_id), ignore_errors=True)
+        # 片段組合併下載的工作目錄
+        shutil.rmtree(self.download_path / ".clips" / task_id, ignore_errors=True)
 
     def is_cancelled(self, task_id: str) -> bool:
         """檢查任務是否已取消"""
         return task_id in self._cancelled_tasks
 
+    def _discard_retry_state(self, task_id: str):
+        """清掉延後重試的狀態（任務取消時不會再回到下載迴圈自行清理）"""
+        from services.error_handler import retry_manager
+        retry_manager.cleanup_task(task_id)
+        self._retry_states.pop(task_id, None)
+
+    def is_paused(self, task_id: str) -> bool:
+        """檢查任務是否被要求暫停"""
+        return task_id in self._paused_tasks
+
+    def restart_stalled(self, task_id: str, reason: str) -> bool:
+        """
+        中斷停滯的下載並換出口續傳（由停滯監視呼叫）
+
+        Args:
+            task_id: 任務 ID
+            reason: 停滯原因（記入 error_history）
+
+        Returns:
+            是否已要求重啟
+        """
+        task = self.tasks.get(task_id)
+        if not task or task.get("status") != "downloading" or task_id in self._stalled:
+            return False
+        if self.is_cancelled(task_id) or self.is_paused(task_id):
+            return False
+
+        proxy = task.get("current_proxy")
+        restarts = task.get("stall_restarts", 0) + 1
+        task["stall_restarts"] = restarts
+        task["error_history"] = task.get("error_history", []) + [{
+            "category": "stalled",
+            "message": reason,
+            "retry_count": restarts,
+            "proxy": proxy,
+            "downloaded_bytes": task.get("downloaded_bytes"),
+            "at": datetime.now().isoformat(),
+        }]
+        # 只在本服務避開這個代理（慢不代表壞，不從代理池刪除）
+        if proxy:
+            self.bad_proxies.add(proxy)
+
+        task["status"] = "retrying"
+        task["retry_message"] = f"下載停滯（{reason}），換線路續傳"
+        notifier = get_ws_notifier()
+        if notifier:
+            notifier.notify(task_id, "retrying", message=task["retry_message"], error_category="stalled")
+        print(f"[停滯監視] 重啟任務 {task_id}（第 {restarts} 次）: {reason}")
+
+        self._stalled[task_id] = reason
+        # 子程序模式：終止子程序，由主程序帶新的代理黑名單重跑
+        if self.execution_mode == "process":
+            from services.process_worker import process_pool
+            process_pool.kill(task_id)
+        return True
+
+    def _interrupt(self, task_id: str):
+        """要求執行中的下載停下來（保留暫存檔）"""
+        self._paused_tasks.add(task_id)
+        # 子程序模式：直接終止下載程序，.part 檔留在磁碟上
+        if self.execution_mode == "process":
+            from services.process_worker import process_pool
+            process_pool.kill(task_id)
+
+    def pause_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        暫停下載任務（保留 .part 檔，恢復後從中斷處續傳）
+
+        Args:
+            task_id: 任務 ID
+
+        Returns:
+            暫停結果；was_queued 表示任務還在排隊，呼叫端需把它移出佇列
+        """
+        task = self.tasks.get(task_id)
+        if not task:
+            return {"success": False, "error": "任務不存在"}
+
+        current_status = task.get("status")
+        if current_status == "paused":
+            return {"success": False, "error": "任務已暫停"}
+        if task.get("clip_leader"):
+            return {"success": False, "error": "片段正與同影片的其他片段合併下載，無法單獨暫停"}
+        if current_status not in PAUSABLE_STATUSES:
+            return {"success": False, "error": f"任務狀態為 {current_status}，無法暫停"}
+
+        was_queued = current_status == "queued"
+        task["preempted"] = False
+        if was_queued:
+            task["status"] = "paused"
+            self._mark_paused(task_id)
+        else:
+            task["status"] = "pausing"
+            self._interrupt(task_id)
+
+        notifier = get_ws_notifier()
+        if notifier:
+            notifier.notify(task_id, task["status"], message="任務已暫停")
+        print(f"[下載] 暫停任務: {task_id}")
+
+        return {
+            "success": True,
+            "task_id": task_id,
+            "was_queued": was_queued,
+            "message": "任務已暫停"
+        }
+
+    def finish_pause(self, task_id: str):
+        """
+        暫停在延遲區等待重試的任務（呼叫端已把它移出佇列）
+
+        任務沒有在執行，不會有下載迴圈回報停下，這裡直接完成暫停
+        """
+        task = self.tasks.get(task_id)
+        if not task or task.get("status") != "pausing":
+            return
+        task.pop("retry_at", None)
+        self._on_paused(task_id)
+
+    def resume_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        恢復已暫停的任務（呼叫端需再提交到佇列）
+
+        Returns:
+            恢復結果
+        """
+        task = self.tasks.get(task_id)
+        if not task:
+            return {"success": False, "error": "任務不存在"}
+        if task.get("status") != "paused":
+            return {"success": False, "error": "任務未暫停"}
+
+        self._paused_tasks.discard(task_id)
+        task.update({"status": "queued", "resumed_at": datetime.now().isoformat()})
+        self._persist_task(task_id)
+
+        notifier = get_ws_notifier()
+        if notifier:
+            notifier.notify(task_id, "queued", message="任務已恢復")
+        print(f"[下載] 恢復任務: {task_id}")
+
+        return {"success": True, "task_id": task_id, "message": "任務已恢復"}
+
+    def preempt_task(self, task_id: str) -> bool:
+        """
+        佇列搶占：暫停執行中的任務讓出名額，任務結束後由佇列放回最前面
+
+        Returns:
+            是否已送出暫停要求
+        """
+        task = self.tasks.get(task_id)
+        if not task or task.get("status") not in ("downloading", "retrying"):
+            return False
+        if self.is_cancelled(task_id) or self.is_paused(task_id):
+            return False
+        task["preempted"] = True
+        self._interrupt(task_id)
+        return True
+
+    def _mark_paused(self, task_id: str):
+        """持久化佇列記錄標為暫停（重啟後維持暫停，不自動派發）"""
+        if not self.persistent_queue:
+            return
+        try:
+            self.queue_store.mark_paused(task_id)
+        except Exception as e:
+            print(f"[佇列持久化] 更新失敗: {task_id} - {e}")
+
+    def _artifact_key(self, task: Dict[str, Any], video_id: str, format_option: str) -> str:
+        """任務對應的成品鍵（格式以解析後的 yt-dlp 格式字串比對）"""
+        return artifact_cache.make_key(
+            video_id, self._get_format_string(format_option, task["audio_only"]),
+            task["audio_only"], task.get("clip_start"), task.get("clip_end")
+        )
+
+    def complete_from_cache(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        已有相同成品時直接完成任務（在 downloads/ 建立此任務專用的硬連結）
+
+        Returns:
+            完成結果；沒有快取時回傳 None
+        """
+        task = self.tasks.get(task_id)
+        video_id = extract_video_id(task["url"]) if task else None
+        if not video_id:
+            return None
+        entry = artifact_cache.lookup(self._artifact_key(task, video_id, task["format"]))
+        if entry is None:
+            return None
+        filename = artifact_cache.materialize(entry, task_id)
+        if filename is None:
+            return None
+        print(f"[下載] 成品快取命中: {task_id} -> {filename}")
+        storage_manager.acquire(filename)
+        self._unpersist_task(task_id)
+        return self._complete_task(
+            task_id, str(self.download_path / filename), video_id, task["format"], cached=True,
+            title=entry["title"], format_id=entry["format_id"], duration=entry["duration"],
+            thumbnail=entry["thumbnail"], channel=entry["channel"],
+        )
+
+    def _local_source(self, task: Dict[str, Any], video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """可以用來本地衍生這個任務的完整成品（純音訊或片段請求才適用）"""
+        if not local_deriver.available or not video_id:
+            return None
+        if not task["audio_only"] and task.get("clip_start") is None:
+            return None
+        return local_deriver.pick_source(
+            artifact_cache.find_full(video_id), task["audio_only"],
+            self._get_format_string(task["format"], task["audio_only"])
+        )
+
+    def _sync_derive_local(self, task_id: str, source: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        用本地成品衍生音訊或片段（在後製執行緒池中執行）
+
+        Returns:
+            完成結果；失敗時回傳 None，改走一般下載
+        """
+        task = self.tasks.get(task_id)
+        if not task:
+            return None
+        audio_only = task["audio_only"]
+        clip_start, clip_end = task.get("clip_start"), task.get("clip_end")
+        # 檔名與線上下載一致：標題取自來源成品（yt-dlp 已處理過不合法字元）
+        stem = Path(source["filename"]).stem
+        if clip_start is not None:
+            stem = f"{stem}_[{self._fmt_clip_time(clip_start)}-{self._fmt_clip_time(clip_end)}]"
+        ext = ".m4a" if audio_only else ".mp4"
+        output = self.download_path / f"{stem}{ext}"
+        if output.exists():
+            output = self.download_path / f"{stem} ({task_id}){ext}"
+
+        kind = "片段" if clip_start is not None else "音訊"
+        print(f"[下載] 由本地成品衍生{kind}: {source['filename']} -> {output.name}")
+        task.update({"status": "merging", "progress": 0})
+        try:
+            elapsed = local_deriver.derive(
+                artifact_cache.path_of(source), output, audio_only, clip_start, clip_end
+            )
+        except RuntimeError as e:
+            print(f"[下載] {e}，改為線上下載")
+            task["status"] = "downloading"
+            return None
+        if self.is_cancelled(task_id):
+            output.unlink(missing_ok=True)
+            return {"success": False, "error": "任務已取消", "cancelled": True}
+        print(f"[下載] 本地衍生完成（{elapsed:.1f} 秒）: {output.name}")
+
+        result = self._complete_task(
+            task_id, str(output), source["video_id"], task["format"],
+            title=source["title"], duration=source["duration"],
+            thumbnail=source["thumbnail"], channel=source["channel"],
+        )
+        result["derived_from"] = source["filename"]
+        return result
+
+    @staticmethod
+    def _merge_clip_sections(ranges: List[Tuple[float, float]]) -> List[List[float]]:
+        """片段組要下載的範圍：各段前後留一點餘裕，間隔很近的併成同一段"""
+        sections = []
+        for start, end in sorted(ranges):
+            start, end = max(0.0, start - CLIP_SECTION_PAD), end + CLIP_SECTION_PAD
+            if sections and start <= sections[-1][1] + CLIP_MERGE_GAP:
+                sections[-1][1] = max(sections[-1][1], end)
+            else:
+                sections.append([start, end])
+        return sections
+
+    async def _gather_clip_group(self, task_id: str):
+        """
+        片段任務開始下載前，把同一支影片、同格式還在排隊的片段任務併進來，
+        一次下載各段的聯集，再一起剪出（其餘任務保留各自的 task_id 與進度）
+        """
+        from services.queue import download_queue
+
+        task = self.tasks[task_id]
+        # 延後重試、被搶占後回來的沿用原本的分組
+        if task.get("clip_members") or not local_deriver.ffmpeg:
+            return
+        members = [task_id]
+        for other in list(self.tasks.values()):
+            if len(members) >= CLIP_GROUP_MAX:
+                break
+            other_id = other["task_id"]
+            if (other_id == task_id or other.get("status") != "queued"
+                    or other.get("clip_start") is None or other.get("clip_leader")
+                    or other["url"] != task["url"] or other["format"] != task["format"]
+                    or other["audio_only"] != task["audio_only"]
+                    or self.is_cancelled(other_id) or self.is_paused(other_id)):
+                continue
+            # 還在排隊的移出佇列；已派發還沒開始的輪到它時會直接讓出名額
+            if download_queue.is_task_queued(other_id):
+                await download_queue.remove(other_id)
+                if other.get("status") != "queued":
+                    continue
+            other["clip_leader"] = task_id
+            members.append(other_id)
+        # 單一視訊片段也走同一流程：下載範圍不重新編碼，再用智慧剪輯只重編兩端
+        if len(members) == 1 and (task["audio_only"] or not smart_cutter.available):
+            return
+        task["clip_members"] = members
+        task["clip_sections"] = self._merge_clip_sections(
+            [(self.tasks[m]["clip_start"], self.tasks[m]["clip_end"]) for m in members]
+        )
+        if len(members) > 1:
+            print(f"[下載] 合併 {len(members)} 個片段一起下載: {task_id} "
+                  f"({len(task['clip_sections'])} 段範圍)")
+        self._mirror_clip_group(task_id)
+
+    def _mirror_clip_group(self, task_id: str, notify_status: Optional[str] = None, **fields):
+        """把帶頭任務的下載進度同步到同組的其他片段任務（完成、失敗由各自的收尾處理）"""
+        task = self.tasks.get(task_id)
+        members = task.get("clip_members") if task else None
+        if not members:
+            return
+        changes = {key: task.get(key) for key in ("progress", "speed", "eta", "message", "retry_message")}
+        if task.get("status") in ("queued", "downloading", "retrying", "merging"):
+            changes["status"] = task["status"]
+        notifier = get_ws_notifier() if notify_status in ("downloading", "retrying", "merging") else None
+        for member_id in members:
+            member = self.tasks.get(member_id)
+            if member_id == task_id or member is None or self.is_cancelled(member_id):
+                continue
+            member.update(changes)
+            if notifier:
+                notifier.notify(member_id, notify_status, **fields)
+
+    def _sync_cut_clip_group(self, task_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        從合併下載的各段檔案一次剪出組內每個片段（在後製執行緒池中執行）
+
+        Returns:
+            帶頭任務自己的完成結果
+        """
+        task = self.tasks[task_id]
+        audio_only = task["audio_only"]
+        spans = result["clip_spans"]
+        meta = result["meta"]
+        stem = yt_dlp.utils.sanitize_filename(meta.get("title") or "Unknown")
+        ext = ".m4a" if audio_only else ".mp4"
+        notifier = get_ws_notifier()
+
+        jobs = []
+        members = []
+        origins = {}
+        for member_id in task.get("clip_members") or [task_id]:
+            member = self.tasks.get(member_id)
+            if member is None or self.is_cancelled(member_id):
+                continue
+            start, end = member["clip_start"], member["clip_end"]
+            span = next((
+                s for s in spans
+                if s["start"] <= start and (s["end"] is None or end <= s["end"])
+            ), None)
+            if span is None:
+                self._fail_task(member_id, "合併下載的範圍不含此片段", "unknown")
+                continue
+            name = f"{stem}_[{self._fmt_clip_time(start)}-{self._fmt_clip_time(end)}]"
+            output = self.download_path / f"{name}{ext}"
+            if output.exists() or any(output == job[3] for job in jobs):
+                output = self.download_path / f"{name} ({member_id}){ext}"
+            path = Path(span["path"])
+            if path not in origins:
+                origins[path] = self._section_origin(span, audio_only)
+            jobs.append((path, start - origins[path], end - start, output))
+            members.append(member_id)
+            member.update({"status": "merging", "progress": 100, "message": "剪輯片段中..."})
+            if notifier:
+                notifier.notify(member_id, "merging", progress=100, message="剪輯片段中...")
+
+        own = {"success": False, "error": "任務已取消", "cancelled": True}
+        try:
+            if jobs:
+                elapsed = local_deriver.derive_many(jobs, audio_only)
+                print(f"[下載] 剪出 {len(jobs)} 個片段（{elapsed:.1f} 秒）: {task_id}")
+        except RuntimeError as e:
+            print(f"[下載] {e}")
+            for member_id in members:
+                failed = self._fail_task(member_id, "片段剪輯失敗", "unknown")
+                if member_id == task_id:
+                    own = failed
+                else:
+                    self.tasks[member_id].pop("clip_leader", None)
+                    self._unpersist_task(member_id)
+            return own
+        finally:
+            shutil.rmtree(self.download_path / ".clips" / task_id, ignore_errors=True)
+
+        for member_id, job in zip(members, jobs):
+            completed = self._complete_task(
+                member_id, str(job[3]), result["video_id"], result["format"], **meta
+            )
+            if member_id == task_id:
+                own = completed
+                continue
+            self.tasks[member_id].pop("clip_leader", None)
+            storage_manager.acquire(completed["filename"])
+            self._cache_artifact(member_id, completed)
+            self._unpersist_task(member_id)
+        return own
+
+    @staticmethod
+    def _section_origin(span: Dict[str, Any], audio_only: bool) -> float:
+        """
+        段落檔中 ffmpeg 輸入端 -ss 0 對應的來源時間
+
+        視訊段落以 -copyts 下載，從要求起點前一個 keyframe 開始並保留來源時間戳，
+        以容器的起始時間為準；純音訊每個封包都能獨立解碼，段落就從要求的起點開始
+        （轉檔後製也會把時間戳歸零），沿用要求的起點
+        """
+        if audio_only:
+            return span["start"]
+        origin = smart_cutter.start_time(Path(span["path"]))
+        return span["start"] if origin is None else origin
+
+    async def release_clip_group(self, task_id: str) -> List[str]:
+        """
+        帶頭任務被取消或手動暫停：同組其他片段各自重新排隊
+
+        Returns:
+            重新排隊的任務
+        """
+        from services.queue import download_queue
+
+        task = self.tasks.get(task_id)
+        members = task.pop("clip_members", None) if task else None
+        if not members:
+            return []
+        task.pop("clip_sections", None)
+        released = []
+        for member_id in members:
+            member = self.tasks.get(member_id)
+            if member_id == task_id or member is None or member.get("clip_leader") != task_id:
+                continue
+            member.pop("clip_leader", None)
+            if self.is_cancelled(member_id):
+                continue
+            member.update({"status": "queued", "progress": 0, "speed": None, "eta": None})
+            await download_queue.submit(member_id, self.execute_task, member_id, meta=member)
+            released.append(member_id)
+        if released:
+            print(f"[下載] 片段組解散，{len(released)} 個片段各自排隊: {task_id}")
+        return released
+
+    def _settle_clip_group(self, task_id: str, result: Dict[str, Any]):
+        """帶頭任務結束：成功時各片段已在剪輯時完成，失敗時同組一起失敗"""
+        task = self.tasks[task_id]
+        members = task.pop("clip_members", None)
+        task.pop("clip_sections", None)
+        for member_id in members or []:
+            member = self.tasks.get(member_id)
+            if member_id == task_id or member is None or member.get("clip_leader") != task_id:
+                continue
+            member.pop("clip_leader", None)
+            if result.get("success") or self.is_cancelled(member_id):
+                continue
+            self._fail_task(
+                member_id, result.get("error") or "下載失敗",
+                result.get("error_category") or task.get("error_category") or "unknown",
+                task.get("error_history"),
+            )
+            self._unpersist_task(member_id)
+
+    def _cache_artifact(self, task_id: str, result: Dict[str, Any]):
+        """把剛完成的下載收錄到成品快取（鍵用實際使用的格式，降級過的不會冒充原畫質）"""
+        task = self.tasks.get(task_id)
+        if not task or not result.get("video_id"):
+            return
+        try:
+            artifact_cache.add(
+                self._artifact_key(task, result["video_id"], result["format"]),
+                self.download_path / result["filename"],
+                result["video_id"],
+                self._get_format_string(result["format"], task["audio_only"]),
+                task["audio_only"], task.get("clip_start"), task.get("clip_end"),
+                **result.get("meta", {})
+            )
+        except Exception as e:
+            print(f"[成品快取] 收錄失敗: {task_id} - {e}")
+
     async def execute_task(self, task_id: str) -> Dict[str, Any]:
         """執行下載任務（非阻塞，支援多任務併發）"""
+        # 斷路器半開時派發閘門替這個任務取得了探測名額：由任務認領，
+        # 結束時若還沒回報結果（取消、快取命中、本地衍生等沒有連 YouTube 就結束）就放出名額
+        scope = None if self.proxy_pool_api else (self.proxy or "direct")
+        claimed = scope is not None and rate_limit_breaker.claim_probe(scope, task_id)
+        try:
+            return await self._execute_task(task_id)
+        finally:
+            if claimed:
+                rate_limit_breaker.release(scope, owner=task_id)
+
+    async def _execute_task(self, task_id: str) -> Dict[str, Any]:
+        """執行下載任務的主體（execute_task 負責探測名額的收尾）"""
         task = self.tasks.get(task_id)
         if not task:
             return {"success": False, "error": "任務不存在"}
 
+        # 排隊期間已被取消或暫停（佇列移除前剛好被派發）
+        if self.is_cancelled(task_id):
+            return {"success": False, "error": "任務已取消", "cancelled": True}
+        if task.get("status") == "paused":
+            return {"success": False, "error": "任務已暫停", "paused": True}
+        # 已併入其他片段任務的合併下載：讓出名額，由帶頭的任務完成
+        if task.get("clip_leader"):
+            return {"success": False, "error": "已與同影片的片段合併下載", "coalesced": True}
+
+        # 已知無法下載的影片不佔用執行緒與代理，直接失敗
+        video_id = extract_video_id(task["url"])
+        failure = negative_cache.get(video_id)
+        if failure is not None:
+            print(f"[下載] 負快取命中，直接失敗: {task_id} ({failure['category']})")
+            result = self._fail_task(task_id, failure["message"], failure["category"])
+            self._unpersist_task(task_id)
+            return result
+        # 排隊期間相同成品已由其他任務下載完成
+        result = self.complete_from_cache(task_id)
+        if result is not None:
+            return result
+
         # 加入執行中集合
         self.running_tasks.add(task_id)
         task["status"] = "downloading"
+        if self.persistent_queue:
+            try:
+                self.queue_store.mark_running(task_id)
+            except Exception as e:
+                print(f"[佇列持久化] 更新失敗: {task_id} - {e}")
 
         try:
-            # 在線程池中執行同步下載，不阻塞 event loop
-            return await asyncio.to_thread(self._sync_execute_download, task_id)
+            # 已有同一支影片的完整成品：音訊、片段在本地用 ffmpeg 衍生，不連 YouTube
+            result = None
+            source = self._local_source(task, video_id)
+            if source is not None:
+                result = await postprocess_executor.run(self._sync_derive_local, task_id, source)
+            if result is None:
+                if task.get("clip_start") is not None:
+                    await self._gather_clip_group(task_id)
+                # 在下載專用執行緒池中執行同步下載，不阻塞 event loop 也不搶資訊擷取的執行緒
+                if self.execution_mode == "process":
+                    result = await download_executor.run(self._sync_execute_in_process, task_id)
+                else:
+                    result = await download_executor.run(self._sync_execute_download, task_id)
+                if result.get("clip_spans"):
+                    # 一次 ffmpeg 剪出組內每個片段
+                    result = await postprocess_executor.run(self._sync_cut_clip_group, task_id, result)
+            if result.get("paused"):
+                self._on_paused(task_id)
+                self._mirror_clip_group(task_id)
+                return result
+            if result.get("retry_after"):
+                # 延後重試：名額交還佇列，持久化記錄保留，到時由佇列重新派發
+                result.pop("retry_state", None)
+                return result
+            self._retry_states.pop(task_id, None)
+            if result.get("cancelled"):
+                await self.release_clip_group(task_id)
+            else:
+                self._settle_clip_group(task_id, result)
+            if not result.get("success"):
+                # 取消的不算；原因只看最後一次的原始錯誤（較早的重試可能是暫時性錯誤或停滯）
+                if not result.get("cancelled"):
+                    negative_cache.put(video_id, result.get("error_category"), result.get("error"),
+                                       result.get("last_error"))
+            elif not result.get("cached"):
+                storage_manager.acquire(result["filename"])
+                self._cache_artifact(task_id, result)
+            # 只在正常結束時移除；服務關閉時被中斷的任務留在佇列，重啟後恢復
+            self._unpersist_task(task_id)
+            return result
         finally:
             # 從執行中集合移除
             self.running_tasks.discard(task_id)
+            concurrency_controller.forget_task(task_id)
+            self._stalled.pop(task_id, None)
+            self._transfer_samples.pop(task_id, None)
+
+    def _on_paused(self, task_id: str):
+        """下載已停下：搶占的回到排隊（佇列會放回最前面），手動暫停的等待恢復"""
+        self._paused_tasks.discard(task_id)
+        task = self.tasks.get(task_id)
+        if not task:
+            return
+        if task.get("preempted"):
+            task.update({"status": "queued", "speed": None, "eta": None})
+            print(f"[下載] 任務被搶占，稍後續傳: {task_id}")
+        else:
+            task.update({"status": "paused", "speed": None, "eta": None,
+                         "paused_at": datetime.now().isoformat()})
+            self._mark_paused(task_id)
+        notifier = get_ws_notifier()
+        if notifier:
+            notifier.notify(task_id, task["status"], progress=task.get("progress", 0))
+
+    def _sync_execute_in_process(self, task_id: str) -> Dict[str, Any]:
+        """在子程序中執行下載，並把回傳的事件套用到主程序的任務狀態"""
+        from services.process_worker import process_pool
+        from services.error_handler import retry_manager
+
+        task = self.tasks.get(task_id)
+        if not task:
+            return {"success": False, "error": "任務不存在"}
+        if self.is_cancelled(task_id):
+            return {"success": False, "error": "任務已取消", "cancelled": True}
+
+        breaker_reported = []
+
+        def on_event(message: tuple):
+            kind = message[0]
+            if kind == "state":
+                self.bad_proxies.update(message[1].get("bad_proxies", []))
+                return
+            # 斷路器結果不論任務狀態都要套用，否則半開的探測名額會卡住
+            if kind == "breaker":
+                getattr(rate_limit_breaker, message[1])(message[2])
+                breaker_reported.append(message[2])
+                return
+            if kind == "retry_policy":
+                getattr(retry_manager.policy, message[1])(*message[2])
+                return
+            if kind == "transfer":
+                getattr(transfer_tuner, message[1])(*message[2])
+                return
+            if kind == "info_cache":
+                getattr(info_cache, message[1])(*message[2])
+                return
+            # 已取消、暫停的任務忽略子程序被終止前送來的殘餘事件
+            if self.is_cancelled(task_id) or self.is_paused(task_id):
+                return
+            if kind == "task":
+                changes = message[1]
+                task.update(changes)
+                if "downloaded_bytes" in changes:
+                    concurrency_controller.record_progress(task_id, changes["downloaded_bytes"])
+                if changes.get("current_proxy"):
+                    self.current_proxy = changes["current_proxy"]
+                self._mirror_clip_group(task_id)
+            elif kind == "notify":
+                notifier = get_ws_notifier()
+                if notifier:
+                    notifier.notify(message[1], message[2], **message[3])
+                self._mirror_clip_group(message[1], message[2], **message[3])
+            elif kind == "rate_limit":
+                concurrency_controller.record_rate_limit()
+
+        while True:
+            settings = {
+                "proxy": self.proxy,
+                "proxy_pool_api": self.proxy_pool_api,
+                "bad_proxies": list(self.bad_proxies),
+                "retry_state": self._retry_states.get(task_id),
+                "open_scopes": rate_limit_breaker.open_scopes(),
+                "retry_budget": retry_manager.policy.budget_remaining(),
+                "transfer_state": transfer_tuner.export_state(),
+                "info_entry": info_cache.get_entry(extract_video_id(task["url"])),
+            }
+            result = process_pool.run(
+                task_id, dict(task), settings, on_event,
+                is_cancelled=lambda: self.is_cancelled(task_id)
+            )
+
+            # 子程序在回報結果前就被終止：放出派發時取得的探測名額
+            if not breaker_reported and not self.proxy_pool_api:
+                rate_limit_breaker.release(self.proxy or "direct", owner=task_id)
+
+            if self.is_cancelled(task_id):
+                self._stalled.pop(task_id, None)
+                self._cleanup_temp_files(task_id)
+                return {"success": False, "error": "任務已取消", "cancelled": True}
+            if self.is_paused(task_id):
+                self._stalled.pop(task_id, None)
+                return {"success": False, "error": "任務已暫停", "paused": True}
+            # 停滯被終止：帶著更新後的代理黑名單重跑，yt-dlp 從 .part 檔續傳
+            if self._stalled.pop(task_id, None) is not None:
+                print(f"[下載] 下載停滯，換出口續傳: {task_id}")
+                continue
+            break
+
+        if result.get("killed"):
+            task.update({"status": "failed", "error": result["error"]})
+        if result.get("retry_after"):
+            # 子程序結束後重試狀態就不見了，由主程序保存給下一個子程序
+            self._retry_states[task_id] = result.get("retry_state")
+
+        return result
 
     def list_downloads(self):
         """列出已下載的檔案"""
@@ -908,12 +2136,8 @@ class Downloader:
         return videos
 
     def delete_file(self, filename: str) -> bool:
-        """刪除檔案"""
-        file_path = self.download_path / filename
-        if file_path.exists() and file_path.is_file():
-            file_path.unlink()
-            return True
-        return False
+        """刪除檔案（快取成品另有連結，不受影響）"""
+        return storage_manager.release(filename)
 
     def get_history(
         self,
@@ -959,9 +2183,15 @@ class Downloader:
         if proxy:
             ydl_opts['proxy'] = proxy
 
+        egress = proxy or "direct"
+        wait = rate_limit_breaker.acquire(egress)
+        if wait:
+            return self._breaker_error(wait)
+
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
+                self._record_egress_outcome(egress)
                 if info is None:
                     return {"error": "無法取得播放清單資訊"}
 
@@ -989,11 +2219,12 @@ class Downloader:
                     "videos": videos,
                 }
         except Exception as e:
+            self._record_egress_outcome(egress, str(e))
             return {"error": str(e)}
 
     async def get_playlist_info(self, url: str) -> Dict[str, Any]:
-        """取得播放清單資訊（非阻塞）"""
-        return await asyncio.to_thread(self._sync_get_playlist_info, url)
+        """取得播放清單資訊（非阻塞，使用擷取專用執行緒池）"""
+        return await extract_executor.run(self._sync_get_playlist_info, url)
 
     def create_playlist_tasks(
         self,
@@ -1004,7 +2235,8 @@ class Downloader:
         playlist_id: str = None,
         client_ip: str = None,
         session_id: str = None,
-        user_id: int = None
+        user_id: int = None,
+        user_role: str = None
     ) -> Dict[str, Any]:
         """
         為播放清單中的影片建立下載任務
@@ -1018,6 +2250,7 @@ class Downloader:
             client_ip: 客戶端 IP
             session_id: Session ID
             user_id: 用戶 ID
+            user_role: 用戶角色（佇列排程權重用）
 
         Returns:
             建立的任務資訊
@@ -1041,7 +2274,10 @@ class Downloader:
                 audio_only=audio_only,
                 client_ip=client_ip,
                 session_id=session_id,
-                user_id=user_id
+                user_id=user_id,
+                user_role=user_role,
+                persist=False,
+                duration=video.get('duration')
             )
             # 補充播放清單資訊
             self.tasks[task_id]["playlist_video"] = True
@@ -1049,6 +2285,8 @@ class Downloader:
             self.tasks[task_id]["video_title"] = video.get('title')
             task_ids.append(task_id)
 
+        self._persist_tasks(task_ids)
+
         return {
             "playlist_id": batch_id,
             "total_videos": len(videos),
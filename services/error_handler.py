@@ -300,6 +300,19 @@ class SmartRetryManager:
 
     def __init__(self):
         self.task_retries: Dict[str, Dict[str, Any]] = {}
+        self._policy = None
+
+    @property
+    def policy(self):
+        """自適應重試策略（延遲導入，避免 import 時就開資料庫）"""
+        if self._policy is None:
+            from services.retry_policy import retry_policy
+            self._policy = retry_policy
+        return self._policy
+
+    @policy.setter
+    def policy(self, value):
+        self._policy = value
 
     def start_task(self, task_id: str, initial_format: str):
         """開始追蹤任務"""
@@ -308,15 +321,40 @@ class SmartRetryManager:
             "current_format": initial_format,
             "errors": [],
             "proxies_tried": set(),
+            "waited": 0.0,            # 累計重試等待秒數
+            "pending_retry": None,    # 等待結果的上一次重試（類別、出口、延遲）
         }
 
-    def should_retry(self, task_id: str, error_message: str) -> Tuple[bool, Dict[str, Any]]:
+    def record_outcome(self, task_id: str, category: Optional[ErrorCategory] = None):
+        """
+        回報一次下載嘗試的結果，供重試策略學習
+
+        Args:
+            task_id: 任務 ID
+            category: 失敗的錯誤類別；None 表示成功
+        """
+        self.policy.record_attempt()
+        task_info = self.task_retries.get(task_id)
+        pending = task_info.pop("pending_retry", None) if task_info else None
+        if not pending:
+            return
+        # 重試後不再出現同類錯誤，就算這個延遲有效
+        success = category is None or category.value != pending["category"]
+        self.policy.record_outcome(pending["category"], pending["scope"], pending["delay"], success)
+
+    def should_retry(
+        self,
+        task_id: str,
+        error_message: str,
+        scope: str = "direct"
+    ) -> Tuple[bool, Dict[str, Any]]:
         """
         判斷是否應該重試
 
         Args:
             task_id: 任務 ID
             error_message: 錯誤訊息
+            scope: 這次失敗使用的出口（代理 URL 或 direct），重試延遲依出口分開學習
 
         Returns:
             (是否重試, 重試資訊)
@@ -345,30 +383,70 @@ class SmartRetryManager:
                 error_message, category, strategy, task_info["retry_count"]
             )
 
-        # 準備重試資訊
-        retry_info = {
-            "should_retry": True,
-            "delay": strategy.delay_seconds,
-            "change_proxy": strategy.change_proxy,
-            "message": strategy.message_zh,
-        }
-
         # 處理格式降級
+        new_format = None
         if strategy.downgrade_quality:
             new_format = get_downgraded_format(task_info["current_format"])
-            if new_format:
-                task_info["current_format"] = new_format
-                retry_info["new_format"] = new_format
-                retry_info["message"] = f"格式降級到 {new_format}"
-            else:
+            if not new_format:
                 # 已經是最低畫質，不再重試
                 return False, format_error_response(
                     error_message, category, strategy, task_info["retry_count"]
                 )
 
+        # 延遲：學到的基準延遲 × 2^(同類錯誤已重試次數) + 抖動
+        attempt = sum(1 for err in task_info["errors"][:-1] if err["category"] == category.value)
+        delay = self.policy.next_delay(category.value, scope, attempt, strategy.delay_seconds)
+
+        # 單一任務與全域的重試預算
+        waited = task_info.get("waited", 0.0)
+        denied = self.policy.acquire_retry(task_info["retry_count"], waited, delay)
+        if denied:
+            response = format_error_response(
+                error_message, category, strategy, task_info["retry_count"]
+            )
+            response["message"] = f"{strategy.message_zh}（{denied}）"
+            response["retryable"] = False
+            response["budget_exhausted"] = True
+            return False, response
+
+        # 準備重試資訊
+        retry_info = {
+            "should_retry": True,
+            "delay": delay,
+            "change_proxy": strategy.change_proxy,
+            "message": strategy.message_zh,
+        }
+        if new_format:
+            task_info["current_format"] = new_format
+            retry_info["new_format"] = new_format
+            retry_info["message"] = f"格式降級到 {new_format}"
+
+        task_info["waited"] = waited + delay
+        task_info["pending_retry"] = {"category": category.value, "scope": scope, "delay": delay}
         task_info["retry_count"] += 1
         return True, retry_info
 
+    def is_tracking(self, task_id: str) -> bool:
+        """是否已有任務的重試狀態（延後重試的任務重新開始時沿用）"""
+        return task_id in self.task_retries
+
+    def export_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """匯出任務的重試狀態（交給下一個下載子程序沿用）"""
+        info = self.task_retries.get(task_id)
+        if info is None:
+            return None
+        return {**info, "errors": list(info["errors"]), "proxies_tried": set(info["proxies_tried"])}
+
+    def import_task(self, task_id: str, state: Dict[str, Any]):
+        """匯入先前匯出的重試狀態"""
+        self.task_retries[task_id] = {
+            "waited": 0.0,
+            "pending_retry": None,
+            **state,
+            "errors": list(state.get("errors", [])),
+            "proxies_tried": set(state.get("proxies_tried", ())),
+        }
+
     def get_current_format(self, task_id: str) -> str:
         """取得任務當前格式"""
         if task_id in self.task_retries:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+專用執行緒池
+資訊擷取、下載、後製各自使用獨立且有上限的執行緒池，
+避免長時間下載（含 rate limit 重試等待）佔滿預設 executor 而拖慢 /api/info
+"""
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+from services.concurrency import concurrency_controller
+
+
+class _Job:
+    """池中的單一工作（記錄是否已離開排隊）"""
+
+    __slots__ = ("wrapper", "dequeued")
+
+    def __init__(self):
+        self.wrapper: Optional[Callable] = None
+        self.dequeued = False
+
+
+class BoundedExecutor:
+    """具名、有上限並提供飽和度指標的執行緒池"""
+
+    def __init__(self, name: str, max_workers: int):
+        """
+        Args:
+            name: 執行緒池名稱（也用於執行緒名稱前綴）
+            max_workers: 最大執行緒數
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._thread_prefix = f"ytify-{name}"
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=self._thread_prefix
+        )
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _wrap(self, func: Callable, args: tuple, kwargs: dict) -> "_Job":
+        """包裝成記錄等待時間與執行中數量的工作，並計入排隊數"""
+        job = _Job()
+        submitted_at = time.monotonic()
+
+        def wrapper():
+            wait = time.monotonic() - submitted_at
+            with self._lock:
+                self._dequeue(job)
+                self._active += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        job.wrapper = wrapper
+        with self._lock:
+            self._queued += 1
+        return job
+
+    def _dequeue(self, job: "_Job"):
+        """工作離開排隊（開始執行或被取消，只扣一次；呼叫端需持有 lock）"""
+        if not job.dequeued:
+            job.dequeued = True
+            self._queued -= 1
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在池中執行同步函式（非阻塞）"""
+        loop = asyncio.get_running_loop()
+        job = self._wrap(func, args, kwargs)
+        try:
+            return await loop.run_in_executor(self._executor, job.wrapper)
+        except asyncio.CancelledError:
+            # 還沒開始就被取消的工作不會進 wrapper，要自己把排隊數扣回來
+            with self._lock:
+                self._dequeue(job)
+            raise
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在池中執行同步函式並等待結果（阻塞，供其他池的執行緒把某個階段交給這個池）
+
+        已經在這個池的執行緒中時直接執行，避免池滿時自己等自己
+        """
+        if threading.current_thread().name.startswith(self._thread_prefix):
+            return func(*args, **kwargs)
+        return self._executor.submit(self._wrap(func, args, kwargs).wrapper).result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得飽和度指標"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "max": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "saturation": round(self._active / self.max_workers, 2),
+                "completed": self._completed,
+                "avg_wait_ms": round(self._wait_total / self._completed * 1000, 1) if self._completed else 0,
+                "max_wait_ms": round(self._wait_max * 1000, 1),
+            }
+
+    def shutdown(self, wait: bool = False):
+        """關閉執行緒池"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# 資訊擷取：/api/info、/api/playlist/info，需要保持低延遲
+extract_executor = BoundedExecutor(
+    "extract", int(os.environ.get("YTIFY_EXTRACT_WORKERS", "4"))
+)
+# 下載：大小跟著併發上限走，避免佇列派發的任務在池裡排隊
+download_executor = BoundedExecutor(
+    "download", int(os.environ.get("YTIFY_DOWNLOAD_WORKERS", str(concurrency_controller.ceiling)))
+)
+# 後製：yt-dlp 的合併與 FFmpeg 後製、本地轉檔與剪輯等 CPU 密集工作
+postprocess_executor = BoundedExecutor(
+    "postprocess", int(os.environ.get("YTIFY_POSTPROCESS_WORKERS", "2"))
+)
+
+ALL_EXECUTORS = (extract_executor, download_executor, postprocess_executor)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    """取得所有執行緒池的飽和度指標"""
+    return {executor.name: executor.get_stats() for executor in ALL_EXECUTORS}
+
+
+def shutdown_executors():
+    """關閉所有執行緒池"""
+    for executor in ALL_EXECUTORS:
+        executor.shutdown(wait=False)
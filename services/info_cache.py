@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+影片資訊快取
+/api/info 擷取到的 info dict 依影片 ID 保存（yt-dlp sanitize_info 清理過，可直接交給
+process_ie_result）：
+- /api/info：TTL 內直接由快取回應，熱門影片不必每次都擷取
+- 下載：沿用快取不必再跑一次 player response 與簽章解密；格式 URL 帶有 expire 時間，
+  且綁定擷取時的出口 IP，過期或換出口就重新擷取
+以 LRU 淘汰，並限制總筆數與估計記憶體用量
+
+另有負快取：私人、已移除、版權封鎖這類不會因重試而改變的失敗，
+依類別保存一段時間，期間內直接回應分類結果，不再擷取
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import yt_dlp
+
+
+# googlevideo URL 的到期時間：?expire=1700000000 或 manifest 路徑 /expire/1700000000/
+_EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+# 沿用快取時格式 URL 提早失效或被拒：下載媒體時 googlevideo 回 403 / 410
+_STALE_URL_PATTERN = re.compile(r'HTTP Error (403|410)\b', re.IGNORECASE)
+
+
+def url_expiry(info: Dict[str, Any]) -> Optional[float]:
+    """info 中所有格式 URL 最早的到期時間（unix 秒）；找不到則回傳 None"""
+    expiry = None
+    for f in info.get('formats') or []:
+        for key in ('url', 'manifest_url', 'fragment_base_url'):
+            match = _EXPIRE_PATTERN.search(f.get(key) or '')
+            if match:
+                ts = float(match.group(1))
+                expiry = ts if expiry is None else min(expiry, ts)
+    return expiry
+
+
+def is_stale_url_error(message: str) -> bool:
+    """錯誤是否為格式 URL 失效（只適用於沿用快取 info 的下載：此時不會再打 YouTube 網頁）"""
+    return bool(message) and _STALE_URL_PATTERN.search(message) is not None
+
+
+class InfoCache:
+    """依影片 ID 保存的 info dict（擷取、下載執行緒都會呼叫，需執行緒安全）"""
+
+    def __init__(
+        self,
+        info_ttl: float = 300,
+        margin: float = 1800,
+        default_ttl: float = 1800,
+        max_entries: int = 500,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        """
+        Args:
+            info_ttl: /api/info 直接由快取回應的秒數
+            margin: 距離 URL 到期少於幾秒就不再給下載使用（保留給下載本身的時間）
+            default_ttl: URL 沒有 expire 參數時的保存秒數
+            max_entries: 最多保存幾支影片
+            max_bytes: 估計記憶體用量上限（以 JSON 大小估算）
+        """
+        self.info_ttl = info_ttl
+        self.margin = margin
+        self.default_ttl = default_ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        # 命中統計：用途 -> [命中, 未命中]
+        self._lookups = {"info": [0, 0], "download": [0, 0]}
+        self.coalesced = 0       # 併發的未命中共用同一次擷取
+        self.saved_seconds = 0.0  # 命中與共用擷取省下的擷取時間
+        self.expired = 0
+        self.evicted = 0
+        self._window = {"hits": 0, "misses": 0, "saved": 0.0}  # 上次回報監控後的累計
+
+    @classmethod
+    def from_env(cls) -> "InfoCache":
+        """從環境變數建立（YTIFY_INFO_TTL / YTIFY_INFO_CACHE_MARGIN / YTIFY_INFO_CACHE_TTL / YTIFY_INFO_CACHE_MAX_ENTRIES / YTIFY_INFO_CACHE_MAX_MB / YTIFY_INFO_CACHE）"""
+        cache = cls(
+            info_ttl=float(os.environ.get("YTIFY_INFO_TTL", "300")),
+            margin=float(os.environ.get("YTIFY_INFO_CACHE_MARGIN", "1800")),
+            default_ttl=float(os.environ.get("YTIFY_INFO_CACHE_TTL", "1800")),
+            max_entries=int(os.environ.get("YTIFY_INFO_CACHE_MAX_ENTRIES", "500")),
+            max_bytes=int(os.environ.get("YTIFY_INFO_CACHE_MAX_MB", "64")) * 1024 * 1024,
+        )
+        cache.enabled = os.environ.get("YTIFY_INFO_CACHE", "true").lower() == "true"
+        return cache
+
+    def make_entry(self, info: Dict[str, Any], egress: str, extract_seconds: float = 0.0) -> Optional[Dict[str, Any]]:
+        """把擷取結果整理成快取項目（URL 已過期或不是單一影片時回傳 None）"""
+        if not info or info.get('_type', 'video') != 'video':
+            return None
+        now = time.time()
+        expiry = url_expiry(info)
+        expires_at = expiry - self.margin if expiry else now + self.default_ttl
+        # 下載用不到了也還能在 info TTL 內回應 /api/info
+        expires_at = max(expires_at, now + self.info_ttl)
+        sanitized = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        return {
+            "info": sanitized,
+            "egress": egress,
+            "cached_at": now,
+            "url_expires_at": expiry - self.margin if expiry else now + self.default_ttl,
+            "expires_at": expires_at,
+            "extract_seconds": extract_seconds,
+            "size": len(json.dumps(sanitized, ensure_ascii=False)),
+        }
+
+    def import_entry(self, video_id: Optional[str], entry: Optional[Dict[str, Any]]):
+        """放入已整理好的快取項目，超過上限時淘汰最久沒用到的"""
+        if not self.enabled or not video_id or not entry:
+            return
+        with self._lock:
+            old = self._entries.pop(video_id, None)
+            if old is not None:
+                self._bytes -= old["size"]
+            self._entries[video_id] = entry
+            self._bytes += entry["size"]
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["size"]
+                self.evicted += 1
+
+    def put(self, video_id: Optional[str], info: Dict[str, Any], egress: str, extract_seconds: float = 0.0):
+        """
+        保存擷取結果
+
+        Args:
+            video_id: 影片 ID
+            info: extract_info 的結果
+            egress: 擷取時的出口（格式 URL 綁定 IP，換出口不能沿用）
+            extract_seconds: 這次擷取花的時間（命中時計入省下的時間）
+        """
+        if self.enabled and video_id:
+            self.import_entry(video_id, self.make_entry(info, egress, extract_seconds))
+
+    def get_entry(self, video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """取得未過期的快取項目並標記為最近使用"""
+        if not self.enabled or not video_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[video_id]
+                self._bytes -= entry["size"]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(video_id)
+            return entry
+
+    def _count(self, purpose: str, entry: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._lookups[purpose][0 if entry else 1] += 1
+            if entry:
+                self.saved_seconds += entry["extract_seconds"]
+                self._window["hits"] += 1
+                self._window["saved"] += entry["extract_seconds"]
+            else:
+                self._window["misses"] += 1
+
+    def get_info(self, video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        取得 /api/info 用的 info（唯讀，不拷貝）
+
+        Returns:
+            info TTL 內的快取；沒有或太舊時回傳 None
+        """
+        entry = self.get_entry(video_id)
+        if entry is not None and time.time() - entry["cached_at"] > self.info_ttl:
+            entry = None
+        self._count("info", entry)
+        return entry["info"] if entry else None
+
+    def get(self, video_id: Optional[str], egress: str) -> Optional[Dict[str, Any]]:
+        """
+        取得下載用、可直接交給 process_ie_result 的 info（深拷貝，處理過程會修改內容）
+
+        Returns:
+            快取的 info；沒有、格式 URL 將到期或出口不同時回傳 None
+        """
+        entry = self.get_entry(video_id)
+        if entry is not None and (entry["egress"] != egress or entry["url_expires_at"] <= time.time()):
+            entry = None
+        self._count("download", entry)
+        return copy.deepcopy(entry["info"]) if entry else None
+
+    def record_coalesced(self, waiters: int, extract_seconds: float):
+        """記錄併發的未命中共用了同一次擷取"""
+        with self._lock:
+            self.coalesced += waiters
+            self.saved_seconds += waiters * extract_seconds
+            self._window["saved"] += waiters * extract_seconds
+
+    def invalidate(self, video_id: Optional[str]):
+        """移除快取（格式 URL 失效時）"""
+        with self._lock:
+            entry = self._entries.pop(video_id, None)
+            if entry is not None:
+                self._bytes -= entry["size"]
+
+    def take_window(self) -> Dict[str, float]:
+        """取出上次呼叫以來的命中統計並歸零（供監控定期記錄）"""
+        with self._lock:
+            window = self._window
+            self._window = {"hits": 0, "misses": 0, "saved": 0.0}
+            return window
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取命中統計"""
+        with self._lock:
+            stats = {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "memory_mb": round(self._bytes / 1024 / 1024, 1),
+                "max_entries": self.max_entries,
+                "max_mb": round(self.max_bytes / 1024 / 1024),
+                "info_ttl": self.info_ttl,
+                "coalesced": self.coalesced,
+                "saved_seconds": round(self.saved_seconds, 1),
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+            for purpose, (hits, misses) in self._lookups.items():
+                lookups = hits + misses
+                stats[purpose] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / lookups, 2) if lookups else None,
+                }
+            return stats
+
+
+# 負快取的類別（ErrorCategory 的值）與預設保存秒數：私人影片可能改回公開，保存最短
+NEGATIVE_TTLS = {
+    "private_video": 3600,
+    "unavailable": 6 * 3600,
+    "copyright": 24 * 3600,
+}
+
+# 明確指出原因的訊息才依類別保存完整秒數（錯誤分類的模式較寬，會把年齡驗證、軟封鎖也歸進來）
+NEGATIVE_PATTERNS = {
+    "private_video": [r'private video', r'video is private'],
+    "unavailable": [
+        r'this video has been removed',
+        r'this video is no longer available',
+        r'account associated with this video has been terminated',
+    ],
+    "copyright": [r'copyright claim', r'blocked.*copyright', r'removed.*copyright', r'due to a copyright'],
+}
+
+# 會隨 cookies、出口或時間改變的失敗：不負快取
+TRANSIENT_PATTERNS = [
+    r'confirm your age',
+    r'age.?restrict',
+    r'not a bot',
+    r'try again later',
+    r'sign in to confirm',
+]
+
+
+class NegativeCache:
+    """依影片 ID 保存永久性失敗的分類結果"""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 5000,
+                 ambiguous_ttl: float = 300):
+        """
+        Args:
+            ttls: 錯誤類別 -> 保存秒數（不在其中的類別不快取）
+            max_entries: 最多保存幾支影片
+            ambiguous_ttl: 類別相符但訊息沒有明確指出原因時的保存秒數（0 表示不快取）
+        """
+        self.ttls = dict(NEGATIVE_TTLS if ttls is None else ttls)
+        self.ambiguous_ttl = ambiguous_ttl
+        self.max_entries = max(1, max_entries)
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.stored = 0
+
+    @classmethod
+    def from_env(cls) -> "NegativeCache":
+        """從環境變數建立（YTIFY_NEGATIVE_TTL_PRIVATE / _UNAVAILABLE / _COPYRIGHT / _AMBIGUOUS / YTIFY_NEGATIVE_CACHE）"""
+        cache = cls(ttls={
+            "private_video": float(os.environ.get("YTIFY_NEGATIVE_TTL_PRIVATE", "3600")),
+            "unavailable": float(os.environ.get("YTIFY_NEGATIVE_TTL_UNAVAILABLE", "21600")),
+            "copyright": float(os.environ.get("YTIFY_NEGATIVE_TTL_COPYRIGHT", "86400")),
+        }, ambiguous_ttl=float(os.environ.get("YTIFY_NEGATIVE_TTL_AMBIGUOUS", "300")))
+        cache.enabled = os.environ.get("YTIFY_NEGATIVE_CACHE", "true").lower() == "true"
+        return cache
+
+    def classify(self, category: Optional[str], error: Optional[str]) -> tuple:
+        """
+        依原始錯誤訊息決定保存的類別與秒數
+
+        訊息明確指出原因時以該原因為準（如「Video unavailable … copyright grounds」算版權）；
+        類別相符但原因不明確的只保存 ambiguous_ttl
+
+        Returns:
+            (類別, 保存秒數)；秒數 0 表示不快取
+        """
+        error = error or ""
+        if any(re.search(p, error, re.IGNORECASE) for p in TRANSIENT_PATTERNS):
+            return category, 0
+        for clear, patterns in NEGATIVE_PATTERNS.items():
+            if any(re.search(p, error, re.IGNORECASE) for p in patterns):
+                return clear, max(0, self.ttls.get(clear) or 0)
+        ttl = self.ttls.get(category) or 0
+        return category, max(0, min(ttl, self.ambiguous_ttl))
+
+    def put(self, video_id: Optional[str], category: Optional[str], message: str,
+            error: Optional[str] = None):
+        """
+        保存失敗分類（只有永久性失敗的類別會保存；原因不明確的只保存很短的時間）
+
+        Args:
+            video_id: 影片 ID
+            category: 錯誤類別（ErrorCategory 的值）
+            message: 回應給客戶端的錯誤訊息
+            error: yt-dlp 的原始錯誤訊息（用來判斷原因是否明確）
+        """
+        if not self.enabled or not video_id:
+            return
+        category, ttl = self.classify(category, error)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(video_id, None)
+            self._entries[video_id] = {
+                "category": category,
+                "message": message,
+                "expires_at": time.time() + ttl,
+            }
+            self.stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"[負快取] {video_id}: {category}，{int(ttl)} 秒內不再擷取")
+
+    def get(self, video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        查詢失敗分類
+
+        Returns:
+            {"category", "message", "expires_at"}；沒有或已過期時回傳 None
+        """
+        if not self.enabled or not video_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[video_id]
+                return None
+            self.hits += 1
+            return dict(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得負快取狀態"""
+        now = time.time()
+        with self._lock:
+            categories: Dict[str, int] = {}
+            for entry in self._entries.values():
+                if entry["expires_at"] > now:
+                    categories[entry["category"]] = categories.get(entry["category"], 0) + 1
+            return {
+                "enabled": self.enabled,
+                "ttls": self.ttls,
+                "ambiguous_ttl": self.ambiguous_ttl,
+                "entries": sum(categories.values()),
+                "categories": categories,
+                "stored": self.stored,
+                "hits": self.hits,
+            }
+
+
+# 全域實例
+info_cache = InfoCache.from_env()
+negative_cache = NegativeCache.from_env()
@@ -406,6 +406,31 @@ class MonitorService:
         except Exception as e:
             print(f"[監控] 磁碟檢查失敗: {e}")
 
+        # 影片資訊快取：這段期間的命中率與省下的擷取時間
+        try:
+            from services.info_cache import info_cache
+            window = info_cache.take_window()
+            lookups = window["hits"] + window["misses"]
+            if lookups:
+                self.record_metric("info_cache_hit_rate", window["hits"] / lookups, "ratio")
+                self.record_metric("info_cache_miss_rate", window["misses"] / lookups, "ratio")
+            if window["saved"]:
+                self.record_metric("info_cache_saved_ms", window["saved"] * 1000, "ms")
+        except Exception as e:
+            print(f"[監控] 快取統計失敗: {e}")
+
+        # 成品快取：這段期間的命中率與免下載的傳輸量
+        try:
+            from services.artifact_cache import artifact_cache
+            window = artifact_cache.take_window()
+            lookups = window["hits"] + window["misses"]
+            if lookups:
+                self.record_metric("artifact_cache_hit_rate", window["hits"] / lookups, "ratio")
+            if window["bytes"]:
+                self.record_metric("artifact_cache_served", window["bytes"], "bytes")
+        except Exception as e:
+            print(f"[監控] 成品快取統計失敗: {e}")
+
         # 清理舊資料
         try:
             self.db.cleanup_old_data(days=30)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+下載子程序執行模式
+每個下載任務在獨立子程序跑 yt-dlp，進度與結果經由 pipe 回傳主程序，
+API 不必和 yt-dlp 搶 GIL；取消時可直接殺掉整個程序群組（含 ffmpeg）
+"""
+
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+import multiprocessing
+from typing import Callable, Dict, Any, Optional
+
+
+# 進度更新回傳的最短間隔（秒）；狀態改變時不受限
+PROGRESS_SEND_INTERVAL = 0.25
+
+# 只有這些欄位變化時才套用節流，其餘（status、error 等）立即回傳
+_THROTTLED_KEYS = {"progress", "speed", "eta", "downloaded_bytes", "total_bytes", "filename"}
+
+
+class _PipeSink:
+    """子程序端：把通知與控制器事件送回主程序"""
+
+    def __init__(self, conn, open_scopes: Optional[list] = None):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._open_scopes = set(open_scopes or [])
+
+    def send(self, *message):
+        with self._lock:
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                pass
+
+    # ProgressNotifier 介面
+    def notify(self, task_id: str, status: str, **kwargs):
+        self.send("notify", task_id, status, kwargs)
+
+    # AdaptiveConcurrency 介面（位元組由主程序從 task 更新自行統計）
+    def record_progress(self, task_id: str, downloaded_bytes: Optional[int]):
+        pass
+
+    def record_rate_limit(self):
+        self.send("rate_limit")
+
+    def forget_task(self, task_id: str):
+        pass
+
+    # RateLimitBreaker 介面（狀態由主程序維護，子程序只回報結果）
+    def is_available(self, scope: str) -> bool:
+        return scope not in self._open_scopes
+
+    def acquire(self, scope: str) -> float:
+        return 0.0
+
+    def record_failure(self, scope: str):
+        self._open_scopes.add(scope)
+        self.send("breaker", "record_failure", scope)
+
+    def record_success(self, scope: str):
+        self.send("breaker", "record_success", scope)
+
+    def release(self, scope: str):
+        self.send("breaker", "release", scope)
+
+
+class _PipedRetryPolicy:
+    """子程序端的重試策略：延遲沿用從資料庫載入的統計，結果與預算扣除回報主程序"""
+
+    def __init__(self, policy, sink: _PipeSink, budget: int):
+        self._policy = policy
+        self._sink = sink
+        self._budget = budget  # 主程序派發當下的全域預算剩餘
+
+    def next_delay(self, category: str, scope: str, attempt: int, default: float) -> float:
+        return self._policy.next_delay(category, scope, attempt, default)
+
+    def record_attempt(self):
+        self._sink.send("retry_policy", "record_attempt", ())
+
+    def record_outcome(self, category: str, scope: str, delay: float, success: bool):
+        self._sink.send("retry_policy", "record_outcome", (category, scope, delay, success))
+
+    def acquire_retry(self, retry_count: int, waited: float, delay: float) -> Optional[str]:
+        reason = self._policy.check_task_budget(retry_count, waited, delay)
+        if reason:
+            return reason
+        if self._budget <= 0:
+            return "整體重試過於頻繁，暫停重試"
+        self._budget -= 1
+        self._sink.send("retry_policy", "note_retry", ())
+        return None
+
+
+class _PipedTransferTuner:
+    """子程序端的連線數調校：沿用主程序的量測表挑選，實測結果回報主程序"""
+
+    def __init__(self, tuner, sink: _PipeSink):
+        self._tuner = tuner
+        self._sink = sink
+
+    def __getattr__(self, name):
+        return getattr(self._tuner, name)
+
+    def record(self, *args):
+        self._sink.send("transfer", "record", args)
+
+
+class _PipedInfoCache:
+    """子程序端的影片資訊快取：只帶著這個任務的快取項目，新擷取的結果交回主程序保存"""
+
+    def __init__(self, cache, sink: _PipeSink):
+        self._cache = cache
+        self._sink = sink
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def put(self, video_id: Optional[str], info: dict, egress: str):
+        if self._cache.enabled and video_id:
+            self._sink.send("info_cache", "import_entry", (video_id, self._cache.make_entry(info, egress)))
+
+    def invalidate(self, video_id: Optional[str]):
+        self._cache.invalidate(video_id)
+        self._sink.send("info_cache", "invalidate", (video_id,))
+
+
+class _PipedTask(dict):
+    """子程序端的任務 dict，欄位異動會同步回主程序"""
+
+    def __init__(self, data: dict, sink: _PipeSink):
+        super().__init__(data)
+        self._sink = sink
+        self._pending: Dict[str, Any] = {}
+        self._last_sent = 0.0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._forward({key: value})
+
+    def update(self, *args, **kwargs):
+        changes = dict(*args, **kwargs)
+        super().update(changes)
+        self._forward(changes)
+
+    def _forward(self, changes: dict):
+        self._pending.update(changes)
+        now = time.monotonic()
+        if set(changes) <= _THROTTLED_KEYS and now - self._last_sent < PROGRESS_SEND_INTERVAL:
+            return
+        self._sink.send("task", self._pending)
+        self._pending = {}
+        self._last_sent = now
+
+    def flush(self):
+        if self._pending:
+            self._sink.send("task", self._pending)
+            self._pending = {}
+
+
+def _worker_main(task_id: str, task: dict, settings: dict, conn):
+    """子程序進入點：在獨立程序群組中執行 Downloader._sync_execute_download"""
+    # 自成程序群組，取消時連同 ffmpeg 子程序一起終止
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    import services.downloader as downloader_module
+
+    sink = _PipeSink(conn, settings.get("open_scopes"))
+    downloader_module._ws_notifier = sink
+    downloader_module.concurrency_controller = sink
+    downloader_module.rate_limit_breaker = sink
+    downloader_module.transfer_tuner.import_state(settings.get("transfer_state"))
+    downloader_module.transfer_tuner = _PipedTransferTuner(downloader_module.transfer_tuner, sink)
+    video_id = downloader_module.extract_video_id(task["url"])
+    downloader_module.info_cache.import_entry(video_id, settings.get("info_entry"))
+    downloader_module.info_cache = _PipedInfoCache(downloader_module.info_cache, sink)
+
+    dl = downloader_module.downloader
+    dl.persistent_queue = False  # 佇列記錄由主程序維護
+    dl.proxy = settings.get("proxy")
+    dl.proxy_pool_api = settings.get("proxy_pool_api")
+    dl.bad_proxies = set(settings.get("bad_proxies", []))
+
+    from services.error_handler import retry_manager
+    from services.retry_policy import retry_policy
+    retry_manager.policy = _PipedRetryPolicy(retry_policy, sink, settings.get("retry_budget", 0))
+
+    # 延後重試回來的任務沿用上一個子程序的重試狀態
+    if settings.get("retry_state"):
+        retry_manager.import_task(task_id, settings["retry_state"])
+
+    piped = _PipedTask(task, sink)
+    dl.tasks[task_id] = piped
+
+    try:
+        result = dl._sync_execute_download(task_id)
+    except BaseException as e:
+        result = {"success": False, "error": str(e)}
+
+    piped.flush()
+    sink.send("result", result, {"bad_proxies": list(dl.bad_proxies)})
+    conn.close()
+
+
+class ProcessWorkerPool:
+    """子程序下載池（數量由呼叫端的下載執行緒池上限控制）"""
+
+    def __init__(self):
+        # spawn：避免在有執行緒與 event loop 的主程序 fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.killed_count = 0
+
+    def run(
+        self,
+        task_id: str,
+        task: dict,
+        settings: dict,
+        on_event: Callable[[tuple], None],
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        在子程序執行下載並持續接收事件（阻塞，應在執行緒池中呼叫）
+
+        Args:
+            task_id: 任務 ID
+            task: 任務資料快照
+            settings: 代理等下載設定
+            on_event: 收到進度、通知等事件時的回調
+            is_cancelled: 程序登記前就被取消時，用來補殺子程序
+
+        Returns:
+            下載結果
+        """
+        parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(task_id, task, settings, child_conn),
+            name=f"ytify-download-{task_id}",
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+
+        with self._lock:
+            self._processes[task_id] = proc
+        if is_cancelled and is_cancelled():
+            self._kill_tree(proc.pid)
+
+        result = None
+        try:
+            while True:
+                try:
+                    message = parent_conn.recv()
+                except (EOFError, OSError):
+                    break
+                if message[0] == "result":
+                    result = message[1]
+                    on_event(("state", message[2]))
+                    break
+                on_event(message)
+        finally:
+            parent_conn.close()
+            proc.join(timeout=5)
+            if proc.is_alive():
+                self._kill_tree(proc.pid)
+                proc.join(timeout=5)
+            with self._lock:
+                self._processes.pop(task_id, None)
+
+        if result is None:
+            return {
+                "success": False,
+                "error": f"下載程序異常結束（exit code {proc.exitcode}）",
+                "killed": True,
+            }
+        return result
+
+    def kill(self, task_id: str) -> bool:
+        """強制終止任務的子程序（含 ffmpeg）"""
+        with self._lock:
+            proc = self._processes.get(task_id)
+        if proc is None or not proc.is_alive():
+            return False
+
+        self._kill_tree(proc.pid)
+        self.killed_count += 1
+        print(f"[子程序] 已終止任務 {task_id} (pid {proc.pid})")
+        return True
+
+    @staticmethod
+    def _kill_tree(pid: int):
+        """終止整個程序樹"""
+        try:
+            if sys.platform == "win32":
+                subprocess.run(
+                    ["taskkill", "/F", "/T", "/PID", str(pid)],
+                    capture_output=True, timeout=10
+                )
+            else:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    # 子程序還沒來得及 setsid，只終止它本身
+                    os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, OSError, subprocess.SubprocessError) as e:
+            print(f"[子程序] 終止失敗 pid={pid}: {e}")
+
+    def is_running(self, task_id: str) -> bool:
+        """任務是否正在子程序中執行"""
+        with self._lock:
+            return task_id in self._processes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得子程序池狀態"""
+        with self._lock:
+            return {
+                "active_workers": len(self._processes),
+                "pids": {tid: proc.pid for tid, proc in self._processes.items()},
+                "killed_count": self.killed_count,
+            }
+
+
+# 全域實例
+process_pool = ProcessWorkerPool()
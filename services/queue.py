@@ -2,108 +2,937 @@
 """
 任務佇列系統
 限制同時執行的下載任務數量，超過的排隊等待
+
+排程採加權公平佇列：每個租戶（user_id > session_id > client_ip）各自一條 FIFO，
+依角色權重輪流取用執行名額，避免單一訪客的大播放清單卡住其他人
+
+排隊位置以序號計算（my_seq - head_seq 再扣掉前面已取消的數量），取出任務時不必改寫其他排隊項目；
+取消以墓碑標記移除（不搬動佇列，墓碑以序號計數 O(log n)），派發時直接略過，不會佔用執行名額
+
+任務依性質分到不同通道（interactive / clip / audio / bulk），各通道有保留名額與可借用上限，
+播放清單、批次等大量任務再多也不會卡住單支影片、音訊與片段
+
+名額被低優先通道佔滿時，可搶占（暫停）低優先通道超出保留名額的任務，讓出名額給高優先任務；
+被搶占的任務放回原租戶佇列最前面，之後從 .part 檔續傳
+
+任務回傳 {"retry_after": 秒數} 時進入延遲區並釋放名額，時間到再放回原租戶佇列最前面
+
+YTIFY_QUEUE_POLICY=sjf 時，租戶內改依預估成本（短片、音訊優先）排序，並以等待時間老化避免長片餓死；
+租戶之間仍是加權公平，客戶端回報的長度只影響自己的任務順序
 """
+import os
+import math
+import time
+import heapq
 import asyncio
 from collections import deque
-from typing import Callable, Any, Optional, Dict, Set
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Callable, Any, Optional, Dict, Set, List, Tuple
+from datetime import datetime, timedelta
+
+
+# 未登入訪客的排程權重（等同 GUEST）
+DEFAULT_TENANT_WEIGHT = 1
+
+# 各格式的估計位元率（bytes/秒），用於 SJF 成本估算
+FORMAT_BYTE_RATES = {
+    "audio": 16_000,      # ~128 kbps
+    "480p": 150_000,      # ~1.2 Mbps
+    "720p": 330_000,      # ~2.6 Mbps
+    "1080p": 650_000,     # ~5.2 Mbps
+    "best": 1_000_000,    # ~8 Mbps
+}
+
+# 長度未知時的預設時長（秒）
+DEFAULT_JOB_DURATION = 600
+
+# 老化速率：每等待 1 秒，成本折抵的位元組數（預設 2 MB/s，約 2 GB 的任務最多被插隊 17 分鐘）
+DEFAULT_SJF_AGING = 2_000_000
+
+# 通道設定（依優先順序排列）
+#   reserved: 有任務在排時優先滿足的名額數
+#   burst: 最多可用名額；0 = 全部，負數 = 全部扣掉這麼多個（留給其他通道）
+LANES = {
+    "interactive": {"reserved": 1, "burst": 0},   # 單支影片
+    "clip": {"reserved": 1, "burst": 2},          # 片段（download_ranges）
+    "audio": {"reserved": 1, "burst": 2},         # 純音訊
+    "bulk": {"reserved": 1, "burst": -1},         # 播放清單、批次
+}
+DEFAULT_LANE = "interactive"
+
+# 估算處理速度時取最近幾筆任務的執行時間
+SERVICE_TIME_SAMPLES = 50
+
+# 還沒有實測資料時，拒絕請求建議的重試秒數
+DEFAULT_RETRY_AFTER = 60
+
+
+def get_tenant_key(meta: Optional[dict]) -> str:
+    """
+    取得任務所屬租戶
+
+    優先級與歷史記錄隔離一致：user_id > session_id > client_ip
+    """
+    if not meta:
+        return "anonymous"
+    if meta.get("user_id") is not None:
+        return f"user:{meta['user_id']}"
+    if meta.get("session_id"):
+        return f"session:{meta['session_id']}"
+    if meta.get("client_ip"):
+        return f"ip:{meta['client_ip']}"
+    return "anonymous"
+
+
+def get_tenant_weight(meta: Optional[dict]) -> int:
+    """依 UserRole 取得排程權重"""
+    role = (meta or {}).get("user_role")
+    if not role:
+        return DEFAULT_TENANT_WEIGHT
+
+    from services.auth import UserRole, ROLE_WEIGHTS
+    try:
+        return ROLE_WEIGHTS.get(UserRole(role), DEFAULT_TENANT_WEIGHT)
+    except ValueError:
+        return DEFAULT_TENANT_WEIGHT
+
+
+def classify_lane(meta: Optional[dict]) -> str:
+    """依任務參數自動分通道（播放清單、批次 > 片段 > 音訊 > 單支影片）"""
+    meta = meta or {}
+    if meta.get("lane") in LANES:
+        return meta["lane"]
+    if meta.get("playlist_id") or meta.get("batch_id"):
+        return "bulk"
+    if meta.get("clip_start") is not None and meta.get("clip_end") is not None:
+        return "clip"
+    if meta.get("audio_only"):
+        return "audio"
+    return DEFAULT_LANE
+
+
+def estimate_job_cost(meta: Optional[dict]) -> float:
+    """
+    預估任務成本（位元組）
+
+    優先使用已知檔案大小，否則以時長（片段取區間長度）乘上格式位元率估算
+    """
+    meta = meta or {}
+    if meta.get("filesize"):
+        return float(meta["filesize"])
+
+    if meta.get("clip_start") is not None and meta.get("clip_end") is not None:
+        duration = meta["clip_end"] - meta["clip_start"]
+    else:
+        duration = meta.get("duration") or DEFAULT_JOB_DURATION
+
+    if meta.get("audio_only"):
+        rate = FORMAT_BYTE_RATES["audio"]
+    else:
+        rate = FORMAT_BYTE_RATES.get(meta.get("format"), FORMAT_BYTE_RATES["best"])
+    return float(duration) * rate
+
+
+class SeqCounter:
+    """
+    以序號為索引的計數（Fenwick tree）
+
+    墓碑的加入、移除與「序號小於 seq 的墓碑數」都是 O(log n)，
+    大量取消（播放清單整批取消）不會變成平方成本。
+    索引範圍隨序號擴張（搶占、重試放回最前面時序號會往負數走），清空時整個重置
+    """
+
+    def __init__(self):
+        self._base = 0      # 索引 1 對應的序號
+        self._tree = [0]    # 1-based
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.total
+
+    def _resize(self, seq: int):
+        """擴張索引範圍以包含 seq（至少兩倍，攤銷 O(1)）"""
+        size = len(self._tree) - 1
+        # Fenwick tree 還原成逐點計數（O(n)）
+        counts = self._tree[:]
+        for i in range(size, 0, -1):
+            j = i + (i & -i)
+            if j <= size:
+                counts[j] -= counts[i]
+        low = min(self._base, seq)
+        high = max(self._base + size, seq + 1)
+        new_size = max(64, 2 * (high - low))
+        if seq < self._base:
+            low = high - new_size
+        tree = [0] * (new_size + 1)
+        offset = self._base - low
+        tree[offset + 1:offset + size + 1] = counts[1:]
+        for i in range(1, new_size + 1):
+            j = i + (i & -i)
+            if j <= new_size:
+                tree[j] += tree[i]
+        self._base = low
+        self._tree = tree
+
+    def add(self, seq: int, delta: int = 1):
+        if self.total == 0:
+            # 沒有墓碑：從這個序號重新起算，範圍不隨租戶歷史無限成長
+            self._base = seq
+            self._tree = [0] * 65
+        size = len(self._tree) - 1
+        if not self._base <= seq < self._base + size:
+            self._resize(seq)
+            size = len(self._tree) - 1
+        tree = self._tree
+        i = seq - self._base + 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+        self.total += delta
+
+    def count_below(self, seq: int) -> int:
+        """序號小於 seq 的數量"""
+        if self.total == 0 or seq <= self._base:
+            return 0
+        tree = self._tree
+        i = min(seq - self._base, len(tree) - 1)
+        count = 0
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+
+@dataclass
+class QueueEntry:
+    """佇列中的單一任務"""
+    task_id: str
+    coro_func: Callable
+    args: tuple
+    kwargs: dict
+    tenant: str
+    lane: str = DEFAULT_LANE
+    seq: int = 0  # 在租戶佇列中的序號
+    group: Optional[str] = None  # 所屬播放清單，用於批次取消
+    cancelled: bool = False
+    cost: float = 0.0      # 預估成本（位元組）
+    priority: float = 0.0  # SJF 排序鍵（越小越先）
+
+    def __lt__(self, other: "QueueEntry") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+@dataclass
+class TenantState:
+    """租戶排程狀態"""
+    key: str
+    weight: int = DEFAULT_TENANT_WEIGHT
+    queue: deque = field(default_factory=deque)
+    running: int = 0
+    vtime: float = 0.0  # 虛擬時間：每取用一次前進 1/weight，最小者優先
+    next_seq: int = 0   # 下一個入列任務的序號
+    head_seq: int = 0   # 佇列最前面任務的序號
+    tombstones: SeqCounter = field(default_factory=SeqCounter)  # 已取消但仍留在佇列中的序號
+    ordered: bool = False  # SJF：queue 為依 priority 排序的 heap
+
+    @property
+    def pending(self) -> int:
+        """實際待執行的數量（扣除墓碑）"""
+        return len(self.queue) - len(self.tombstones)
+
+    def push(self, entry: QueueEntry):
+        if self.ordered:
+            heapq.heappush(self.queue, entry)
+        else:
+            self.queue.append(entry)
+
+    def pop(self) -> QueueEntry:
+        """取出下一個未取消的任務（順便清掉墓碑）"""
+        while True:
+            entry = heapq.heappop(self.queue) if self.ordered else self.queue.popleft()
+            if not entry.cancelled:
+                return entry
+            self.tombstones.add(entry.seq, -1)
+
+
+@dataclass
+class Lane:
+    """通道：各自一組租戶佇列與虛擬時鐘"""
+    name: str
+    reserved: int = 0
+    burst: int = 0
+    tenants: Dict[str, TenantState] = field(default_factory=dict)
+    running: int = 0
+    queued: int = 0
+    vclock: float = 0.0  # 最近一次取用的虛擬時間，新進租戶從這裡起算
 
 
 class TaskQueue:
     """下載任務佇列"""
 
-    def __init__(self, max_concurrent: int = 3):
+    def __init__(
+        self,
+        max_concurrent: int = 3,
+        max_per_tenant: int = 2,
+        policy: str = "fifo",
+        sjf_aging: float = DEFAULT_SJF_AGING,
+        max_backlog: int = 0,
+        max_wait: float = 0,
+        lanes: Optional[Dict[str, dict]] = None,
+        preemption: bool = True
+    ):
         """
         Args:
             max_concurrent: 最大同時執行數量
+            max_per_tenant: 單一租戶最多同時執行數量
+            policy: 租戶內排序方式，fifo 或 sjf（預估成本最小者優先）
+            sjf_aging: SJF 老化速率（每等待 1 秒折抵的位元組數）
+            max_backlog: 排隊上限，超過就拒絕新任務（0 = 不限）
+            max_wait: 預估等待秒數上限，超過就拒絕新任務（0 = 不限）
+            lanes: 通道設定（預設 LANES）
+            preemption: 是否允許高優先通道搶占低優先通道的執行名額
         """
         self.max_concurrent = max_concurrent
+        self.max_per_tenant = max_per_tenant
+        self.policy = policy if policy in ("fifo", "sjf") else "fifo"
+        self.sjf_aging = sjf_aging
+        self.max_backlog = max_backlog
+        self.max_wait = max_wait
+        self.rejected_count = 0
+        self._service_times: deque = deque(maxlen=SERVICE_TIME_SAMPLES)
         self.running_count = 0
         self.running_task_ids: Set[str] = set()  # 追蹤正在執行的任務 ID
-        self.queue: deque = deque()
+        self.lanes: Dict[str, Lane] = {
+            name: Lane(name, reserved=cfg["reserved"], burst=cfg["burst"])
+            for name, cfg in (lanes or LANES).items()
+        }
+        self._tenant_running: Dict[str, int] = {}  # 租戶跨通道的執行中數量
         self.lock = asyncio.Lock()
         self.queue_info: Dict[str, dict] = {}  # task_id -> queue info
+        self._entries: Dict[str, QueueEntry] = {}  # 排隊中的任務索引
+        self._groups: Dict[str, Set[str]] = {}      # playlist_id -> 排隊中的任務 ID
+        self.cancelled_count = 0
+        self._queued_count = 0
+        # 搶占：preempt_handler(task_id) 要求任務暫停，任務協程回傳 {"paused": True} 後放回佇列
+        self.preemption = preemption
+        self.preempt_handler: Optional[Callable[[str], bool]] = None
+        self.preempted_count = 0
+        self._running_entries: Dict[str, Tuple[QueueEntry, float]] = {}  # task_id -> (任務, 開始時間)
+        self._preempting: Dict[str, str] = {}  # 被搶占的 task_id -> 受益通道
+        self._delayed: Dict[str, Tuple[QueueEntry, float]] = {}  # 延後重試：task_id -> (任務, 到期時間)
+        self.deferred_count = 0
+        # 派發閘門：dispatch_gate() 回傳非 0 秒數時暫停派發（例如頻率限制斷路器斷開），到時再試
+        self.dispatch_gate: Optional[Callable[[], float]] = None
+        self._gate_wakeup: Optional[asyncio.TimerHandle] = None
+        self._gated_until: Optional[float] = None
 
     @property
     def queue_length(self) -> int:
-        return len(self.queue)
+        return self._queued_count
 
     @property
     def running(self) -> int:
         return self.running_count
 
-    async def submit(self, task_id: str, coro_func: Callable, *args, **kwargs) -> None:
-        """提交任務到佇列"""
+    @property
+    def slots_in_use(self) -> int:
+        """
+        併發控制用的佔用名額：通道已達上限但還有排隊時視為滿載
+        （例如 bulk 留給其他通道的空位不算閒置）
+        """
+        for lane in self.lanes.values():
+            if lane.queued and lane.running >= self._lane_cap(lane):
+                return max(self.running_count, self.max_concurrent)
+        return self.running_count
+
+    async def set_max_concurrent(self, max_concurrent: int) -> None:
+        """調整最大同時執行數量（調降時執行中的任務不受影響，只是不再派發）"""
         async with self.lock:
-            position = self.queue_length + 1
-            self.queue_info[task_id] = {
-                "task_id": task_id,
-                "status": "queued",
-                "queue_position": position,
-                "submitted_at": datetime.now().isoformat(),
-            }
-            self.queue.append((task_id, coro_func, args, kwargs))
+            self.max_concurrent = max(1, max_concurrent)
+        await self._try_process()
 
-        asyncio.create_task(self._try_process())
+    async def submit(
+        self,
+        task_id: str,
+        coro_func: Callable,
+        *args,
+        meta: Optional[dict] = None,
+        **kwargs
+    ) -> None:
+        """
+        提交任務到佇列
 
-    async def _try_process(self) -> None:
-        """嘗試從佇列取出任務執行"""
-        task_id = None
-        coro_func = None
-        args = None
-        kwargs = None
+        Args:
+            task_id: 任務 ID
+            coro_func: 要執行的協程函式
+            meta: 任務資料（取 user_id / session_id / client_ip / user_role 決定租戶與權重）
+        """
+        async with self.lock:
+            self._enqueue(task_id, coro_func, args, kwargs, meta)
+
+        await self._try_process()
 
+    async def submit_many(self, jobs: List[Tuple[str, Callable, tuple, Optional[dict]]]) -> None:
+        """
+        批次提交任務（整批只取一次 lock、只派發一次）
+
+        Args:
+            jobs: (task_id, coro_func, args, meta) 列表，依序入列
+        """
+        if not jobs:
+            return
         async with self.lock:
-            # 檢查是否可以執行更多任務
-            if self.running_count >= self.max_concurrent or not self.queue:
-                return
+            submitted_at = datetime.now().isoformat()
+            for task_id, coro_func, args, meta in jobs:
+                self._enqueue(task_id, coro_func, args, {}, meta, submitted_at)
 
-            # 取出任務
-            task_id, coro_func, args, kwargs = self.queue.popleft()
-            self.running_count += 1
-            self.running_task_ids.add(task_id)
+        await self._try_process()
 
-            # 更新狀態為執行中
-            if task_id in self.queue_info:
-                self.queue_info[task_id]["status"] = "running"
-                self.queue_info[task_id]["started_at"] = datetime.now().isoformat()
+    def _enqueue(
+        self,
+        task_id: str,
+        coro_func: Callable,
+        args: tuple,
+        kwargs: dict,
+        meta: Optional[dict],
+        submitted_at: Optional[str] = None
+    ) -> QueueEntry:
+        """放入所屬通道的租戶佇列（呼叫端需持有 lock）"""
+        lane = self._get_lane(meta)
+        tenant = self._get_tenant(lane, meta)
+        group = (meta or {}).get("playlist_id")
+        entry = QueueEntry(task_id, coro_func, args, kwargs, tenant.key,
+                           lane=lane.name, seq=tenant.next_seq, group=group)
+        if tenant.ordered:
+            # 成本 - 老化速率 × 等待時間；等待時間對所有人同步增加，
+            # 因此可以化成入列時就固定的鍵：成本 + 老化速率 × 入列時刻
+            entry.cost = estimate_job_cost(meta)
+            entry.priority = entry.cost + self.sjf_aging * time.monotonic()
+        tenant.next_seq += 1
+        tenant.push(entry)
+        self._entries[task_id] = entry
+        if group:
+            self._groups.setdefault(group, set()).add(task_id)
+        lane.queued += 1
+        self._queued_count += 1
+        self.queue_info[task_id] = {
+            "task_id": task_id,
+            "status": "queued",
+            "tenant": tenant.key,
+            "lane": lane.name,
+            "submitted_at": submitted_at or datetime.now().isoformat(),
+        }
+        return entry
+
+    def _get_lane(self, meta: Optional[dict]) -> Lane:
+        """取得任務所屬通道（設定裡沒有的通道歸到第一個）"""
+        lane = self.lanes.get(classify_lane(meta))
+        return lane if lane is not None else next(iter(self.lanes.values()))
+
+    def _get_tenant(self, lane: Lane, meta: Optional[dict]) -> TenantState:
+        """取得（或建立）通道內的租戶狀態，閒置後回來的租戶不累積額度"""
+        key = get_tenant_key(meta)
+        tenant = lane.tenants.get(key)
+        if tenant is None:
+            ordered = self.policy == "sjf"
+            tenant = TenantState(key=key, queue=[] if ordered else deque(), ordered=ordered)
+            lane.tenants[key] = tenant
+        tenant.weight = get_tenant_weight(meta)
+        if not tenant.pending and not tenant.running:
+            tenant.vtime = max(tenant.vtime, lane.vclock)
+        return tenant
+
+    def _lane_cap(self, lane: Lane) -> int:
+        """通道目前最多可用的名額（跟著 max_concurrent 變動）"""
+        if lane.burst > 0:
+            cap = min(lane.burst, self.max_concurrent)
+        else:
+            cap = self.max_concurrent + lane.burst
+        return max(cap, min(lane.reserved, self.max_concurrent), 1)
 
-            self._update_queue_positions()
+    def _pick_tenant(self, lane: Lane) -> Optional[TenantState]:
+        """挑出通道內虛擬時間最小、且未達個人上限的租戶"""
+        best = None
+        for tenant in lane.tenants.values():
+            if not tenant.pending or self._tenant_running.get(tenant.key, 0) >= self.max_per_tenant:
+                continue
+            if best is None or tenant.vtime < best.vtime:
+                best = tenant
+        return best
+
+    def _pick(self) -> Optional[Tuple[Lane, TenantState]]:
+        """
+        挑出下一個要派發的通道與租戶
+
+        先依優先順序補足各通道的保留名額，再讓未達上限的通道依序借用剩餘名額
+        """
+        for reserved_only in (True, False):
+            for lane in self.lanes.values():
+                if not lane.queued:
+                    continue
+                limit = lane.reserved if reserved_only else self._lane_cap(lane)
+                if lane.running >= limit:
+                    continue
+                tenant = self._pick_tenant(lane)
+                if tenant is not None:
+                    return lane, tenant
+        return None
 
-        # 在 lock 外執行任務
+    async def _try_process(self) -> None:
+        """嘗試從佇列取出任務執行（有空位就持續派發）"""
+        async with self.lock:
+            while self.running_count < self.max_concurrent:
+                picked = self._pick()
+                if picked is None:
+                    break
+                if self._gated():
+                    break
+                lane, tenant = picked
+
+                # 取出任務（先丟掉最前面的墓碑）
+                entry = tenant.pop()
+                tenant.head_seq = entry.seq + 1
+                self._remove_index(entry)
+                lane.queued -= 1
+                self._queued_count -= 1
+                lane.vclock = tenant.vtime
+                tenant.vtime += 1 / tenant.weight
+                tenant.running += 1
+                lane.running += 1
+                self._tenant_running[tenant.key] = self._tenant_running.get(tenant.key, 0) + 1
+                self.running_count += 1
+                self.running_task_ids.add(entry.task_id)
+
+                # 更新狀態為執行中
+                if entry.task_id in self.queue_info:
+                    self.queue_info[entry.task_id]["status"] = "running"
+                    self.queue_info[entry.task_id]["started_at"] = datetime.now().isoformat()
+
+                # 在 lock 外執行任務
+                self._running_entries[entry.task_id] = (entry, time.monotonic())
+                asyncio.create_task(self._run(entry))
+
+            # 閘門關閉時派發不出去，搶占也沒有意義
+            if self._gated_until is None:
+                self._maybe_preempt()
+
+    def _gated(self) -> bool:
+        """詢問派發閘門；關閉時排定到期後重新派發（呼叫端需持有 lock）"""
+        wait = self.dispatch_gate() if self.dispatch_gate else 0
+        if not wait:
+            self._gated_until = None
+            return False
+        self._gated_until = time.monotonic() + wait
+        if self._gate_wakeup is None:
+            self._gate_wakeup = asyncio.get_running_loop().call_later(wait, self._on_gate_wakeup)
+            print(f"[佇列] 派發暫停 {math.ceil(wait)} 秒")
+        return True
+
+    def _on_gate_wakeup(self):
+        self._gate_wakeup = None
+        asyncio.create_task(self._try_process())
+
+    def _preempt_target(self, lane: Lane) -> bool:
+        """通道是否還需要搶占名額（有可派發的任務、且含進行中的搶占仍未達上限）"""
+        inflight = sum(1 for name in self._preempting.values() if name == lane.name)
+        if inflight >= lane.queued:
+            return False
+        if lane.running + inflight >= self._lane_cap(lane):
+            return False
+        return self._pick_tenant(lane) is not None
+
+    def _victim_candidates(self, lane: Lane) -> List[str]:
+        """優先順序較低、且超出保留名額的通道中，可搶占的任務（最低優先通道、最晚開始的在前）"""
+        names = list(self.lanes)
+        for name in reversed(names[names.index(lane.name) + 1:]):
+            running = sorted(
+                ((started, task_id) for task_id, (entry, started) in self._running_entries.items()
+                 if entry.lane == name and task_id not in self._preempting),
+                reverse=True
+            )
+            if len(running) > self.lanes[name].reserved:
+                return [task_id for _, task_id in running]
+        return []
+
+    def _maybe_preempt(self):
+        """名額已滿時，讓高優先通道搶占低優先通道的名額（呼叫端需持有 lock）"""
+        if not self.preemption or self.preempt_handler is None:
+            return
+        if self.running_count < self.max_concurrent:
+            return
+        for lane in self.lanes.values():
+            while lane.queued and self._preempt_target(lane):
+                victim = None
+                for task_id in self._victim_candidates(lane):
+                    try:
+                        if self.preempt_handler(task_id):
+                            victim = task_id
+                            break
+                    except Exception as e:
+                        print(f"[佇列] 搶占失敗: {task_id} - {e}")
+                if victim is None:
+                    break
+                self._preempting[victim] = lane.name
+                self.preempted_count += 1
+                print(f"[佇列] 搶占 {victim}，名額讓給 {lane.name} 通道")
+
+    def _requeue_front(self, entry: QueueEntry, refund: bool = True, reason: str = "preempted"):
+        """
+        任務放回原租戶佇列最前面（呼叫端需持有 lock）
+
+        Args:
+            refund: 是否退還上次取用的虛擬時間（搶占退還；重試算新的一次嘗試，不退）
+            reason: 記在 queue_info 的原因（preempted / retry）
+        """
+        lane = self.lanes[entry.lane]
+        tenant = lane.tenants.get(entry.tenant)
+        if tenant is None:
+            ordered = self.policy == "sjf"
+            tenant = TenantState(key=entry.tenant, queue=[] if ordered else deque(), ordered=ordered)
+            tenant.vtime = lane.vclock
+            lane.tenants[entry.tenant] = tenant
+        if tenant.ordered:
+            heapq.heappush(tenant.queue, entry)
+        else:
+            tenant.head_seq -= 1
+            entry.seq = tenant.head_seq
+            tenant.queue.appendleft(entry)
+        # 退還這次取用的虛擬時間，續傳時不重複計費
+        if refund:
+            tenant.vtime -= 1 / tenant.weight
+
+        self._entries[entry.task_id] = entry
+        if entry.group:
+            self._groups.setdefault(entry.group, set()).add(entry.task_id)
+        lane.queued += 1
+        self._queued_count += 1
+        self.queue_info[entry.task_id] = {
+            "task_id": entry.task_id,
+            "status": "queued",
+            "tenant": entry.tenant,
+            "lane": entry.lane,
+            reason: True,
+            "submitted_at": datetime.now().isoformat(),
+        }
+
+    def _defer(self, entry: QueueEntry, delay: float):
+        """放進延遲區，時間到再回到佇列（呼叫端需持有 lock）"""
+        self._delayed[entry.task_id] = (entry, time.monotonic() + delay)
+        self.deferred_count += 1
+        self.queue_info[entry.task_id] = {
+            "task_id": entry.task_id,
+            "status": "delayed",
+            "tenant": entry.tenant,
+            "lane": entry.lane,
+            "retry_at": (datetime.now() + timedelta(seconds=delay)).isoformat(),
+        }
+        asyncio.get_running_loop().call_later(
+            delay, lambda: asyncio.create_task(self._release_delayed(entry.task_id))
+        )
+
+    async def _release_delayed(self, task_id: str) -> None:
+        """延遲到期：放回佇列並嘗試派發"""
+        async with self.lock:
+            item = self._delayed.pop(task_id, None)
+            if item is None:
+                return  # 等待期間已取消
+            self._requeue_front(item[0], refund=False, reason="retry")
+        await self._try_process()
+
+    async def _run(self, entry: QueueEntry) -> None:
+        """執行單一任務，結束後釋放名額"""
+        started = time.monotonic()
+        result = None
         try:
-            await coro_func(*args, **kwargs)
+            result = await entry.coro_func(*entry.args, **entry.kwargs)
         except Exception as e:
-            print(f"[佇列] 任務錯誤: {task_id} - {e}")
+            print(f"[佇列] 任務錯誤: {entry.task_id} - {e}")
         finally:
             async with self.lock:
                 self.running_count -= 1
-                self.running_task_ids.discard(task_id)
-                if task_id in self.queue_info:
-                    del self.queue_info[task_id]
+                self.running_task_ids.discard(entry.task_id)
+                self._running_entries.pop(entry.task_id, None)
+                self.queue_info.pop(entry.task_id, None)
+                lane = self.lanes[entry.lane]
+                lane.running -= 1
+                self._release_tenant_slot(entry.tenant)
+                tenant = lane.tenants.get(entry.tenant)
+                if tenant:
+                    tenant.running -= 1
+
+                preempted = self._preempting.pop(entry.task_id, None)
+                retry_after = result.get("retry_after") if isinstance(result, dict) else None
+                if preempted and isinstance(result, dict) and result.get("paused"):
+                    self._requeue_front(entry)
+                elif retry_after:
+                    self._defer(entry, retry_after)
+                else:
+                    self._service_times.append(time.monotonic() - started)
+
+                tenant = lane.tenants.get(entry.tenant)
+                if tenant and not tenant.pending and not tenant.running:
+                    del lane.tenants[entry.tenant]
 
             # 嘗試執行下一個任務
-            asyncio.create_task(self._try_process())
+            await self._try_process()
 
-    def _update_queue_positions(self):
-        """更新所有排隊中任務的位置"""
-        for i, (tid, _, _, _) in enumerate(self.queue):
-            if tid in self.queue_info:
-                self.queue_info[tid]["queue_position"] = i + 1
+    def _release_tenant_slot(self, key: str):
+        """租戶跨通道的執行中數量 -1"""
+        remaining = self._tenant_running.get(key, 0) - 1
+        if remaining > 0:
+            self._tenant_running[key] = remaining
+        else:
+            self._tenant_running.pop(key, None)
 
-    def get_queue_info(self, task_id: str) -> Optional[dict]:
-        """取得任務的佇列資訊"""
-        return self.queue_info.get(task_id)
+    def _remove_index(self, entry: QueueEntry):
+        """從排隊索引移除"""
+        self._entries.pop(entry.task_id, None)
+        if entry.group:
+            members = self._groups.get(entry.group)
+            if members is not None:
+                members.discard(entry.task_id)
+                if not members:
+                    del self._groups[entry.group]
+
+    def _cancel_entry(self, entry: QueueEntry):
+        """以墓碑標記取消排隊中的任務（O(log n)，不搬動佇列）"""
+        entry.cancelled = True
+        self._remove_index(entry)
+        lane = self.lanes[entry.lane]
+        lane.queued -= 1
+        self._queued_count -= 1
+        self.cancelled_count += 1
+        self.queue_info.pop(entry.task_id, None)
+
+        tenant = lane.tenants.get(entry.tenant)
+        if tenant is None:
+            return
+        tenant.tombstones.add(entry.seq)
+        if not tenant.pending and not tenant.running:
+            del lane.tenants[entry.tenant]
+
+    async def remove(self, task_id: str) -> bool:
+        """從佇列移出排隊中或在延遲區等待重試的任務（例如暫停），不計入取消統計"""
+        async with self.lock:
+            if self._delayed.pop(task_id, None) is not None:
+                self.queue_info.pop(task_id, None)
+                return True
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return False
+            self._cancel_entry(entry)
+            self.cancelled_count -= 1
+            return True
+
+    async def cancel(self, task_id: str) -> bool:
+        """
+        從佇列移除排隊中的任務
+
+        Returns:
+            是否有移除（已在執行或不在佇列時回傳 False）
+        """
+        async with self.lock:
+            if self._delayed.pop(task_id, None) is not None:
+                self._drop_delayed(task_id)
+                return True
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return False
+            self._cancel_entry(entry)
+            return True
+
+    def _drop_delayed(self, task_id: str):
+        """移除延遲區任務後的收尾（呼叫端需持有 lock、已從 _delayed 取出）"""
+        self.cancelled_count += 1
+        self.queue_info.pop(task_id, None)
+
+    async def cancel_group(self, group: str) -> list:
+        """
+        批次移除同一播放清單中所有排隊的任務
+
+        Returns:
+            被移除的任務 ID 列表
+        """
+        async with self.lock:
+            task_ids = list(self._groups.get(group, ()))
+            for task_id in task_ids:
+                self._cancel_entry(self._entries[task_id])
+            for task_id, (entry, _) in list(self._delayed.items()):
+                if entry.group == group:
+                    del self._delayed[task_id]
+                    self._drop_delayed(task_id)
+                    task_ids.append(task_id)
+            return task_ids
+
+    def get_queue_position(self, task_id: str) -> int:
+        """取得排隊位置（在所屬通道、租戶佇列中的第幾位，FIFO 為 O(1)）；不在排隊中回傳 0"""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return 0
+        tenant = self.lanes[entry.lane].tenants.get(entry.tenant)
+        if tenant is None:
+            return 0
+        if tenant.ordered:
+            # SJF 沒有固定的先後序號，只能數排在前面的（與租戶佇列長度成正比）
+            return 1 + sum(1 for e in tenant.queue if not e.cancelled and e < entry)
+        ahead_cancelled = tenant.tombstones.count_below(entry.seq)
+        return entry.seq - tenant.head_seq + 1 - ahead_cancelled
+
+    def _slot_rate(self) -> Optional[float]:
+        """單一執行名額每秒完成的任務數（依最近任務的平均執行時間）；沒有資料時回傳 None"""
+        if not self._service_times:
+            return None
+        mean = sum(self._service_times) / len(self._service_times)
+        return 1 / max(mean, 1e-3)
+
+    def _estimate_wait(self, lane: Lane, tenant_key: str, weight: int, position: int) -> Optional[float]:
+        """
+        預估通道內租戶佇列第 position 位的任務還要等多久才開始（秒）
+
+        加權公平下，同通道其他租戶在這段時間大約會被派發 position × 權重比 個任務
+        """
+        slot_rate = self._slot_rate()
+        if slot_rate is None:
+            return None
+
+        ahead = position - 1
+        active = 1
+        for key, tenant in lane.tenants.items():
+            if key == tenant_key:
+                continue
+            if tenant.pending or tenant.running:
+                active += 1
+            ahead += min(tenant.pending, math.ceil(position * tenant.weight / weight))
+
+        # 空位還夠就不必等
+        slots = min(self._lane_cap(lane), self.max_per_tenant * active)
+        free = min(slots - lane.running, self.max_concurrent - self.running_count)
+        if ahead < free and self._tenant_running.get(tenant_key, 0) < self.max_per_tenant:
+            return 0.0
+        return (ahead + 1) / (slots * slot_rate)
+
+    def estimate_start(self, task_id: str) -> Optional[float]:
+        """預估排隊中的任務還要幾秒開始；無法估算或不在排隊中回傳 None"""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        lane = self.lanes[entry.lane]
+        tenant = lane.tenants.get(entry.tenant)
+        if tenant is None:
+            return None
+        return self._estimate_wait(lane, tenant.key, tenant.weight, self.get_queue_position(task_id))
+
+    def check_admission(self, meta: Optional[dict] = None, count: int = 1) -> Optional[dict]:
+        """
+        有界佇列模式下檢查是否接受新任務
 
-    def get_stats(self) -> dict:
-        """取得佇列統計"""
+        Args:
+            meta: 任務資料（決定租戶，用於估算等待時間）
+            count: 這次要加入的任務數
+
+        Returns:
+            接受回傳 None；拒絕回傳 {"reason", "retry_after", "estimated_wait"}
+        """
+        if not self.max_backlog and not self.max_wait:
+            return None
+
+        slot_rate = self._slot_rate()
+        drain_rate = slot_rate * self.max_concurrent if slot_rate else None
+
+        lane = self._get_lane(meta)
+        key = get_tenant_key(meta)
+        tenant = lane.tenants.get(key)
+        weight = get_tenant_weight(meta)
+        position = (tenant.pending if tenant else 0) + count
+        estimated_wait = self._estimate_wait(lane, key, weight, position)
+
+        reason = None
+        retry_after = None
+        if self.max_backlog and self.queue_length + count > self.max_backlog:
+            reason = f"佇列已滿（{self.queue_length}/{self.max_backlog}）"
+            if drain_rate:
+                retry_after = (self.queue_length + count - self.max_backlog) / drain_rate
+        elif self.max_wait and estimated_wait is not None and estimated_wait > self.max_wait:
+            reason = f"預估等待 {int(estimated_wait)} 秒，超過上限 {int(self.max_wait)} 秒"
+            retry_after = estimated_wait - self.max_wait
+
+        if reason is None:
+            return None
+
+        self.rejected_count += 1
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
         return {
+            "reason": reason,
+            "retry_after": min(max(1, math.ceil(retry_after)), 3600),
+            "estimated_wait": math.ceil(estimated_wait) if estimated_wait is not None else None,
+        }
+
+    def get_queue_info(self, task_id: str) -> Optional[dict]:
+        """取得任務的佇列資訊（含預估開始時間）"""
+        info = self.queue_info.get(task_id)
+        if info is None:
+            return None
+        result = {**info, "queue_position": self.get_queue_position(task_id)}
+        if info.get("status") == "queued":
+            wait = self.estimate_start(task_id)
+            result["estimated_wait"] = math.ceil(wait) if wait is not None else None
+            result["predicted_start_at"] = (
+                (datetime.now() + timedelta(seconds=wait)).isoformat() if wait is not None else None
+            )
+        return result
+
+    def get_stats(self, detail: bool = False) -> dict:
+        """
+        取得佇列統計
+
+        Args:
+            detail: 是否附上完整的任務 ID 清單（僅供診斷，成本與佇列長度成正比）
+        """
+        stats = {
             "running": self.running_count,
-            "running_task_ids": list(self.running_task_ids),
             "queued": self.queue_length,
-            "queued_task_ids": [tid for tid, _, _, _ in self.queue],
             "max_concurrent": self.max_concurrent,
+            "max_per_tenant": self.max_per_tenant,
+            "policy": self.policy,
+            "cancelled": self.cancelled_count,
+            "max_backlog": self.max_backlog,
+            "max_wait": self.max_wait,
+            "rejected": self.rejected_count,
+            "preemption": self.preemption and self.preempt_handler is not None,
+            "preempted": self.preempted_count,
+            "delayed": len(self._delayed),
+            "deferred": self.deferred_count,
+            "dispatch_paused_for": (
+                math.ceil(max(0.0, self._gated_until - time.monotonic()))
+                if self._gated_until is not None else 0
+            ),
+            "avg_service_time": (
+                round(sum(self._service_times) / len(self._service_times), 1)
+                if self._service_times else None
+            ),
+            "lanes": {
+                lane.name: {
+                    "reserved": lane.reserved,
+                    "max": self._lane_cap(lane),
+                    "running": lane.running,
+                    "queued": lane.queued,
+                }
+                for lane in self.lanes.values()
+            },
+            "tenants": {},
         }
+        for lane in self.lanes.values():
+            for key, tenant in lane.tenants.items():
+                summary = stats["tenants"].setdefault(
+                    key, {"weight": tenant.weight, "running": 0, "queued": 0}
+                )
+                summary["running"] += tenant.running
+                summary["queued"] += tenant.pending
+        if detail:
+            stats["running_task_ids"] = list(self.running_task_ids)
+            stats["queued_task_ids"] = list(self._entries)
+        return stats
 
     def is_task_queued(self, task_id: str) -> bool:
         """檢查任務是否在佇列中"""
@@ -111,5 +940,13 @@ class TaskQueue:
         return info is not None and info.get("status") == "queued"
 
 
-# 全域佇列實例（最多同時 3 個下載）
-download_queue = TaskQueue(max_concurrent=3)
+# 全域佇列實例（初始同時 3 個下載，之後由 services.concurrency 動態調整；單一租戶最多佔 2 個）
+download_queue = TaskQueue(
+    max_concurrent=3,
+    max_per_tenant=2,
+    policy=os.environ.get("YTIFY_QUEUE_POLICY", "fifo").lower(),
+    sjf_aging=float(os.environ.get("YTIFY_SJF_AGING", str(DEFAULT_SJF_AGING))),
+    max_backlog=int(os.environ.get("YTIFY_MAX_BACKLOG", "0")),
+    max_wait=float(os.environ.get("YTIFY_MAX_QUEUE_WAIT", "0")),
+    preemption=os.environ.get("YTIFY_PREEMPTION", "true").lower() == "true",
+)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+下載佇列持久化 - 使用 SQLite
+記錄已提交、執行中的任務，服務重啟後依提交順序重新派發
+"""
+
+import sqlite3
+import json
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+from contextlib import contextmanager
+
+
+class QueueStore:
+    """持久化佇列（與下載歷史共用資料庫檔案）"""
+
+    def __init__(self, db_path: str = "./data/history.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        """初始化資料表"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queued_tasks (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT UNIQUE NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+
+    @contextmanager
+    def _get_conn(self):
+        """取得資料庫連線"""
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def save(self, task_id: str, payload: Dict[str, Any]):
+        """
+        新增或更新佇列記錄（更新時保留原本的提交順序，狀態重設為排隊）
+
+        Args:
+            task_id: 任務 ID
+            payload: 重新派發所需的任務參數
+        """
+        now = datetime.now().isoformat()
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO queued_tasks (task_id, payload, status, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    status = 'queued',
+                    updated_at = excluded.updated_at
+            """, (task_id, json.dumps(payload, ensure_ascii=False), now, now))
+            conn.commit()
+
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """
+        批次新增佇列記錄（單一交易，順序即提交順序）
+
+        Args:
+            items: (task_id, payload) 列表
+        """
+        now = datetime.now().isoformat()
+        with self._get_conn() as conn:
+            conn.executemany("""
+                INSERT INTO queued_tasks (task_id, payload, status, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    status = 'queued',
+                    updated_at = excluded.updated_at
+            """, [
+                (task_id, json.dumps(payload, ensure_ascii=False), now, now)
+                for task_id, payload in items
+            ])
+            conn.commit()
+
+    def mark_running(self, task_id: str) -> bool:
+        """標記任務開始執行"""
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE queued_tasks SET status = 'running', updated_at = ? WHERE task_id = ?",
+                (datetime.now().isoformat(), task_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def mark_paused(self, task_id: str) -> bool:
+        """標記任務已暫停（重啟後不自動派發）"""
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE queued_tasks SET status = 'paused', updated_at = ? WHERE task_id = ?",
+                (datetime.now().isoformat(), task_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def remove(self, task_id: str) -> bool:
+        """任務結束（完成、失敗、取消）後移除"""
+        with self._get_conn() as conn:
+            cursor = conn.execute("DELETE FROM queued_tasks WHERE task_id = ?", (task_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def list_pending(self) -> List[Dict[str, Any]]:
+        """依提交順序取得所有未完成任務"""
+        with self._get_conn() as conn:
+            rows = conn.execute(
+                "SELECT * FROM queued_tasks ORDER BY seq ASC"
+            ).fetchall()
+
+        result = []
+        for row in rows:
+            d = dict(row)
+            try:
+                d["payload"] = json.loads(d["payload"])
+            except (TypeError, ValueError):
+                continue
+            result.append(d)
+        return result
+
+    def count(self) -> int:
+        """取得未完成任務數量"""
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT COUNT(*) as count FROM queued_tasks").fetchone()
+            return row['count']
+
+
+# 全域實例
+queue_store = QueueStore()
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+自適應重試策略
+依（錯誤類別, 出口）統計「等了多久再重試、重試後是否成功」，
+從結果學出基準延遲，再套用指數退避與抖動；另有單一任務與全域的重試預算。
+學到的統計存在 SQLite，重啟後沿用。
+"""
+
+import os
+import math
+import time
+import random
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from contextlib import contextmanager
+
+
+# 所有出口合併統計的鍵（單一出口樣本不足時使用）
+ALL_SCOPES = "*"
+
+# 單一延遲區間至少要有幾筆樣本才採信
+MIN_BUCKET_SAMPLES = 3
+# 重試成功率達到多少就算這個延遲「夠久」
+TARGET_SUCCESS_RATE = 0.6
+# 退避延遲上限（秒）
+MAX_RETRY_DELAY = 900
+
+
+class RetryStatsStore:
+    """重試結果統計（與下載歷史共用資料庫檔案）"""
+
+    def __init__(self, db_path: str = "./data/history.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        """初始化資料表"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retry_outcomes (
+                    category TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    delay_total REAL NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (category, scope, bucket)
+                )
+            """)
+            conn.commit()
+
+    @contextmanager
+    def _get_conn(self):
+        """取得資料庫連線"""
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self) -> list:
+        """讀取全部統計"""
+        with self._get_conn() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM retry_outcomes").fetchall()]
+
+    def add(self, rows: list):
+        """
+        累加一次重試結果
+
+        Args:
+            rows: (category, scope, bucket, success, delay) 列表
+        """
+        now = datetime.now().isoformat()
+        with self._get_conn() as conn:
+            conn.executemany("""
+                INSERT INTO retry_outcomes (category, scope, bucket, attempts, successes, delay_total, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT(category, scope, bucket) DO UPDATE SET
+                    attempts = attempts + 1,
+                    successes = successes + excluded.successes,
+                    delay_total = delay_total + excluded.delay_total,
+                    updated_at = excluded.updated_at
+            """, [
+                (category, scope, bucket, int(success), delay, now)
+                for category, scope, bucket, success, delay in rows
+            ])
+            conn.commit()
+
+
+class AdaptiveRetryPolicy:
+    """從重試結果學習延遲的重試策略（下載執行緒會呼叫，需執行緒安全）"""
+
+    def __init__(
+        self,
+        store: Optional[RetryStatsStore] = None,
+        task_budget: int = 10,
+        task_delay_budget: float = 1800,
+        budget_ratio: float = 0.2,
+        budget_min: int = 10,
+        budget_window: float = 60.0,
+        explore_rate: float = 0.1,
+    ):
+        """
+        Args:
+            store: 統計持久化（None 表示只存在記憶體）
+            task_budget: 單一任務最多重試幾次（跨錯誤類別合計）
+            task_delay_budget: 單一任務累計等待上限（秒）
+            budget_ratio: 全域預算：視窗內重試數最多為下載嘗試數的幾成
+            budget_min: 全域預算：視窗內不論嘗試數都允許的重試數
+            budget_window: 全域預算的統計視窗（秒）
+            explore_rate: 以較短延遲試探的機率（才有機會學到更短的延遲）
+        """
+        self.store = store
+        self.task_budget = task_budget
+        self.task_delay_budget = task_delay_budget
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.budget_window = budget_window
+        self.explore_rate = explore_rate
+        self._lock = threading.Lock()
+        # (category, scope) -> bucket -> [attempts, successes, delay_total]
+        self._table: Dict[Tuple[str, str], Dict[int, list]] = {}
+        self._attempts: deque = deque()
+        self._retries: deque = deque()
+        self.denied_count = 0
+        if store is not None:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveRetryPolicy":
+        """從環境變數建立（YTIFY_RETRY_TASK_BUDGET / _TASK_DELAY_BUDGET / _BUDGET_RATIO / _BUDGET_MIN）"""
+        return cls(
+            store=RetryStatsStore(),
+            task_budget=int(os.environ.get("YTIFY_RETRY_TASK_BUDGET", "10")),
+            task_delay_budget=float(os.environ.get("YTIFY_RETRY_TASK_DELAY_BUDGET", "1800")),
+            budget_ratio=float(os.environ.get("YTIFY_RETRY_BUDGET_RATIO", "0.2")),
+            budget_min=int(os.environ.get("YTIFY_RETRY_BUDGET_MIN", "10")),
+        )
+
+    def _load(self):
+        try:
+            rows = self.store.load()
+        except sqlite3.Error as e:
+            print(f"[重試] 讀取統計失敗: {e}")
+            return
+        for row in rows:
+            buckets = self._table.setdefault((row["category"], row["scope"]), {})
+            buckets[row["bucket"]] = [row["attempts"], row["successes"], row["delay_total"]]
+
+    @staticmethod
+    def _bucket(delay: float) -> int:
+        """延遲區間：以 2 的冪分段（1-2、2-4、4-8 ... 秒）"""
+        return int(math.log2(max(delay, 1.0)))
+
+    def _learned_base(self, category: str, scope: str) -> Optional[float]:
+        """
+        學到的基準延遲：成功率達標的最短延遲區間的平均延遲（呼叫端需持有 lock）
+
+        單一出口樣本不足時改用所有出口合併的統計；都沒有資料時回傳 None
+        """
+        for key in ((category, scope), (category, ALL_SCOPES)):
+            buckets = self._table.get(key)
+            if not buckets:
+                continue
+            sampled = sorted(
+                (bucket, stats) for bucket, stats in buckets.items()
+                if stats[0] >= MIN_BUCKET_SAMPLES
+            )
+            if not sampled:
+                continue
+            for _, (attempts, successes, delay_total) in sampled:
+                if successes / attempts >= TARGET_SUCCESS_RATE:
+                    return delay_total / attempts
+            # 試過的延遲都不夠：從最長的再加倍
+            attempts, _, delay_total = sampled[-1][1]
+            return min(delay_total / attempts * 2, MAX_RETRY_DELAY)
+        return None
+
+    def next_delay(self, category: str, scope: str, attempt: int, default: float) -> float:
+        """
+        計算下一次重試的等待秒數
+
+        Args:
+            category: 錯誤類別
+            scope: 出口（代理 URL 或 direct）
+            attempt: 此類錯誤已重試的次數（0 = 第一次重試）
+            default: 沒有學習資料時的基準延遲（RETRY_STRATEGIES 的設定）
+
+        Returns:
+            等待秒數（指數退避 + 抖動）
+        """
+        if default <= 0:
+            return 0
+        with self._lock:
+            base = self._learned_base(category, scope) or default
+        if random.random() < self.explore_rate:
+            base /= 2
+        delay = min(base * (2 ** attempt), MAX_RETRY_DELAY)
+        # equal jitter：保留一半，另一半隨機，避免同時失敗的任務同時重試
+        return round(delay / 2 + random.uniform(0, delay / 2), 1)
+
+    def record_attempt(self):
+        """記錄一次下載嘗試（全域預算的分母）"""
+        with self._lock:
+            self._attempts.append(time.monotonic())
+
+    def record_outcome(self, category: str, scope: str, delay: float, success: bool):
+        """
+        記錄重試結果
+
+        Args:
+            category: 觸發重試的錯誤類別
+            scope: 出口
+            delay: 實際等待秒數
+            success: 重試後是否不再發生同類錯誤
+        """
+        bucket = self._bucket(delay)
+        rows = [(category, scope, bucket, success, delay)]
+        if scope != ALL_SCOPES:
+            rows.append((category, ALL_SCOPES, bucket, success, delay))
+        with self._lock:
+            for row_category, row_scope, _, _, _ in rows:
+                stats = self._table.setdefault((row_category, row_scope), {}).setdefault(bucket, [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += int(success)
+                stats[2] += delay
+        if self.store is not None:
+            try:
+                self.store.add(rows)
+            except sqlite3.Error as e:
+                print(f"[重試] 儲存統計失敗: {e}")
+
+    def _prune(self, now: float):
+        """移除視窗外的紀錄（呼叫端需持有 lock）"""
+        for window in (self._attempts, self._retries):
+            while window and now - window[0] > self.budget_window:
+                window.popleft()
+
+    def budget_remaining(self) -> int:
+        """全域重試預算剩餘次數"""
+        with self._lock:
+            self._prune(time.monotonic())
+            allowed = self.budget_min + self.budget_ratio * len(self._attempts)
+            return max(0, int(allowed) - len(self._retries))
+
+    def check_task_budget(self, retry_count: int, waited: float, delay: float) -> Optional[str]:
+        """單一任務的重試預算：None 表示還有預算，否則為拒絕原因"""
+        if retry_count >= self.task_budget:
+            return f"已重試 {retry_count} 次，超過單一任務上限"
+        if waited + delay > self.task_delay_budget:
+            return f"累計等待將超過 {int(self.task_delay_budget)} 秒"
+        return None
+
+    def acquire_retry(self, retry_count: int, waited: float, delay: float) -> Optional[str]:
+        """
+        檢查並扣除重試預算
+
+        Args:
+            retry_count: 任務已重試次數
+            waited: 任務已累計等待秒數
+            delay: 這次預計等待秒數
+
+        Returns:
+            None 表示允許重試；否則為拒絕原因
+        """
+        reason = self.check_task_budget(retry_count, waited, delay)
+        if reason is None and self.budget_remaining() <= 0:
+            reason = "整體重試過於頻繁，暫停重試"
+        if reason is None:
+            self.note_retry()
+            return None
+        with self._lock:
+            self.denied_count += 1
+        return reason
+
+    def note_retry(self):
+        """記錄一次已放行的重試（扣除全域預算）"""
+        with self._lock:
+            self._retries.append(time.monotonic())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得預算狀態與學到的延遲表"""
+        budget = self.budget_remaining()
+        with self._lock:
+            table: Dict[str, Dict[str, Any]] = {}
+            for (category, scope), buckets in self._table.items():
+                table.setdefault(category, {})[scope] = {
+                    "base_delay": (
+                        round(base, 1) if (base := self._learned_base(category, scope)) else None
+                    ),
+                    "buckets": [
+                        {
+                            "delay": round(delay_total / attempts, 1),
+                            "attempts": attempts,
+                            "success_rate": round(successes / attempts, 2),
+                        }
+                        for _, (attempts, successes, delay_total) in sorted(buckets.items())
+                        if attempts
+                    ],
+                }
+            return {
+                "task_budget": self.task_budget,
+                "task_delay_budget": self.task_delay_budget,
+                "global_budget_remaining": budget,
+                "recent_attempts": len(self._attempts),
+                "recent_retries": len(self._retries),
+                "denied": self.denied_count,
+                "learned": table,
+            }
+
+
+# 全域實例
+retry_policy = AdaptiveRetryPolicy.from_env()
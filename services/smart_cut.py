@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+智慧剪輯
+片段只在兩端重新編碼：起點到第一個 keyframe 前、最後一個 keyframe 到終點；
+中間完整的 GOP 直接 stream copy，再串接起來。切點仍精準到幀，
+CPU 成本只跟兩端不完整的 GOP 有關，不再隨片段長度增加。
+來源不是 H.264、或片段內不到兩個 keyframe（省不了多少）時交給完整重新編碼
+"""
+
+import os
+import re
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from fractions import Fraction
+from typing import Dict, Any, Optional, List, Tuple
+
+
+# 可以用 libx264 接上原始 GOP 的編碼（中介檔每個 IDR 前都帶 SPS/PPS，串接後解碼器會切換參數）
+SUPPORTED_CODECS = {'h264'}
+
+# 幀時間比對容許的誤差（秒）：ffprobe 只印到微秒、mp4 時間基轉換也有捨入
+PTS_TOLERANCE = 1e-4
+# 給 ffmpeg 的 seek 偏移（秒），遠小於一幀：重新編碼時確保目標幀不被丟掉
+SEEK_NUDGE = 0.0005
+
+# 沒有 ffprobe 時從 ffmpeg -i 的輸出讀容器起始時間（Duration: ..., start: 1.984000, ...）
+_START_PATTERN = re.compile(r'Duration: .*?, start: (-?\d+(?:\.\d+)?)')
+
+
+class SmartCutter:
+    """兩端重新編碼、中間 stream copy 的片段剪輯（後製執行緒會呼叫，需執行緒安全）"""
+
+    def __init__(self, ffmpeg: Optional[str] = "ffmpeg", ffprobe: Optional[str] = None,
+                 timeout: float = 1800):
+        """
+        Args:
+            ffmpeg: ffmpeg 執行檔（None 表示不可用）
+            ffprobe: ffprobe 執行檔（None 時改用 ffmpeg 的 framecrc 列出封包）
+            timeout: 單次 ffmpeg 最長執行秒數
+        """
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.timeout = timeout
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.cuts = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.copied_seconds = 0.0
+        self.encoded_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "SmartCutter":
+        """從環境變數建立（YTIFY_SMART_CUT）"""
+        cutter = cls(ffmpeg=shutil.which("ffmpeg"), ffprobe=shutil.which("ffprobe"))
+        cutter.enabled = os.environ.get("YTIFY_SMART_CUT", "true").lower() == "true"
+        return cutter
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and bool(self.ffmpeg)
+
+    def start_time(self, source: Path) -> Optional[float]:
+        """
+        容器的起始時間（ffprobe 的 format start_time；ffmpeg 輸入端 -ss 以它為 0）
+
+        Returns:
+            秒數；無法取得時回傳 None
+        """
+        if self.ffprobe:
+            cmd = [self.ffprobe, '-v', 'error', '-show_entries', 'format=start_time',
+                   '-of', 'default=nw=1:nk=1', str(source)]
+        elif self.ffmpeg:
+            cmd = [self.ffmpeg, '-hide_banner', '-i', str(source)]
+        else:
+            return None
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if self.ffprobe:
+            try:
+                return float(proc.stdout.strip())
+            except ValueError:
+                return None
+        # ffmpeg -i 沒有指定輸出會以錯誤結束，只讀 stderr 的檔案資訊
+        match = _START_PATTERN.search(proc.stderr)
+        return float(match.group(1)) if match else None
+
+    def probe(self, source: Path) -> Tuple[Optional[str], List[Tuple[float, bool]]]:
+        """
+        列出第一條視訊軌的封包（只解封裝，不解碼）
+
+        Returns:
+            (編碼名稱, 依顯示時間排序的 [(pts 秒數, 是否 keyframe)])；
+            時間以容器起始時間為 0，與 ffmpeg 輸入端 -ss 相同
+        """
+        if self.ffprobe:
+            return self._probe_ffprobe(source)
+        return self._probe_framecrc(source)
+
+    def _probe_ffprobe(self, source: Path) -> Tuple[Optional[str], List[Tuple[float, bool]]]:
+        proc = subprocess.run([
+            self.ffprobe, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name:packet=pts_time,flags',
+            '-of', 'compact=p=0:nk=1', str(source),
+        ], capture_output=True, text=True, timeout=self.timeout)
+        codec = None
+        packets = []
+        for line in proc.stdout.splitlines():
+            fields = line.split('|')
+            if len(fields) == 1:
+                codec = fields[0].strip() or codec
+            elif len(fields) >= 2 and fields[0] not in ('', 'N/A'):
+                packets.append((float(fields[0]), 'K' in fields[1]))
+        # ffprobe 印的是原始時間戳；保留來源時間戳的檔案（如 -copyts 下載的段落）要扣掉起始時間
+        origin = self.start_time(source) or 0.0
+        packets = sorted((pts - origin, key) for pts, key in packets)
+        return codec, packets
+
+    def _probe_framecrc(self, source: Path) -> Tuple[Optional[str], List[Tuple[float, bool]]]:
+        """沒有 ffprobe 時：framecrc 每個封包一行（非 keyframe 會帶 F= 旗標；時間已扣掉起始時間）"""
+        proc = subprocess.run([
+            self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-i', str(source),
+            '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-',
+        ], capture_output=True, text=True, timeout=self.timeout)
+        codec = None
+        time_base = None
+        packets = []
+        for line in proc.stdout.splitlines():
+            if line.startswith('#tb 0:'):
+                time_base = Fraction(line.split(':', 1)[1].strip())
+            elif line.startswith('#codec_id 0:'):
+                codec = line.split(':', 1)[1].strip()
+            elif not line.startswith('#') and time_base is not None:
+                fields = [field.strip() for field in line.split(',')]
+                if len(fields) >= 6:
+                    key = not any(field.startswith('F=') and not int(field[2:], 16) & 1 for field in fields[6:])
+                    packets.append((float(int(fields[2]) * time_base), key))
+        packets.sort()
+        return codec, packets
+
+    @staticmethod
+    def plan(packets: List[Tuple[float, bool]], start: float, end: float) -> Optional[Dict[str, Any]]:
+        """
+        把片段拆成三段
+
+        Args:
+            packets: probe 取得的封包
+            start: 片段起點（秒，來源時間軸）
+            end: 片段終點（秒）
+
+        Returns:
+            片段實際的起訖（第一幀的時間、最後一幀結束的時間）與各段的起始幀時間、幀數與長度；
+            中間沒有完整 GOP 時回傳 None
+        """
+        frames = [pts for pts, _ in packets]
+        clip = [(pts, key) for pts, key in packets if start - PTS_TOLERANCE <= pts < end - PTS_TOLERANCE]
+        if len(clip) < 2:
+            return None
+        keys = [pts for pts, key in clip if key]
+        after = next(((pts, key) for pts, key in packets if pts >= end - PTS_TOLERANCE), None)
+        frame_duration = (clip[-1][0] - clip[0][0]) / (len(clip) - 1)
+        clip_end = clip[-1][0] + frame_duration
+
+        # 片段結尾剛好接著下一個 keyframe（或來源結尾）：最後一個 GOP 也是完整的
+        copy_end = clip_end if after is None or after[1] else (keys[-1] if keys else None)
+        if not keys or copy_end is None or keys[0] >= copy_end - PTS_TOLERANCE:
+            return None
+        copy_start = keys[0]
+
+        def count(lo: float, hi: float) -> int:
+            return sum(1 for pts in frames if lo - PTS_TOLERANCE <= pts < hi - PTS_TOLERANCE)
+
+        return {
+            "start": clip[0][0],
+            "end": clip_end,
+            "head": {"start": clip[0][0], "frames": count(clip[0][0], copy_start),
+                     "duration": copy_start - clip[0][0]},
+            # index：前面有幾個封包（closed GOP 的解碼順序中，keyframe 之前剛好是顯示在它之前的幀）
+            "copy": {"start": copy_start, "frames": count(copy_start, copy_end),
+                     "index": count(float('-inf'), copy_start), "duration": copy_end - copy_start},
+            "tail": {"start": copy_end, "frames": count(copy_end, clip_end),
+                     "duration": max(0.0, clip_end - copy_end)},
+        }
+
+    def _encode_args(self) -> List[str]:
+        """兩端重新編碼的參數（與完整重新編碼的畫質相同）"""
+        # repeat-headers：中介檔要求 global header 時 x264 預設只把 SPS/PPS 放在 extradata，
+        # 串接後解碼器會沿用原始 GOP 的參數集而解壞
+        return ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-x264-params', 'repeat-headers=1']
+
+    def build_commands(self, source: Path, plan: Dict[str, Any], work: Path, output: Path,
+                       copy_audio: bool = True) -> List[List[str]]:
+        """
+        組出各段與最後串接的 ffmpeg 指令
+
+        Args:
+            copy_audio: 來源音訊已是 AAC 時直接複製（重新編碼 AAC 的成本也隨長度增加）
+        """
+        base = [self.ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+        commands = []
+        listing = []
+        for name in ("head", "copy", "tail"):
+            part = plan[name]
+            if not part["frames"]:
+                continue
+            piece = work / f"{name}.nut"
+            # Annex B 封包：兩端的 x264 與中間的原始 GOP 各自帶參數集，串接後才解得對
+            if name == "copy":
+                # stream copy 不用 -ss：帶 edit list 與 B 幀的 mp4 會落到前一個 GOP。
+                # 從頭解封裝，依封包序號在 keyframe 切開，取第二段
+                commands.append(base + [
+                    '-i', str(source), '-map', '0:v:0', '-c:v', 'copy',
+                    '-frames:v', str(part["index"] + part["frames"]),
+                    '-bsf:v', 'h264_mp4toannexb',
+                    '-f', 'segment', '-segment_frames', str(part["index"]),
+                    '-segment_format', 'nut', '-reset_timestamps', '1',
+                    str(work / "copy%d.nut"),
+                ])
+                piece = work / ("copy1.nut" if part["index"] else "copy0.nut")
+            else:
+                # 重新編碼的 seek 會丟掉目標之前的幀：往前推一點保住第一幀
+                seek = max(0.0, part["start"] - SEEK_NUDGE)
+                commands.append(base + [
+                    '-ss', f'{seek:.6f}', '-i', str(source),
+                    '-map', '0:v:0', '-frames:v', str(part["frames"]), *self._encode_args(),
+                    '-bsf:v', 'h264_mp4toannexb', '-f', 'nut', str(piece),
+                ])
+            listing.append(f"file '{piece.name}'\nduration {part['duration']:.6f}\n")
+        (work / "parts.txt").write_text("".join(listing), encoding="utf-8")
+
+        # 串接視訊；音訊不分段，從第一幀的時間起整段取同樣長度，與視訊對齊
+        audio = ['-c:a', 'copy'] if copy_audio else ['-c:a', 'aac', '-b:a', '192k']
+        commands.append(base + [
+            '-f', 'concat', '-safe', '0', '-i', str(work / "parts.txt"),
+            '-ss', f'{plan["start"]:.6f}', '-t', f'{plan["end"] - plan["start"]:.6f}', '-i', str(source),
+            '-map', '0:v:0', '-map', '1:a:0?',
+            '-c:v', 'copy', *audio,
+            '-movflags', '+faststart', str(output),
+        ])
+        return commands
+
+    def cut(self, source: Path, start: float, end: float, output: Path,
+            copy_audio: bool = True) -> Optional[float]:
+        """
+        剪出 [start, end) 秒的片段（與 ffmpeg -ss/-t 相同：顯示時間落在範圍內的幀）
+
+        Args:
+            copy_audio: 來源音訊已是 AAC，直接複製
+
+        Returns:
+            花費秒數；不適用智慧剪輯時回傳 None（呼叫端改用完整重新編碼）
+
+        Raises:
+            RuntimeError: ffmpeg 失敗（輸出檔會被刪除）
+        """
+        if not self.available:
+            return None
+        started = time.monotonic()
+        try:
+            codec, packets = self.probe(source)
+        except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+            print(f"[智慧剪輯] 無法分析來源: {e}")
+            codec, packets = None, []
+        plan = self.plan(packets, start, end) if codec in SUPPORTED_CODECS else None
+        if plan is None:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        work = Path(tempfile.mkdtemp(prefix=".smartcut-", dir=output.parent))
+        try:
+            for cmd in self.build_commands(source, plan, work, output, copy_audio):
+                try:
+                    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    raise RuntimeError(f"智慧剪輯失敗: {e}")
+                if proc.returncode != 0:
+                    raise RuntimeError(f"智慧剪輯失敗: {proc.stderr.strip()[-500:]}")
+            if not output.is_file():
+                raise RuntimeError("智慧剪輯失敗: 沒有產生輸出檔")
+        except RuntimeError:
+            output.unlink(missing_ok=True)
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        with self._lock:
+            self.cuts += 1
+            self.copied_seconds += plan["copy"]["duration"]
+            self.encoded_seconds += plan["head"]["duration"] + plan["tail"]["duration"]
+        return time.monotonic() - started
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得智慧剪輯次數與重新編碼比例"""
+        with self._lock:
+            total = self.copied_seconds + self.encoded_seconds
+            return {
+                "enabled": self.enabled,
+                "cuts": self.cuts,
+                "fallbacks": self.fallbacks,
+                "failures": self.failures,
+                "copied_seconds": round(self.copied_seconds, 1),
+                "encoded_seconds": round(self.encoded_seconds, 1),
+                "encoded_ratio": round(self.encoded_seconds / total, 3) if total else None,
+            }
+
+
+# 全域實例
+smart_cutter = SmartCutter.from_env()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+下載資料夾空間管理
+downloads/ 頂層的檔案是各請求待取走的成品（取走後刪除，逾期未取也刪除）；
+downloads/.artifacts/ 是成品快取，與待取檔案以硬連結共用同一份資料。
+用量超過預算或剩餘空間低於監控門檻時，依 LRU 或 LFU 淘汰沒有待取請求引用的快取成品，
+熱門的留下、冷門的先走
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+
+class StorageManager:
+    """待取檔案引用計數與快取淘汰（API 與下載執行緒都會呼叫，需執行緒安全）"""
+
+    def __init__(
+        self,
+        download_path: Path,
+        budget_bytes: int = 0,
+        policy: str = "lru",
+        pending_ttl: float = 24 * 3600,
+        interval: float = 300,
+    ):
+        """
+        Args:
+            download_path: 下載資料夾
+            budget_bytes: downloads/ 用量上限（0 = 不限制，只看剩餘空間）
+            policy: lru（最久沒用到先淘汰）或 lfu（命中次數最少先淘汰）
+            pending_ttl: 待取檔案最多保留幾秒
+            interval: 背景檢查間隔（秒）
+        """
+        self.download_path = Path(download_path)
+        self.budget_bytes = budget_bytes
+        self.policy = policy if policy in ("lru", "lfu") else "lru"
+        self.pending_ttl = pending_ttl
+        self.interval = interval
+        self._lock = threading.Lock()
+        # 待取檔案：檔名 -> 到期時間（unix 秒）
+        self._pending: Dict[str, float] = {}
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.expired = 0
+        self.last_usage = 0
+
+    @classmethod
+    def from_env(cls) -> "StorageManager":
+        """從環境變數建立（YTIFY_STORAGE_BUDGET_MB / YTIFY_STORAGE_POLICY / YTIFY_FILE_MAX_AGE_HOURS）"""
+        return cls(
+            Path("./downloads"),
+            budget_bytes=int(os.environ.get("YTIFY_STORAGE_BUDGET_MB", "0")) * 1024 * 1024,
+            policy=os.environ.get("YTIFY_STORAGE_POLICY", "lru").lower(),
+            pending_ttl=float(os.environ.get("YTIFY_FILE_MAX_AGE_HOURS", "24")) * 3600,
+        )
+
+    @staticmethod
+    def _disk_floor_bytes() -> int:
+        """監控設定的剩餘空間門檻（可由 /api/admin/thresholds 調整；延遲導入避免循環依賴）"""
+        try:
+            from services.monitor import monitor
+            return int(monitor.thresholds.get("disk_space_mb", 500)) * 1024 * 1024
+        except ImportError:
+            return 500 * 1024 * 1024
+
+    def acquire(self, filename: str):
+        """登記一個待取檔案（請求完成時呼叫）"""
+        with self._lock:
+            self._pending[filename] = time.time() + self.pending_ttl
+
+    def resolve(self, filename: str) -> Optional[Path]:
+        """
+        待取檔案的路徑（只接受 downloads/ 頂層的檔名）
+
+        Returns:
+            路徑；含路徑分隔符或解析後不在頂層（如 .artifacts/ 內的快取成品、指向外部的連結）時回傳 None
+        """
+        if not filename or filename in (".", "..") or "/" in filename or "\\" in filename:
+            return None
+        file_path = self.download_path / filename
+        try:
+            if file_path.resolve().parent != self.download_path.resolve():
+                return None
+        except (OSError, RuntimeError):
+            return None
+        return file_path
+
+    def release(self, filename: str) -> bool:
+        """
+        客戶端已取走或要求刪除：移除待取檔案
+
+        快取成品與它共用資料，刪除這個連結不影響快取；不在頂層的檔名一律拒絕，
+        避免經由請求路徑刪到 .artifacts/ 內的成品（索引還在、檔案卻不見）
+
+        Returns:
+            是否刪除了檔案
+        """
+        file_path = self.resolve(filename)
+        if file_path is None:
+            return False
+        with self._lock:
+            self._pending.pop(filename, None)
+        if not file_path.is_file():
+            return False
+        try:
+            file_path.unlink()
+            return True
+        except OSError as e:
+            print(f"[空間] 刪除失敗: {filename} - {e}")
+            return False
+
+    def _scan(self) -> Tuple[int, set]:
+        """
+        計算 downloads/ 實際用量，並列出待取檔案佔用的 inode
+
+        硬連結只算一次；服務重啟前留下的檔案以修改時間起算保留期限
+        """
+        seen = set()
+        pinned = set()
+        usage = 0
+        now = time.time()
+        for file in self.download_path.iterdir():
+            if not file.is_file() or file.name == '.gitkeep':
+                continue
+            stat = file.stat()
+            inode = (stat.st_dev, stat.st_ino)
+            with self._lock:
+                expires = self._pending.setdefault(file.name, stat.st_mtime + self.pending_ttl)
+            if expires <= now:
+                if self.release(file.name):
+                    self.expired += 1
+                    print(f"[空間] 刪除逾期未取的檔案: {file.name}")
+                continue
+            pinned.add(inode)
+            if inode not in seen:
+                seen.add(inode)
+                usage += stat.st_size
+        artifacts = self.download_path / ".artifacts"
+        if artifacts.is_dir():
+            for file in artifacts.iterdir():
+                stat = file.stat()
+                inode = (stat.st_dev, stat.st_ino)
+                if inode not in seen:
+                    seen.add(inode)
+                    usage += stat.st_size
+        with self._lock:
+            for name in [name for name in self._pending if not (self.download_path / name).exists()]:
+                del self._pending[name]
+        return usage, pinned
+
+    def _pressure(self, usage: int) -> int:
+        """還需要釋放多少 bytes（超過預算或剩餘空間不足，取較大者）"""
+        need = usage - self.budget_bytes if self.budget_bytes else 0
+        try:
+            free = shutil.disk_usage(self.download_path).free
+            need = max(need, self._disk_floor_bytes() - free)
+        except OSError:
+            pass
+        return max(0, need)
+
+    def enforce(self) -> int:
+        """
+        刪除逾期的待取檔案，空間不足時淘汰快取成品
+
+        Returns:
+            這次淘汰的成品數
+        """
+        from services.artifact_cache import artifact_cache
+
+        usage, pinned = self._scan()
+        need = self._pressure(usage)
+        evicted = 0
+        if need > 0:
+            if self.policy == "lfu":
+                order = lambda e: (e["hits"], e["last_access"])
+            else:
+                order = lambda e: e["last_access"]
+            for entry in sorted(artifact_cache.entries(), key=order):
+                if need <= 0:
+                    break
+                path = artifact_cache.root / entry["path"]
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    artifact_cache.evict(entry["key"])
+                    continue
+                # 還有請求沒取走：刪掉快取也不會釋放空間
+                if (stat.st_dev, stat.st_ino) in pinned:
+                    continue
+                if artifact_cache.evict(entry["key"]):
+                    need -= stat.st_size
+                    usage -= stat.st_size
+                    evicted += 1
+                    with self._lock:
+                        self.evictions += 1
+                        self.evicted_bytes += stat.st_size
+                    print(f"[空間] 淘汰快取成品: {entry['filename']} ({entry['hits']} 次命中)")
+            if need > 0:
+                print(f"[空間] 仍需釋放 {need / 1024 / 1024:.0f} MB，其餘檔案都還有請求待取")
+        self.last_usage = usage
+        return evicted
+
+    async def run(self):
+        """背景迴圈：定期清理與淘汰"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.enforce)
+            except Exception as e:
+                print(f"[空間] 檢查錯誤: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得用量、淘汰與快取命中統計"""
+        from services.artifact_cache import artifact_cache
+
+        try:
+            free = shutil.disk_usage(self.download_path).free
+        except OSError:
+            free = None
+        with self._lock:
+            pending = len(self._pending)
+        cache = artifact_cache.get_stats()
+        return {
+            "policy": self.policy,
+            "usage_mb": round(self.last_usage / 1024 / 1024, 1),
+            "budget_mb": round(self.budget_bytes / 1024 / 1024) if self.budget_bytes else None,
+            "occupancy": round(self.last_usage / self.budget_bytes, 2) if self.budget_bytes else None,
+            "free_mb": round(free / 1024 / 1024) if free is not None else None,
+            "disk_floor_mb": round(self._disk_floor_bytes() / 1024 / 1024),
+            "pending_files": pending,
+            "pending_ttl_hours": round(self.pending_ttl / 3600, 1),
+            "cached_artifacts": cache["entries"],
+            "hit_rate": cache["hit_rate"],
+            "evictions": self.evictions,
+            "evicted_mb": round(self.evicted_bytes / 1024 / 1024, 1),
+            "expired": self.expired,
+        }
+
+
+# 全域實例
+storage_manager = StorageManager.from_env()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+多連線下載設定與自動調校
+DASH/HLS 分段格式以 concurrent_fragment_downloads 同時抓多個 fragment；
+可選用 aria2c 外部下載器（單一檔案切成多段並行下載）。
+auto 模式依（格式, 出口）實測的傳輸速度挑選連線數。
+"""
+
+import os
+import random
+import shutil
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+
+# 可選的連線數（依序逐級試探）
+FRAGMENT_LEVELS = (1, 2, 4, 8, 16)
+# 尚無量測資料時的預設連線數
+DEFAULT_FRAGMENTS = 4
+# 傳輸量太小的下載量不準，不列入統計
+MIN_SAMPLE_BYTES = 2 * 1024 * 1024
+
+
+class TransferTuner:
+    """依實測速度挑選分段連線數（下載執行緒會呼叫，需執行緒安全）"""
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        backend: str = "native",
+        http_chunk_size: int = 10 * 1024 * 1024,
+        buffer_size: int = 1024 * 1024,
+        explore_rate: float = 0.2,
+        alpha: float = 0.3,
+    ):
+        """
+        Args:
+            mode: auto（自動調校）、off（單一連線）或固定連線數
+            backend: native（yt-dlp 內建）或 aria2c
+            http_chunk_size: 非分段格式每次 HTTP range 請求的大小（bytes，0 = 不切）
+            buffer_size: 下載緩衝區大小（bytes）
+            explore_rate: 已有最佳值時，改試相鄰連線數的機率
+            alpha: 速度 EWMA 的權重
+        """
+        self.mode = mode
+        self.backend = backend
+        self.http_chunk_size = http_chunk_size
+        self.buffer_size = buffer_size
+        self.explore_rate = explore_rate
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        # (格式, 出口) -> 連線數 -> [平均速度 bytes/s, 樣本數]
+        self._table: Dict[Tuple[str, str], Dict[int, list]] = {}
+
+    @classmethod
+    def from_env(cls) -> "TransferTuner":
+        """從環境變數建立（YTIFY_FRAGMENTS / YTIFY_DOWNLOADER / YTIFY_HTTP_CHUNK_SIZE / YTIFY_BUFFER_SIZE，大小以 KB 計）"""
+        backend = os.environ.get("YTIFY_DOWNLOADER", "native").lower()
+        if backend == "aria2c" and not shutil.which("aria2c"):
+            print("[傳輸] 找不到 aria2c，改用內建下載器")
+            backend = "native"
+        return cls(
+            mode=os.environ.get("YTIFY_FRAGMENTS", "auto").lower(),
+            backend=backend,
+            http_chunk_size=int(os.environ.get("YTIFY_HTTP_CHUNK_SIZE", "10240")) * 1024,
+            buffer_size=int(os.environ.get("YTIFY_BUFFER_SIZE", "1024")) * 1024,
+        )
+
+    @staticmethod
+    def _key(format_option: str, audio_only: bool, egress: str) -> Tuple[str, str]:
+        return ("audio" if audio_only else format_option, egress)
+
+    def choose(self, format_option: str, audio_only: bool, egress: str) -> int:
+        """
+        挑選這次下載的連線數
+
+        auto 模式：先用預設值，之後往相鄰的連線數試探，最後停在量到最快的一級，
+        並保留少量機率繼續試探（頻寬、代理狀況會變）
+        """
+        if self.mode == "off":
+            return 1
+        if self.mode != "auto":
+            try:
+                return max(1, int(self.mode))
+            except ValueError:
+                return DEFAULT_FRAGMENTS
+
+        with self._lock:
+            levels = self._table.get(self._key(format_option, audio_only, egress))
+            if not levels:
+                return DEFAULT_FRAGMENTS
+            best = max(levels, key=lambda level: levels[level][0])
+            index = FRAGMENT_LEVELS.index(best)
+            neighbors = [
+                FRAGMENT_LEVELS[i] for i in (index - 1, index + 1)
+                if 0 <= i < len(FRAGMENT_LEVELS)
+            ]
+            untried = [level for level in neighbors if level not in levels]
+            if untried:
+                return untried[-1]  # 先往多連線的方向試
+            if random.random() < self.explore_rate:
+                return random.choice(neighbors)
+            return best
+
+    def record(self, format_option: str, audio_only: bool, egress: str, fragments: int,
+               downloaded_bytes: int, elapsed: float):
+        """記錄一次下載的實測速度"""
+        if downloaded_bytes < MIN_SAMPLE_BYTES or elapsed <= 0 or fragments not in FRAGMENT_LEVELS:
+            return
+        speed = downloaded_bytes / elapsed
+        with self._lock:
+            levels = self._table.setdefault(self._key(format_option, audio_only, egress), {})
+            stats = levels.get(fragments)
+            if stats is None:
+                levels[fragments] = [speed, 1]
+            else:
+                stats[0] += self.alpha * (speed - stats[0])
+                stats[1] += 1
+
+    def apply(self, ydl_opts: Dict[str, Any], fragments: int, external: bool = True):
+        """
+        把連線數與緩衝設定套用到 yt-dlp 選項
+
+        Args:
+            ydl_opts: yt-dlp 選項
+            fragments: 連線數
+            external: 是否允許使用外部下載器（片段剪輯由 ffmpeg 下載，不可改用 aria2c）
+        """
+        ydl_opts['concurrent_fragment_downloads'] = fragments
+        ydl_opts['buffersize'] = self.buffer_size
+        if self.http_chunk_size:
+            ydl_opts['http_chunk_size'] = self.http_chunk_size
+        if external and self.backend == "aria2c" and fragments > 1:
+            # aria2c 對非分段格式也能切成多段並行；-k 1M 讓小檔也會切
+            ydl_opts['external_downloader'] = {'default': 'aria2c'}
+            ydl_opts['external_downloader_args'] = {
+                'aria2c': ['-x', str(fragments), '-s', str(fragments), '-k', '1M', '--file-allocation=none']
+            }
+
+    def export_state(self) -> Dict[str, Any]:
+        """匯出量測表（交給下載子程序沿用）"""
+        with self._lock:
+            return {key: {level: list(stats) for level, stats in levels.items()}
+                    for key, levels in self._table.items()}
+
+    def import_state(self, state: Optional[Dict[str, Any]]):
+        """匯入先前匯出的量測表"""
+        if not state:
+            return
+        with self._lock:
+            for key, levels in state.items():
+                self._table[tuple(key)] = {int(level): list(stats) for level, stats in levels.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得設定與各（格式, 出口）的量測結果"""
+        with self._lock:
+            table = {}
+            for (format_key, egress), levels in self._table.items():
+                best = max(levels, key=lambda level: levels[level][0])
+                table.setdefault(format_key, {})[egress] = {
+                    "best": best,
+                    "levels": {
+                        level: {"speed_kbps": round(speed / 1024), "samples": samples}
+                        for level, (speed, samples) in sorted(levels.items())
+                    },
+                }
+            return {
+                "mode": self.mode,
+                "backend": self.backend,
+                "http_chunk_size": self.http_chunk_size,
+                "buffer_size": self.buffer_size,
+                "measured": table,
+            }
+
+
+# 全域實例
+transfer_tuner = TransferTuner.from_env()
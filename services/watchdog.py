@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+下載停滯監視
+定期取樣每個下載中任務由 progress hook 回報的 downloaded_bytes，
+一段時間沒有進度、或速度低於下限且照這速度會超過 download_timeout 的任務，
+中斷後換代理（出口）續傳
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+
+class StallWatchdog:
+    """停滯下載監視器"""
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        speed_floor: float = 50 * 1024,
+        interval: float = 5.0,
+        max_restarts: int = 3,
+    ):
+        """
+        Args:
+            window: 判斷停滯、慢速的觀察視窗（秒）
+            speed_floor: 速度下限（bytes/s）
+            interval: 取樣間隔（秒）
+            max_restarts: 單一任務最多因停滯重啟幾次，超過就讓它慢慢跑完
+        """
+        self.window = window
+        self.speed_floor = speed_floor
+        self.interval = interval
+        self.max_restarts = max_restarts
+        self.enabled = True
+        self._samples: Dict[str, deque] = {}  # task_id -> (時間, downloaded_bytes)
+        self.restart_count = 0
+        self.history: deque = deque(maxlen=20)
+
+    @classmethod
+    def from_env(cls) -> "StallWatchdog":
+        """從環境變數建立（YTIFY_STALL_WINDOW / YTIFY_STALL_SPEED_FLOOR(KB/s) / YTIFY_STALL_MAX_RESTARTS / YTIFY_STALL_WATCHDOG）"""
+        watchdog = cls(
+            window=float(os.environ.get("YTIFY_STALL_WINDOW", "60")),
+            speed_floor=float(os.environ.get("YTIFY_STALL_SPEED_FLOOR", "50")) * 1024,
+            max_restarts=int(os.environ.get("YTIFY_STALL_MAX_RESTARTS", "3")),
+        )
+        watchdog.enabled = os.environ.get("YTIFY_STALL_WATCHDOG", "true").lower() == "true"
+        return watchdog
+
+    @staticmethod
+    def _download_timeout() -> float:
+        """監控設定的下載超時（可由 /api/admin/thresholds 調整；延遲導入避免循環依賴）"""
+        try:
+            from services.monitor import monitor
+            return float(monitor.thresholds.get("download_timeout", 600))
+        except ImportError:
+            return 600.0
+
+    def check(self, tasks: Dict[str, dict], running: set, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """
+        取樣並找出需要重啟的任務
+
+        Args:
+            tasks: 任務 dict（task_id -> task）
+            running: 執行中的任務 ID
+            now: 目前時間（monotonic）
+
+        Returns:
+            (task_id, 原因) 列表
+        """
+        now = time.monotonic() if now is None else now
+        stalled = []
+        download_timeout = self._download_timeout()
+
+        for task_id in list(self._samples):
+            if task_id not in running:
+                del self._samples[task_id]
+
+        for task_id in running:
+            task = tasks.get(task_id)
+            # 只看傳輸階段；合併、重試等待、排隊中的時間不算停滯
+            if not task or task.get("status") != "downloading":
+                self._samples.pop(task_id, None)
+                continue
+            if task.get("stall_restarts", 0) >= self.max_restarts:
+                continue
+
+            downloaded = task.get("downloaded_bytes") or 0
+            samples = self._samples.setdefault(task_id, deque())
+            # 位元組變少代表換下一個檔案（先視訊後音訊），重新起算
+            if samples and downloaded < samples[-1][1]:
+                samples.clear()
+            samples.append((now, downloaded))
+            # 只保留一筆視窗起點之前的樣本，作為計算基準
+            while len(samples) > 1 and now - samples[1][0] >= self.window:
+                samples.popleft()
+
+            span = now - samples[0][0]
+            if span < self.window:
+                continue
+
+            delta = downloaded - samples[0][1]
+            if delta <= 0:
+                stalled.append((task_id, f"{int(span)} 秒沒有下載進度"))
+                continue
+
+            speed = delta / span
+            if speed >= self.speed_floor:
+                continue
+            # 照目前速度很快就能下完的不必重啟
+            total = task.get("total_bytes")
+            if total and (total - downloaded) / speed <= download_timeout:
+                continue
+            stalled.append((
+                task_id,
+                f"速度 {speed / 1024:.0f} KB/s 低於 {self.speed_floor / 1024:.0f} KB/s"
+            ))
+
+        for task_id, _ in stalled:
+            self._samples.pop(task_id, None)
+        return stalled
+
+    async def run(self, downloader):
+        """背景迴圈：定期檢查並重啟停滯的下載"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.enabled:
+                continue
+            try:
+                for task_id, reason in self.check(downloader.tasks, set(downloader.running_tasks)):
+                    if downloader.restart_stalled(task_id, reason):
+                        self.restart_count += 1
+                        self.history.append({
+                            "task_id": task_id,
+                            "reason": reason,
+                            "at": datetime.now().isoformat(),
+                        })
+            except Exception as e:
+                print(f"[停滯監視] 檢查錯誤: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得監視器狀態"""
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "speed_floor_kbps": round(self.speed_floor / 1024),
+            "download_timeout": self._download_timeout(),
+            "max_restarts": self.max_restarts,
+            "watching": len(self._samples),
+            "restarts": self.restart_count,
+            "history": list(self.history)[-10:],
+        }
+
+
+# 全域實例
+stall_watchdog = StallWatchdog.from_env()
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+測試環境：整個測試階段在暫存目錄執行
+各服務的資料庫、downloads/ 都是相對路徑且在匯入時就建立，測試中途不能再切換目錄
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.chdir(tempfile.mkdtemp(prefix="ytify-test-"))
+os.environ.setdefault("YTIFY_PERSISTENT_QUEUE", "false")
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+有界佇列的准入控制：積壓過深回 503 與 Retry-After；播放清單依實際影片數計入
+"""
+
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+
+def make_request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [],
+                    "query_string": b"", "client": ("10.0.0.1", 1234)})
+
+
+async def _blocker(event: asyncio.Event):
+    await event.wait()
+    return {"success": True}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    import api.routes as routes
+    from services.downloader import Downloader
+    from services.queue import TaskQueue
+
+    dl = Downloader()
+    queue = TaskQueue(max_concurrent=1, max_per_tenant=1, max_backlog=10)
+    monkeypatch.setattr(routes, "downloader", dl)
+    monkeypatch.setattr(routes, "download_queue", queue)
+    return routes, dl, queue
+
+
+def test_rejects_with_retry_after_when_backlog_full(env):
+    routes, dl, queue = env
+
+    async def run():
+        gate = asyncio.Event()
+        for i in range(11):
+            await queue.submit(f"t{i}", _blocker, gate)
+        assert queue.queue_length == 10
+        with pytest.raises(routes.HTTPException) as exc:
+            routes._check_admission(make_request(), None)
+        gate.set()
+        return exc.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    retry_after = int(error.headers["Retry-After"])
+    assert 1 <= retry_after <= 3600
+    assert error.detail["retry_after"] == retry_after
+    assert queue.rejected_count == 1
+
+
+def test_playlist_charges_resolved_entries(env, monkeypatch):
+    routes, dl, queue = env
+    videos = [{"url": f"https://www.youtube.com/watch?v=video{i:05d}", "title": f"v{i}"} for i in range(3)]
+
+    async def playlist_info(url):
+        return {"playlist_id": "PL1", "title": "清單", "video_count": 3, "videos": videos}
+
+    async def finish(task_id):
+        return {"success": True}
+
+    monkeypatch.setattr(dl, "get_playlist_info", playlist_info)
+    monkeypatch.setattr(dl, "execute_task", finish)
+    handler = routes.start_playlist_download.__wrapped__
+    req = routes.PlaylistDownloadRequest(url="https://www.youtube.com/playlist?list=PL1", max_videos=50)
+
+    async def run():
+        gate = asyncio.Event()
+        for i in range(6):
+            await queue.submit(f"t{i}", _blocker, gate)
+        assert queue.queue_length == 5
+        # 5 + 50 會超過上限，但清單實際只有 3 部
+        result = await handler(make_request(), req, None)
+        assert result["queued_count"] == 3
+        assert queue.queue_length == 8
+
+        # 再來一份就真的超過了
+        videos.extend({"url": f"https://www.youtube.com/watch?v=extra{i:05d}"} for i in range(3))
+        with pytest.raises(routes.HTTPException) as exc:
+            await handler(make_request(), req, None)
+        gate.set()
+        return exc.value
+
+    assert asyncio.run(run()).status_code == 503
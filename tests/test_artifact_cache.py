@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+成品快取：以硬連結收錄與交付（不多佔空間），索引重啟後沿用
+"""
+
+import os
+
+from services.artifact_cache import ArtifactCache, ArtifactStore
+
+
+def _download(cache, name, size=1000):
+    path = cache.download_path / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def _inode(path):
+    stat = path.stat()
+    return stat.st_dev, stat.st_ino
+
+
+def test_key_ignores_number_formatting():
+    key = ArtifactCache.make_key("v", "best", False, 5, 10)
+    assert key == ArtifactCache.make_key("v", "best", False, 5.0, 10.0)
+    assert key != ArtifactCache.make_key("v", "best", True, 5, 10)
+    assert key != ArtifactCache.make_key("v", "best", False)
+
+
+def test_add_and_materialize_share_one_inode(tmp_path):
+    cache = ArtifactCache(tmp_path)
+    original = _download(cache, "video.mp4")
+    key = cache.make_key("v", "best", False)
+    entry = cache.add(key, original, "v", "best", False, title="video")
+
+    stored = cache.path_of(entry)
+    assert _inode(stored) == _inode(original)
+    assert entry["size"] == 1000
+
+    hit = cache.lookup(key)
+    assert hit["hits"] == 1 and cache.hits == 1
+    # 第一個請求還沒取走：第二個請求拿到另一個檔名，仍是同一份資料
+    name = cache.materialize(hit, "task2")
+    assert name == "video (task2).mp4"
+    assert _inode(tmp_path / name) == _inode(original)
+
+    # 請求取走後刪除自己的檔案，不影響快取
+    original.unlink()
+    assert cache.materialize(cache.lookup(key), "task3") == "video.mp4"
+    assert stored.read_bytes() == (tmp_path / "video.mp4").read_bytes()
+
+
+def test_missing_file_drops_entry(tmp_path):
+    cache = ArtifactCache(tmp_path)
+    key = cache.make_key("v", "best", False)
+    entry = cache.add(key, _download(cache, "video.mp4"), "v", "best", False)
+    cache.path_of(entry).unlink()
+
+    assert cache.lookup(key) is None
+    assert cache.entries() == [] and cache.misses == 1
+
+
+def test_find_full_skips_clips(tmp_path):
+    cache = ArtifactCache(tmp_path)
+    full = cache.make_key("v", "best", False)
+    clip = cache.make_key("v", "best", False, 1, 2)
+    cache.add(full, _download(cache, "full.mp4"), "v", "best", False)
+    cache.add(clip, _download(cache, "clip.mp4"), "v", "best", False, 1, 2)
+
+    assert [entry["key"] for entry in cache.find_full("v")] == [full]
+    assert cache.find_full("other") == []
+
+
+def test_index_survives_restart(tmp_path):
+    db = str(tmp_path / "history.db")
+    cache = ArtifactCache(tmp_path, store=ArtifactStore(db))
+    key = cache.make_key("v", "best", True)
+    cache.add(key, _download(cache, "song.m4a"), "v", "best", True, title="song")
+    cache.lookup(key)
+
+    reloaded = ArtifactCache(tmp_path, store=ArtifactStore(db))
+    entry = reloaded.lookup(key)
+    assert entry["title"] == "song" and entry["hits"] == 2
+
+    assert reloaded.evict(key)
+    assert ArtifactCache(tmp_path, store=ArtifactStore(db)).entries() == []
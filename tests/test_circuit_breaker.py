@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+頻率限制斷路器測試：斷開 → 半開 → 探測 → 恢復，以及探測名額不會被沒連 YouTube 的任務卡住
+"""
+
+import time
+import asyncio
+
+from services.circuit_breaker import RateLimitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def open_breaker(cooldown: float = 0.05) -> RateLimitBreaker:
+    breaker = RateLimitBreaker(threshold=2, window=60, cooldown=cooldown, max_cooldown=1)
+    breaker.record_failure("direct")
+    breaker.record_failure("direct")
+    return breaker
+
+
+def test_opens_after_threshold():
+    breaker = RateLimitBreaker(threshold=2, window=60, cooldown=60)
+    breaker.record_failure("direct")
+    assert breaker.acquire("direct") == 0
+    breaker.record_failure("direct")
+    assert breaker._breakers["direct"].state == OPEN
+    assert breaker.acquire("direct") > 0
+    assert breaker.open_scopes() == ["direct"]
+    # 其他出口不受影響
+    assert breaker.acquire("http://proxy:8080") == 0
+
+
+def test_half_open_allows_single_probe_then_closes():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.acquire("direct") == 0
+    assert breaker._breakers["direct"].state == HALF_OPEN
+    # 探測進行中：其他請求要等
+    assert breaker.acquire("direct") > 0
+    breaker.record_success("direct")
+    assert breaker._breakers["direct"].state == CLOSED
+    assert breaker.acquire("direct") == 0
+
+
+def test_failed_probe_reopens_with_doubled_cooldown():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.acquire("direct") == 0
+    breaker.record_failure("direct")
+    state = breaker._breakers["direct"]
+    assert state.state == OPEN
+    assert state.cooldown == 0.1
+    assert breaker.acquire("direct") > 0
+
+
+def test_owner_release_only_frees_own_probe():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.acquire("direct") == 0
+    assert breaker.claim_probe("direct", "a")
+    assert not breaker.claim_probe("direct", "b")
+    breaker.release("direct", owner="b")
+    assert breaker.acquire("direct") > 0
+    breaker.release("direct", owner="a")
+    assert breaker.acquire("direct") == 0
+
+
+def test_cache_hit_after_cooldown_does_not_gate_queue(tmp_path, monkeypatch):
+    """冷卻結束後派發的任務命中成品快取（沒有連 YouTube），下一次派發不應被擋"""
+    import services.downloader as downloader_module
+    from services.artifact_cache import ArtifactCache
+    from services.queue import TaskQueue
+
+    downloads = tmp_path / "downloads"
+    downloads.mkdir(exist_ok=True)
+    cache = ArtifactCache(downloads)
+    breaker = open_breaker()
+    monkeypatch.setattr(downloader_module, "artifact_cache", cache)
+    monkeypatch.setattr(downloader_module, "rate_limit_breaker", breaker)
+
+    dl = downloader_module.Downloader()
+    dl.download_path = downloads
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    task_id = dl.create_task(url, format_option="720p", persist=False)
+    source = downloads / "video.mp4"
+    source.write_bytes(b"data")
+    key = dl._artifact_key(dl.tasks[task_id], "dQw4w9WgXcQ", "720p")
+    assert cache.add(key, source, "dQw4w9WgXcQ", dl._get_format_string("720p", False), False,
+                     title="video") is not None
+    source.unlink()
+
+    time.sleep(0.06)  # 冷卻結束，下一次派發會取得探測名額
+
+    async def run():
+        queue = TaskQueue(max_concurrent=2, max_per_tenant=2)
+        queue.dispatch_gate = dl.dispatch_wait
+        await queue.submit(task_id, dl.execute_task, task_id)
+        for _ in range(100):
+            if dl.tasks[task_id]["status"] == "completed" and queue.running_count == 0:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert dl.tasks[task_id]["status"] == "completed"
+    # 快取命中的任務已放回探測名額：下一次派發可以直接送出探測
+    assert dl.dispatch_wait() == 0
+    assert breaker._breakers["direct"].state == HALF_OPEN
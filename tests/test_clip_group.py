@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+片段組：重疊的片段合併成一次下載，剪出的每個片段長度與起點都要對
+（段落檔從起點前一個 keyframe 開始，偏移要以段落實際的起始時間計算）
+
+測試影片每幀的亮度是幀序號的兩倍，從輸出第一幀的亮度就能知道它在來源中的時間
+"""
+
+import re
+import shutil
+import asyncio
+import threading
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+FPS = 10
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _frames(path):
+    """輸出的 (視訊幀數, 第一幀的平均亮度)"""
+    proc = subprocess.run([
+        "ffmpeg", "-hide_banner", "-i", str(path), "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-",
+    ], capture_output=True, text=True)
+    means = re.findall(r"mean:\[(\d+)", proc.stderr)
+    return len(means), int(means[0]) if means else None
+
+
+def _make_source(path):
+    """12 秒測試影片，keyframe 每 2 秒一個；faststart 讓不支援 Range 的測試伺服器也能 seek"""
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"nullsrc=s=64x64:r={FPS},geq=lum='N*2':cb=128:cr=128",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", "12", "-c:v", "libx264", "-g", str(2 * FPS), "-keyint_min", str(2 * FPS),
+        "-sc_threshold", "0", "-bf", "0", "-c:a", "aac", "-shortest",
+        "-movflags", "+faststart", str(path),
+    ], check=True)
+
+
+def _check_clip(path, start, end):
+    frames, first = _frames(path)
+    assert frames == round((end - start) * FPS)
+    # 第一幀就是起點那一幀（重新編碼的亮度可能差 1）
+    assert abs(first - round(start * FPS) * 2) <= 1, (path.name, first)
+
+
+def test_section_plan_from_sorted_clips():
+    from services.downloader import Downloader
+
+    # 前後各留 1 秒、間隔 15 秒內的併成同一段
+    assert Downloader._merge_clip_sections([(40, 50), (3.3, 5.0), (4.1, 8.5)]) == [[2.3, 9.5], [39.0, 51.0]]
+    assert Downloader._merge_clip_sections([(0.5, 2), (100, 110)]) == [[0.0, 3], [99.0, 111.0]]
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="需要 ffmpeg 產生測試影片")
+def test_overlapping_clips_cut_from_section(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    _make_source(served / "video.mp4")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(served)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        from services.downloader import Downloader
+
+        dl = Downloader()
+        dl.execution_mode = "thread"
+        url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+        # 段落為 [2.3, 9.5]，前一個 keyframe 在 2 秒；第二段內有兩個 keyframe 會走智慧剪輯
+        clips = [(3.3, 5.0), (4.1, 8.5)]
+        created = dl.create_clip_tasks(url, clips, format_option="best")
+        leader, member = (item["task_id"] for item in created["clips"])
+        result = asyncio.run(dl.execute_task(leader))
+    finally:
+        server.shutdown()
+
+    assert result.get("success"), result
+    assert dl.tasks[member]["status"] == "completed"
+    for task_id, (start, end) in zip((leader, member), clips):
+        _check_clip(dl.download_path / dl.tasks[task_id]["filename"], start, end)
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="需要 ffmpeg 產生測試影片")
+def test_offsets_follow_section_start_time(tmp_path):
+    """沒有 edit list 的容器：段落檔從前一個 keyframe（2 秒）開始，不是要求的 2.3 秒"""
+    from services.downloader import Downloader
+
+    source = tmp_path / "video.mp4"
+    _make_source(source)
+    dl = Downloader()
+    dl.download_path = tmp_path
+    section = tmp_path / "2.3.mkv"
+    # 與片段組下載相同：-copyts 的輸入端 seek 加 stream copy
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-copyts",
+        "-ss", "2.3", "-t", "7.2", "-i", str(source), "-c", "copy", str(section),
+    ], check=True)
+
+    clips = [(3.3, 5.0), (4.1, 8.5)]
+    leader, member = (dl.create_task("https://www.youtube.com/watch?v=dQw4w9WgXcQ", clip_start=start,
+                                     clip_end=end, persist=False) for start, end in clips)
+    dl.tasks[leader]["clip_members"] = [leader, member]
+    dl.tasks[member]["clip_leader"] = leader
+    result = dl._sync_cut_clip_group(leader, {
+        "clip_spans": [{"path": str(section), "start": 2.3, "end": 9.5}],
+        "video_id": "dQw4w9WgXcQ", "format": "best", "meta": {"title": "section"},
+    })
+
+    assert result.get("success"), result
+    for task_id, (start, end) in zip((leader, member), clips):
+        _check_clip(tmp_path / dl.tasks[task_id]["filename"], start, end)
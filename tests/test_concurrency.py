@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+AIMD 併發控制：位元組計量（續傳不算成一次暴衝）與加開、減半、退回
+"""
+
+from services.concurrency import AdaptiveConcurrency
+
+
+def test_resume_does_not_count_earlier_bytes():
+    controller = AdaptiveConcurrency()
+    for downloaded in (1000, 5000, 9000):
+        controller.record_progress("a", downloaded)
+    assert controller._window_bytes == 8000
+
+    # 暫停：任務結束清除基準；續傳的第一筆含先前的 9000 bytes，只當新基準
+    controller.forget_task("a")
+    controller.record_progress("a", 9500)
+    controller.record_progress("a", 12000)
+    assert controller._window_bytes == 8000 + 2500
+
+    # 視訊下完換音訊：數值變小，整筆計入
+    controller.record_progress("a", 300)
+    assert controller._window_bytes == 8000 + 2500 + 300
+
+
+def test_increase_then_back_off_without_gain():
+    controller = AdaptiveConcurrency(initial=2, floor=1, ceiling=4, cooldown=0)
+    controller.record_progress("a", 0)
+    controller.record_progress("a", 10_000)
+    assert controller.evaluate(running=2, queued=5) == 3
+    # 加開後總速度沒有提升：退回
+    controller.record_progress("a", 10_100)
+    assert controller.evaluate(running=3, queued=5) == 2
+
+
+def test_rate_limit_halves_and_respects_floor():
+    controller = AdaptiveConcurrency(initial=4, floor=1, ceiling=8)
+    controller.record_rate_limit()
+    assert controller.evaluate(running=4, queued=0) == 2
+    controller.record_rate_limit()
+    assert controller.evaluate(running=2, queued=0) == 1
+    controller.record_rate_limit()
+    assert controller.evaluate(running=1, queued=0) is None
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+執行緒池飽和度指標：取消排隊中或執行中的工作，排隊數只扣一次
+"""
+
+import time
+import asyncio
+import threading
+
+from services.executors import BoundedExecutor
+
+
+def test_queued_count_survives_cancellation():
+    executor = BoundedExecutor("test", 1)
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        waiting = [asyncio.ensure_future(executor.run(time.sleep, 0)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.get_stats()["active"] == 1
+        assert executor.get_stats()["queued"] == 3
+
+        # 排隊中與執行中的工作都被取消：執行中的照樣跑完，排隊數不會被多扣
+        for future in waiting + [running]:
+            future.cancel()
+        await asyncio.gather(*waiting, running, return_exceptions=True)
+        release.set()
+        await asyncio.sleep(0.05)
+        # 被取消的 asyncio future 不會等池中的工作，新工作仍能正常執行
+        assert await executor.run(sum, (1, 2)) == 3
+
+    asyncio.run(run())
+    stats = executor.get_stats()
+    assert stats["queued"] == 0
+    assert stats["active"] == 0
+    executor.shutdown(wait=True)
+
+
+def test_call_runs_inline_on_own_thread():
+    executor = BoundedExecutor("inline", 1)
+    # 已在池的執行緒中再 call 同一個池：直接執行，不會自己等自己
+    result = executor.call(lambda: executor.call(lambda: threading.current_thread().name))
+    assert result.startswith("ytify-inline")
+    assert executor.get_stats()["queued"] == 0
+    executor.shutdown(wait=True)
+
+
+def test_cancel_racing_with_start_dequeues_once():
+    executor = BoundedExecutor("race", 1)
+    job = executor._wrap(sum, ((1, 2),), {})
+    # 取消處理先扣了排隊數，之後工作仍被池中的執行緒取走執行
+    with executor._lock:
+        executor._dequeue(job)
+    assert job.wrapper() == 3
+    assert executor.get_stats()["queued"] == 0
+    executor.shutdown(wait=True)
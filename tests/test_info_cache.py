@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+影片資訊快取：info TTL 與格式 URL 到期、出口綁定、LRU 淘汰；
+同一支影片併發的 /api/info 共用同一次擷取
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from services.info_cache import InfoCache, NegativeCache, url_expiry
+
+
+def make_info(video_id, expire=None, padding=0):
+    query = f"&expire={int(expire)}" if expire else ""
+    return {
+        "id": video_id,
+        "title": video_id,
+        "description": "x" * padding,
+        "formats": [
+            {"format_id": "18", "url": f"https://rr1.googlevideo.com/videoplayback?id={video_id}{query}"},
+        ],
+    }
+
+
+def test_url_expiry_takes_earliest_format():
+    info = make_info("a", expire=2_000)
+    info["formats"].append({"manifest_url": "https://manifest.googlevideo.com/api/manifest/dash/expire/1500/x"})
+    assert url_expiry(info) == 1500
+    assert url_expiry(make_info("b")) is None
+
+
+def test_info_ttl_and_download_expiry():
+    cache = InfoCache(info_ttl=60, margin=100, default_ttl=600)
+    cache.put("a", make_info("a", expire=time.time() + 1000), egress="direct", extract_seconds=2)
+
+    assert cache.get_info("a")["id"] == "a"
+    assert cache.get("a", "direct")["id"] == "a"
+    # 格式 URL 綁定出口 IP
+    assert cache.get("a", "http://proxy:8080") is None
+
+    # 超過 info TTL：/api/info 重新擷取，但 URL 還沒到期的下載仍可沿用
+    cache._entries["a"]["cached_at"] -= 61
+    assert cache.get_info("a") is None
+    assert cache.get("a", "direct") is not None
+
+    # 距離 URL 到期不到 margin：下載也不再沿用
+    cache._entries["a"]["url_expires_at"] = time.time() - 1
+    assert cache.get("a", "direct") is None
+
+    stats = cache.get_stats()
+    assert stats["info"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert stats["download"]["hits"] == 2 and stats["download"]["misses"] == 2
+    assert stats["saved_seconds"] == 6
+
+
+def test_entry_expires_and_non_video_is_skipped():
+    cache = InfoCache(info_ttl=60, default_ttl=600)
+    cache.put("a", make_info("a"), egress="direct")
+    entry = cache._entries["a"]
+    # 沒有 expire 參數時以 default_ttl 保存
+    assert 599 <= entry["url_expires_at"] - entry["cached_at"] <= 601
+    entry["expires_at"] = time.time() - 1
+    assert cache.get_info("a") is None
+    assert "a" not in cache._entries and cache.expired == 1
+
+    cache.put("pl", {"_type": "playlist", "id": "pl", "entries": []}, egress="direct")
+    assert "pl" not in cache._entries
+
+
+def test_download_copy_is_independent():
+    cache = InfoCache()
+    cache.put("a", make_info("a"), egress="direct")
+    cache.get("a", "direct")["formats"].clear()
+    assert cache.get("a", "direct")["formats"]
+
+
+def test_lru_eviction_by_count_and_size():
+    cache = InfoCache(max_entries=2)
+    for video_id in ("a", "b"):
+        cache.put(video_id, make_info(video_id), egress="direct")
+    # 最近用過的 a 保留，淘汰 b
+    cache.get_info("a")
+    cache.put("c", make_info("c"), egress="direct")
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.evicted == 1
+
+    size = cache._entries["a"]["size"]
+    cache = InfoCache(max_bytes=int(size * 2.5))
+    for video_id in ("a", "b", "c"):
+        cache.put(video_id, make_info(video_id), egress="direct")
+    assert list(cache._entries) == ["b", "c"]
+    assert cache._bytes == sum(e["size"] for e in cache._entries.values())
+
+    # 單筆就超過上限時仍保留最新的一筆
+    cache.put("big", make_info("big", padding=size * 3), egress="direct")
+    assert list(cache._entries) == ["big"]
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    import services.downloader as downloader_module
+
+    monkeypatch.setattr(downloader_module, "info_cache", InfoCache())
+    monkeypatch.setattr(downloader_module, "negative_cache", NegativeCache())
+    return downloader_module.Downloader(), downloader_module.info_cache
+
+
+def test_concurrent_misses_share_one_extraction(downloader, monkeypatch):
+    dl, cache = downloader
+    calls = []
+
+    def fake_extract(url):
+        calls.append(url)
+        time.sleep(0.2)
+        return {"id": "dQw4w9WgXcQ", "title": "shared"}
+
+    monkeypatch.setattr(dl, "_sync_get_video_info", fake_extract)
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    async def run():
+        return await asyncio.gather(*(dl.get_video_info(url) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result["title"] == "shared" for result in results)
+    assert cache.coalesced == 4
+    assert dl._info_inflight == {}
+
+
+def test_shared_extraction_failure_reaches_every_waiter(downloader, monkeypatch):
+    dl, _ = downloader
+    calls = []
+
+    def failing_extract(url):
+        calls.append(url)
+        time.sleep(0.1)
+        raise RuntimeError("extract failed")
+
+    monkeypatch.setattr(dl, "_sync_get_video_info", failing_extract)
+    url = "https://youtu.be/dQw4w9WgXcQ"
+
+    async def run():
+        return await asyncio.gather(*(dl.get_video_info(url) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # 失敗不會留下進行中的紀錄，下一次請求重新擷取
+    asyncio.run(run())
+    assert len(calls) == 2
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+負快取：原因明確的失敗保存完整秒數、原因不明確的只保存很短、暫時性的不保存；
+下載失敗只依最後一次的原始錯誤判斷，取消的任務不寫入
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from services.info_cache import NegativeCache
+
+PRIVATE = "ERROR: [youtube] dQw4w9WgXcQ: Private video. Sign in if you've been granted access to this video"
+BOT = "ERROR: [youtube] dQw4w9WgXcQ: Sign in to confirm you're not a bot"
+
+
+def make_cache() -> NegativeCache:
+    return NegativeCache(ttls={"private_video": 3600, "unavailable": 21600}, ambiguous_ttl=300)
+
+
+def test_ttl_depends_on_how_clear_the_error_is():
+    cache = make_cache()
+    assert cache.classify("private_video", PRIVATE) == ("private_video", 3600)
+    # 分類說私人影片、訊息卻看不出原因：只保存很短的時間
+    assert cache.classify("private_video", "ERROR: unable to extract player response") == ("private_video", 300)
+    # 訊息指出的原因優先於分類
+    assert cache.classify("unavailable", PRIVATE) == ("private_video", 3600)
+    assert cache.classify("private_video", BOT)[1] == 0
+    assert cache.classify("network", "HTTP Error 503")[1] == 0
+
+
+def test_put_get_and_expiry():
+    cache = make_cache()
+    cache.put("a", "private_video", "私人影片", PRIVATE)
+    cache.put("b", "private_video", "私人影片", BOT)
+    cache.put("c", "network", "網路錯誤", "timed out")
+    assert cache.get("a")["category"] == "private_video"
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+
+    cache._entries["a"]["expires_at"] = time.time() - 1
+    assert cache.get("a") is None
+
+
+def test_lru_bound():
+    cache = NegativeCache(ttls={"private_video": 3600}, max_entries=2)
+    for video_id in ("a", "b", "c"):
+        cache.put(video_id, "private_video", "私人影片", PRIVATE)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    import services.downloader as downloader_module
+
+    cache = make_cache()
+    monkeypatch.setattr(downloader_module, "negative_cache", cache)
+    return downloader_module.Downloader(), cache
+
+
+def _run_with_result(dl, monkeypatch, result, history):
+    task_id = dl.create_task("https://www.youtube.com/watch?v=dQw4w9WgXcQ", persist=False)
+
+    def fake_download(tid):
+        dl.tasks[tid]["error_history"] = history
+        return dict(result)
+
+    monkeypatch.setattr(dl, "_sync_execute_download", fake_download)
+    return asyncio.run(dl.execute_task(task_id))
+
+
+def test_download_failure_uses_final_error(downloader, monkeypatch):
+    dl, cache = downloader
+    # 停滯紀錄排在錯誤歷史最後，原因要看最後一次的原始錯誤
+    history = [{"category": "private_video", "message": PRIVATE}, {"category": "stalled", "message": "停滯"}]
+    _run_with_result(dl, monkeypatch, {
+        "success": False, "error": "私人影片", "error_category": "private_video", "last_error": PRIVATE,
+    }, history)
+    entry = cache.get("dQw4w9WgXcQ")
+    assert entry is not None
+    assert entry["expires_at"] - time.time() > 3000
+
+
+def test_cancelled_download_is_not_cached(downloader, monkeypatch):
+    dl, cache = downloader
+    _run_with_result(dl, monkeypatch, {
+        "success": False, "error": "任務已取消", "cancelled": True,
+        "error_category": "private_video", "last_error": PRIVATE,
+    }, [{"category": "private_video", "message": PRIVATE}])
+    assert cache.get("dQw4w9WgXcQ") is None
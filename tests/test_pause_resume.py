@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+暫停／恢復狀態轉換：排隊中、延遲區等待重試的任務都立即停下，恢復後重新排隊
+"""
+
+import asyncio
+
+import pytest
+
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def env(monkeypatch):
+    import api.routes as routes
+    from services.downloader import Downloader
+    from services.queue import TaskQueue
+
+    dl = Downloader()
+    queue = TaskQueue(max_concurrent=1, max_per_tenant=1)
+    monkeypatch.setattr(routes, "downloader", dl)
+    monkeypatch.setattr(routes, "download_queue", queue)
+    return routes, dl, queue
+
+
+async def _blocker(event: asyncio.Event):
+    await event.wait()
+    return {"success": True}
+
+
+def test_pause_queued_task_leaves_queue(env):
+    routes, dl, queue = env
+
+    async def run():
+        gate = asyncio.Event()
+        await queue.submit("blocker", _blocker, gate)
+        task_id = dl.create_task(URL, persist=False)
+        await queue.submit(task_id, _blocker, gate)
+        assert queue.get_queue_position(task_id) == 1
+
+        await routes.pause_task(task_id)
+        assert dl.tasks[task_id]["status"] == "paused"
+        assert queue.queue_length == 0
+        # 排隊中的任務沒有在下載，不應留下停下的要求
+        assert not dl.is_paused(task_id)
+
+        with pytest.raises(routes.HTTPException):
+            await routes.pause_task(task_id)
+        gate.set()
+        return task_id
+
+    task_id = asyncio.run(run())
+    assert dl.resume_task(task_id)["success"]
+    assert dl.tasks[task_id]["status"] == "queued"
+
+
+def test_pause_task_waiting_for_retry(env, monkeypatch):
+    routes, dl, queue = env
+    task_id = dl.create_task(URL, persist=False)
+
+    async def fail_once(tid):
+        dl.tasks[tid]["status"] = "retrying"
+        return {"success": False, "error": "HTTP Error 503", "retry_after": 60}
+
+    async def finish(tid):
+        dl.tasks[tid]["status"] = "completed"
+        return {"success": True}
+
+    async def run():
+        await queue.submit(task_id, fail_once, task_id)
+        for _ in range(100):
+            if task_id in queue._delayed:
+                break
+            await asyncio.sleep(0.01)
+        assert task_id in queue._delayed
+
+        await routes.pause_task(task_id)
+        # 不必等 60 秒的重試時間：立即完成暫停並離開延遲區
+        assert dl.tasks[task_id]["status"] == "paused"
+        assert not dl.is_paused(task_id)
+        assert task_id not in queue._delayed
+        assert queue.get_stats()["delayed"] == 0
+
+        monkeypatch.setattr(dl, "execute_task", finish)
+        await routes.resume_task(task_id)
+        for _ in range(100):
+            if dl.tasks[task_id]["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert dl.tasks[task_id]["status"] == "completed"
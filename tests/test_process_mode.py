@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+子程序執行模式冒煙測試
+YTIFY_EXECUTION_MODE=process 時，以本機 HTTP 伺服器提供的測試影片完整跑一次
+Downloader.execute_task（主程序組設定 → 子程序下載 → 事件回傳主程序）
+
+用法: python -m pytest tests/test_process_mode.py
+"""
+
+import shutil
+import asyncio
+import threading
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="需要 ffmpeg 產生測試影片")
+def test_process_mode_download(tmp_path, monkeypatch):
+    # 子程序（spawn）沿用測試階段的工作目錄與這些環境變數
+    monkeypatch.setenv("YTIFY_EXECUTION_MODE", "process")
+    monkeypatch.setenv("YTIFY_ARTIFACT_CACHE", "false")
+
+    served = tmp_path / "served"
+    served.mkdir()
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=320x180:rate=30",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", "2", "-c:v", "libx264", "-preset", "ultrafast",
+        "-c:a", "aac", "-shortest", str(served / "video.mp4"),
+    ], check=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(served)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        from services.downloader import Downloader
+
+        dl = Downloader()
+        assert dl.execution_mode == "process"
+        task_id = dl.create_task(f"http://127.0.0.1:{server.server_address[1]}/video.mp4", persist=False)
+        result = asyncio.run(dl.execute_task(task_id))
+    finally:
+        server.shutdown()
+
+    assert result.get("success"), result
+    assert (dl.download_path / result["filename"]).is_file()
+    assert dl.tasks[task_id]["status"] == "completed"
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+任務佇列：租戶間的加權公平派發、通道名額與取消後的排隊位置
+"""
+
+import asyncio
+
+from services.queue import TaskQueue
+
+
+class Jobs:
+    """記錄派發順序；hold=True 的任務會一直佔著名額直到 release()"""
+
+    def __init__(self):
+        self.order = []
+        self.gate = asyncio.Event()
+
+    async def run(self, task_id, hold=False):
+        self.order.append(task_id)
+        if hold:
+            await self.gate.wait()
+        return {"success": True}
+
+    def release(self):
+        self.gate.set()
+
+
+async def drain(queue: TaskQueue):
+    for _ in range(1000):
+        if not queue.running_count and not queue.queue_length:
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("佇列沒有清空")
+
+
+def meta(tenant, role=None, **extra):
+    return {"session_id": tenant, "user_role": role, **extra}
+
+
+def test_weighted_fair_share_between_tenants():
+    async def run():
+        queue = TaskQueue(max_concurrent=1, max_per_tenant=1)
+        jobs = Jobs()
+        await queue.submit("blocker", jobs.run, "blocker", True, meta=meta("x"))
+        # 訪客（權重 1）先排了一長串，一般用戶（權重 2）後到
+        for i in range(6):
+            await queue.submit(f"guest{i}", jobs.run, f"guest{i}", meta=meta("guest", "guest"))
+        for i in range(6):
+            await queue.submit(f"user{i}", jobs.run, f"user{i}", meta=meta("user", "user"))
+        jobs.release()
+        await drain(queue)
+        return jobs.order[1:]
+
+    order = asyncio.run(run())
+    # 同租戶內維持 FIFO
+    assert [t for t in order if t.startswith("guest")] == [f"guest{i}" for i in range(6)]
+    # 權重 2 的租戶拿到兩倍的派發次數，不必等前面的長串
+    first = order[:6]
+    assert sum(t.startswith("user") for t in first) == 4
+    assert first[1].startswith("user")
+
+
+def test_max_per_tenant_leaves_slots_for_others():
+    async def run():
+        queue = TaskQueue(max_concurrent=3, max_per_tenant=2)
+        jobs = Jobs()
+        for i in range(5):
+            await queue.submit(f"a{i}", jobs.run, f"a{i}", True, meta=meta("a"))
+        running_before = set(queue.running_task_ids)
+        await queue.submit("b0", jobs.run, "b0", True, meta=meta("b"))
+        running_after = set(queue.running_task_ids)
+        jobs.release()
+        await drain(queue)
+        return running_before, running_after
+
+    before, after = asyncio.run(run())
+    assert before == {"a0", "a1"}
+    assert after == {"a0", "a1", "b0"}
+
+
+def test_seq_counter_matches_brute_force():
+    import random
+    from services.queue import SeqCounter
+
+    rng = random.Random(7)
+    counter = SeqCounter()
+    live = []
+    for _ in range(3000):
+        if live and rng.random() < 0.4:
+            seq = live.pop(rng.randrange(len(live)))
+            counter.add(seq, -1)
+        else:
+            # 放回最前面的任務序號會往負數走
+            seq = rng.randrange(-200, 2000)
+            live.append(seq)
+            counter.add(seq)
+        probe = rng.randrange(-250, 2100)
+        assert counter.count_below(probe) == sum(1 for s in live if s < probe)
+        assert len(counter) == len(live)
+
+
+def test_positions_after_cancellations():
+    async def run():
+        queue = TaskQueue(max_concurrent=1, max_per_tenant=1)
+        jobs = Jobs()
+        await queue.submit("blocker", jobs.run, "blocker", True, meta=meta("x"))
+        ids = [f"t{i}" for i in range(20)]
+        await queue.submit_many([
+            (task_id, jobs.run, (task_id,), meta("a", playlist_id="PL1" if i % 2 else "PL0"))
+            for i, task_id in enumerate(ids)
+        ])
+        for task_id in ("t0", "t3", "t4", "t10"):
+            assert await queue.cancel(task_id)
+        remaining = [t for t in ids if t not in ("t0", "t3", "t4", "t10")]
+        assert [queue.get_queue_position(t) for t in remaining] == list(range(1, len(remaining) + 1))
+        assert queue.get_queue_position("t3") == 0
+
+        # 整批取消一個播放清單（奇數序號）後，同一通道的其餘任務往前遞補
+        removed = await queue.cancel_group("PL1")
+        assert sorted(removed) == sorted(t for t in remaining if int(t[1:]) % 2)
+        remaining = [t for t in remaining if t not in removed]
+        assert [queue.get_queue_position(t) for t in remaining] == list(range(1, len(remaining) + 1))
+        assert queue.queue_length == len(remaining)
+
+        jobs.release()
+        await drain(queue)
+        return jobs.order[1:], remaining
+
+    order, remaining = asyncio.run(run())
+    # 取消的任務不會被派發
+    assert order == remaining
+
+
+def test_lanes_fill_reserved_slots_before_bursting():
+    async def run():
+        queue = TaskQueue(max_concurrent=1, max_per_tenant=10, preemption=False)
+        jobs = Jobs()
+        await queue.submit("blocker", jobs.run, "blocker", True, meta=meta("x"))
+        lane_meta = {
+            "interactive": {},
+            "clip": {"clip_start": 1, "clip_end": 5},
+            "audio": {"audio_only": True},
+            "bulk": {"playlist_id": "PL"},
+        }
+        for lane, extra in lane_meta.items():
+            for i in range(3):
+                task_id = f"{lane}{i}"
+                await queue.submit(task_id, jobs.run, task_id, True, meta=meta(task_id, **extra))
+
+        running = {}
+        # 多出的名額先補足每個通道的保留名額，即使單支影片通道排在最前面
+        await queue.set_max_concurrent(4)
+        running[4] = {name: lane.running for name, lane in queue.lanes.items()}
+        # 保留名額都滿了才依優先順序借用：單支影片不設上限，片段最多 2 個
+        await queue.set_max_concurrent(8)
+        running[8] = {name: lane.running for name, lane in queue.lanes.items()}
+        jobs.release()
+        await drain(queue)
+        return running
+
+    running = asyncio.run(run())
+    assert running[4] == {"interactive": 1, "clip": 1, "audio": 1, "bulk": 1}
+    assert running[8] == {"interactive": 4, "clip": 2, "audio": 1, "bulk": 1}
+
+
+def test_bulk_lane_leaves_a_slot_free():
+    async def run():
+        queue = TaskQueue(max_concurrent=3, max_per_tenant=10, preemption=False)
+        jobs = Jobs()
+        for i in range(5):
+            await queue.submit(f"pl{i}", jobs.run, f"pl{i}", True, meta=meta("a", playlist_id="PL"))
+        bulk_only = queue.running_count
+        # 留下的名額讓後到的單支影片不必等整個播放清單
+        await queue.submit("single", jobs.run, "single", True, meta=meta("b"))
+        started = "single" in queue.running_task_ids
+        jobs.release()
+        await drain(queue)
+        return bulk_only, started, jobs.order
+
+    bulk_only, started, order = asyncio.run(run())
+    assert bulk_only == 2
+    assert started
+    assert sorted(order) == sorted([f"pl{i}" for i in range(5)] + ["single"])
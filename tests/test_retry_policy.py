@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+自適應重試：抖動範圍、從結果學到的基準延遲、單一任務與全域預算
+"""
+
+import time
+import random
+
+from services.retry_policy import AdaptiveRetryPolicy, RetryStatsStore, MAX_RETRY_DELAY
+
+
+def _delays(policy, attempt, default=10, scope="direct", n=500):
+    return [policy.next_delay("rate_limit", scope, attempt, default) for _ in range(n)]
+
+
+def test_equal_jitter_stays_within_half_to_full_backoff():
+    random.seed(1)
+    policy = AdaptiveRetryPolicy(explore_rate=0)
+    for attempt in range(8):
+        delay = min(10 * 2 ** attempt, MAX_RETRY_DELAY)
+        samples = _delays(policy, attempt)
+        assert delay / 2 - 0.05 <= min(samples) and max(samples) <= delay + 0.05
+        # 抖動確實有散開，而不是固定值
+        assert max(samples) - min(samples) > delay / 4
+    assert policy.next_delay("rate_limit", "direct", 0, 0) == 0
+
+
+def test_exploration_halves_the_base():
+    random.seed(2)
+    policy = AdaptiveRetryPolicy(explore_rate=1)
+    samples = _delays(policy, 0)
+    assert 2.45 <= min(samples) and max(samples) <= 5.05
+
+
+def test_learns_shortest_delay_that_works():
+    random.seed(3)
+    policy = AdaptiveRetryPolicy(explore_rate=0)
+    for _ in range(3):
+        policy.record_outcome("rate_limit", "direct", 2.5, False)
+        policy.record_outcome("rate_limit", "direct", 40, True)
+        policy.record_outcome("rate_limit", "direct", 100, True)
+    # 2.5 秒不夠、40 秒成功率達標：基準延遲為 40 秒，而不是靜態設定的 10 秒
+    samples = _delays(policy, 0)
+    assert 19.95 <= min(samples) and max(samples) <= 40.05
+    # 其他出口沒有自己的樣本時沿用所有出口合併的統計
+    samples = _delays(policy, 0, scope="http://proxy:8080")
+    assert 19.95 <= min(samples) and max(samples) <= 40.05
+
+
+def test_doubles_longest_delay_when_nothing_works():
+    policy = AdaptiveRetryPolicy(explore_rate=0)
+    for _ in range(3):
+        policy.record_outcome("bot_detection", "direct", 30, False)
+    stats = policy.get_stats()["learned"]["bot_detection"]["direct"]
+    assert stats["base_delay"] == 60
+    assert stats["buckets"] == [{"delay": 30, "attempts": 3, "success_rate": 0}]
+
+
+def test_learned_table_survives_restart(tmp_path):
+    store = RetryStatsStore(str(tmp_path / "history.db"))
+    policy = AdaptiveRetryPolicy(store=store, explore_rate=0)
+    for _ in range(3):
+        policy.record_outcome("network", "direct", 5, True)
+
+    reloaded = AdaptiveRetryPolicy(store=RetryStatsStore(str(tmp_path / "history.db")))
+    assert reloaded.get_stats()["learned"]["network"]["direct"]["base_delay"] == 5
+
+
+def test_task_budget_limits_count_and_total_wait():
+    policy = AdaptiveRetryPolicy(task_budget=3, task_delay_budget=100, budget_min=100)
+    assert policy.acquire_retry(2, 50, 50) is None
+    assert "上限" in policy.acquire_retry(3, 0, 1)
+    assert "100" in policy.acquire_retry(0, 60, 41)
+    assert policy.denied_count == 2
+
+
+def test_global_budget_scales_with_attempts_and_expires():
+    policy = AdaptiveRetryPolicy(budget_min=2, budget_ratio=0.5, budget_window=0.2)
+    for _ in range(4):
+        policy.record_attempt()
+    # 2 + 4 × 0.5 = 4 次
+    assert policy.budget_remaining() == 4
+    assert all(policy.acquire_retry(0, 0, 1) is None for _ in range(4))
+    assert policy.acquire_retry(0, 0, 1) == "整體重試過於頻繁，暫停重試"
+    assert policy.denied_count == 1
+
+    # 視窗過後嘗試與重試都不再計入，回到最低保障
+    time.sleep(0.3)
+    assert policy.budget_remaining() == 2
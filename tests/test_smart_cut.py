@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+智慧剪輯的切點計算：兩端不完整的 GOP 重新編碼、中間完整的 GOP 直接複製
+
+測試封包為 10 fps、每 2 秒一個 keyframe 的 12 秒影片
+"""
+
+import pytest
+
+from services.smart_cut import SmartCutter
+
+PACKETS = [(i / 10, i % 20 == 0) for i in range(120)]
+
+
+def _parts(plan):
+    return {name: (plan[name]["start"], plan[name]["frames"]) for name in ("head", "copy", "tail")}
+
+
+def test_plan_splits_at_keyframes():
+    plan = SmartCutter.plan(PACKETS, 3.3, 8.5)
+    assert plan["start"] == pytest.approx(3.3)
+    assert plan["end"] == pytest.approx(8.5)
+    assert _parts(plan) == {
+        "head": (pytest.approx(3.3), 7),
+        "copy": (4.0, 40),
+        "tail": (8.0, 5),
+    }
+    # 複製段前面的封包數（串接時依序號切開來源）
+    assert plan["copy"]["index"] == 40
+    assert plan["head"]["duration"] == pytest.approx(0.7)
+    assert plan["copy"]["duration"] == pytest.approx(4.0)
+    assert plan["tail"]["duration"] == pytest.approx(0.5)
+
+
+def test_plan_on_keyframe_boundaries_needs_no_encoding():
+    plan = SmartCutter.plan(PACKETS, 4.0, 8.0)
+    # 結尾剛好接著下一個 keyframe：最後一個 GOP 也完整，兩端都不用重新編碼
+    assert _parts(plan) == {"head": (4.0, 0), "copy": (4.0, 40), "tail": (pytest.approx(8.0), 0)}
+    assert plan["tail"]["duration"] == pytest.approx(0)
+
+
+def test_plan_runs_to_end_of_source():
+    plan = SmartCutter.plan(PACKETS, 9.3, 20)
+    assert plan["end"] == pytest.approx(12.0)
+    assert _parts(plan) == {"head": (pytest.approx(9.3), 7), "copy": (10.0, 20), "tail": (pytest.approx(12.0), 0)}
+
+
+def test_plan_tolerates_rounded_timestamps():
+    # 要求的起點比幀時間多一點點（浮點誤差）仍算同一幀
+    plan = SmartCutter.plan(PACKETS, 4.00005, 8.5)
+    assert plan["start"] == 4.0 and plan["head"]["frames"] == 0
+
+
+@pytest.mark.parametrize("start, end", [
+    (4.5, 5.5),    # 中間沒有 keyframe
+    (3.5, 4.5),    # 只有一個 keyframe，後面的 GOP 不完整
+    (5.0, 5.05),   # 不到兩幀
+])
+def test_plan_without_full_gop_falls_back(start, end):
+    assert SmartCutter.plan(PACKETS, start, end) is None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+空間管理：超過預算時依 LRU / LFU 淘汰快取成品，但跳過還有請求待取的成品（同一個 inode）；
+逾期未取的檔案刪除後，成品才可被淘汰
+"""
+
+import os
+import time
+
+import pytest
+
+from services.artifact_cache import ArtifactCache
+from services.storage import StorageManager
+
+SIZE = 1000
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    import services.artifact_cache as artifact_module
+
+    cache = ArtifactCache(tmp_path)
+    monkeypatch.setattr(artifact_module, "artifact_cache", cache)
+    # 只看預算，不受測試機器的剩餘空間影響
+    monkeypatch.setattr(StorageManager, "_disk_floor_bytes", staticmethod(lambda: 0))
+    return cache
+
+
+def _artifact(cache, name, last_access, hits=0, pending=False):
+    """收錄一個成品；pending=False 時請求已取走（只剩快取）"""
+    path = cache.download_path / name
+    path.write_bytes(os.urandom(SIZE))
+    key = cache.make_key(name, "best", False)
+    cache.add(key, path, name, "best", False)
+    cache._entries[key].update(last_access=last_access, hits=hits)
+    if not pending:
+        path.unlink()
+    return key
+
+
+def _cached(cache):
+    return sorted(entry["video_id"] for entry in cache.entries())
+
+
+def test_lru_skips_pinned_inode(cache, tmp_path):
+    _artifact(cache, "a", "2026-01-01", pending=True)
+    _artifact(cache, "b", "2026-01-02")
+    _artifact(cache, "c", "2026-01-03")
+    manager = StorageManager(tmp_path, budget_bytes=2 * SIZE)
+
+    # 最舊的 a 還有請求待取，淘汰它也釋放不了空間：改淘汰 b
+    assert manager.enforce() == 1
+    assert _cached(cache) == ["a", "c"]
+    assert manager.last_usage == 2 * SIZE
+    assert manager.evictions == 1 and manager.evicted_bytes == SIZE
+
+    # 已在預算內就不再淘汰
+    assert manager.enforce() == 0
+
+
+def test_lfu_evicts_least_hit(cache, tmp_path):
+    _artifact(cache, "a", "2026-01-01", hits=9)
+    _artifact(cache, "b", "2026-01-03", hits=1)
+    _artifact(cache, "c", "2026-01-02", hits=5)
+    manager = StorageManager(tmp_path, budget_bytes=2 * SIZE, policy="lfu")
+
+    assert manager.enforce() == 1
+    assert _cached(cache) == ["a", "c"]
+
+
+def test_everything_pinned_evicts_nothing(cache, tmp_path):
+    _artifact(cache, "a", "2026-01-01", pending=True)
+    _artifact(cache, "b", "2026-01-02", pending=True)
+    manager = StorageManager(tmp_path, budget_bytes=SIZE)
+
+    assert manager.enforce() == 0
+    assert _cached(cache) == ["a", "b"]
+
+
+def test_expired_pending_file_unpins_artifact(cache, tmp_path):
+    _artifact(cache, "a", "2026-01-01", pending=True)
+    manager = StorageManager(tmp_path, budget_bytes=SIZE // 2)
+    manager.acquire("a")
+    manager._pending["a"] = time.time() - 1
+
+    assert manager.enforce() == 1
+    assert manager.expired == 1
+    assert not (tmp_path / "a").exists() and _cached(cache) == []
+
+
+def test_release_only_touches_top_level_files(cache, tmp_path):
+    _artifact(cache, "a", "2026-01-01", pending=True)
+    stored = cache.path_of(cache.entries()[0])
+    manager = StorageManager(tmp_path)
+
+    assert not manager.release(f".artifacts/{stored.name}")
+    assert not manager.release("..")
+    assert manager.release("a")
+    assert stored.is_file()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+暫存檔隔離測試：yt-dlp 的 .part 檔放在任務專用目錄，
+取消一個任務不會刪掉其他暫停中任務要續傳的檔案
+"""
+
+import shutil
+import asyncio
+import threading
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def test_cancel_only_removes_own_temp_files(tmp_path):
+    from services.downloader import Downloader
+
+    dl = Downloader()
+    dl.download_path = tmp_path
+    paused = dl._temp_dir("paused-task")
+    cancelled = dl._temp_dir("cancelled-task")
+    for folder in (paused, cancelled):
+        folder.mkdir(parents=True)
+        (folder / "video.f137.mp4.part").write_bytes(b"partial")
+    finished = tmp_path / "other.mp4.part.mp4"
+    finished.write_bytes(b"done")
+
+    dl._cleanup_temp_files("cancelled-task")
+
+    assert not cancelled.exists()
+    assert (paused / "video.f137.mp4.part").is_file()
+    assert finished.is_file()
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="需要 ffmpeg 產生測試影片")
+def test_download_lands_in_downloads_and_clears_temp(tmp_path, monkeypatch):
+    monkeypatch.setenv("YTIFY_ARTIFACT_CACHE", "false")
+    served = tmp_path / "served"
+    served.mkdir()
+    subprocess.run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=15",
+        "-t", "1", "-c:v", "libx264", "-preset", "ultrafast", str(served / "video.mp4"),
+    ], check=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(served)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        from services.downloader import Downloader
+
+        dl = Downloader()
+        dl.execution_mode = "thread"
+        task_id = dl.create_task(f"http://127.0.0.1:{server.server_address[1]}/video.mp4", persist=False)
+        result = asyncio.run(dl.execute_task(task_id))
+    finally:
+        server.shutdown()
+
+    assert result.get("success"), result
+    assert (dl.download_path / result["filename"]).is_file()
+    assert not dl._temp_dir(task_id).exists()